@@ -6,20 +6,24 @@
 
 import calendar
 import datetime
+import typing
 
-import pint  # type: ignore
 import svgwrite  # type: ignore
 
-from gpxtrackposter import utils
+from gpxtrackposter import svg_stream, utils
 from gpxtrackposter.exceptions import PosterError
 from gpxtrackposter.localization import localized_day_of_week_name
 from gpxtrackposter.poster import Poster
-from gpxtrackposter.tracks_drawer import TracksDrawer
+from gpxtrackposter.tracks_drawer import PARALLEL_MIN_YEARS, TracksDrawer
 from gpxtrackposter.xy import XY
 
 
 class CalendarDrawer(TracksDrawer):
-    """Draw a calendar poster."""
+    """Draw a calendar poster.
+
+    Repeated parts are defined once and referenced: the text styles are CSS classes, and the day cells are uses
+    of seven cells (one per weekday, with its name) defined in the group of their year.
+    """
 
     def __init__(self, the_poster: Poster):
         super().__init__(the_poster)
@@ -41,23 +45,46 @@ class CalendarDrawer(TracksDrawer):
         if count_y <= 1:
             margin.y = 0
         sub_size = cell_size - 2 * margin
+        self._add_style(dr, min(sub_size.x, sub_size.y))
 
+        keys = []
         for year in self.poster.years.iter():
-            g_year = dr.g(id=f"year{year}")
-            g.add(g_year)
-            self._draw(dr, g_year, sub_size, offset + margin + cell_size * XY(x, y), year)
+            keys.append((year, sub_size, offset + margin + cell_size * XY(x, y)))
             x += 1
             if x >= count_x:
                 x = 0
                 y += 1
+        for markup in self.render_fragments(keys, PARALLEL_MIN_YEARS):
+            g.add(svg_stream.Fragment(markup))
+
+    def render_fragment(self, key: typing.Tuple[int, XY, XY]) -> str:
+        """Render the calendar of a year, given as (year, size, offset)."""
+        year, size, offset = key
+        dr = self.fragment_drawing()
+        g_year = dr.g(id=f"year{year}")
+        self._draw(dr, g_year, XY(size.x, size.y), XY(offset.x, offset.y), year)
+        return g_year.tostring()
+
+    def _add_style(self, dr: svgwrite.Drawing, min_size: float) -> None:
+        """Add the text styles, which are the same for all years, to the drawing."""
+        text_color = self.poster.colors["text"]
+        dr.defs.add(
+            dr.style(
+                f".month {{alignment-baseline: hanging; fill: {text_color}; "
+                f"font-size: {min_size * 3.0 / 80.0}px; font-family: Arial;}}\n"
+                f".day-length {{text-anchor: middle; fill: {text_color}; "
+                f"font-size: {min_size * 1.0 / 80.0}px; font-family: Arial;}}\n"
+                ".weekday {text-anchor: middle; alignment-baseline: middle; dominant-baseline: central; "
+                f"fill: #000000; font-size: {min_size * 1.0 / 80.0}px; font-family: Arial;}}\n"
+                ".empty-day {fill: #444444;}"
+            )
+        )
 
     def _draw(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, size: XY, offset: XY, year: int) -> None:
         min_size = min(size.x, size.y)
         year_size = min_size * 4.0 / 80.0
         year_style = f"font-size:{year_size}px; font-family:Arial;"
-        month_style = f"font-size:{min_size * 3.0 / 80.0}px; font-family:Arial;"
-        day_style = f"dominant-baseline: central; font-size:{min_size * 1.0 / 80.0}px; font-family:Arial;"
-        day_length_style = f"font-size:{min_size * 1.0 / 80.0}px; font-family:Arial;"
+        decimals = self.path_decimals()
 
         g.add(
             dr.text(
@@ -81,59 +108,48 @@ class CalendarDrawer(TracksDrawer):
             (size.x - cell_size * count_x) / (count_x - 1),
             (size.y - cell_size * 3 * 12) / 11,
         )
+        # day cells (filled by their uses) with the name of their weekday; the cell size depends on the year
+        defs = svgwrite.container.Defs(factory=dr)
+        for weekday in range(7):
+            g_cell = dr.g(id=f"year{year}weekday{weekday}")
+            g_cell.add(dr.rect(size=(round(cell_size * 0.9, decimals), round(cell_size * 0.9, decimals))))
+            g_cell.add(
+                dr.text(
+                    localized_day_of_week_name(weekday, short=True),
+                    insert=(round(cell_size * 0.45, decimals), round(cell_size * 0.5, decimals)),
+                    class_="weekday",
+                )
+            )
+            defs.add(g_cell)
+        g.add(defs)
 
+        daily_stats = self.poster.daily_stats
         for month in range(1, 13):
             date = datetime.date(year, month, 1)
             y = month - 1
             y_pos = offset.y + (y * 3 + 1) * cell_size + y * spacing.y
-            g.add(
-                dr.text(
-                    self.poster.month_name(month),
-                    insert=(offset.x, y_pos - 2),
-                    fill=self.poster.colors["text"],
-                    alignment_baseline="hanging",
-                    style=month_style,
-                )
-            )
+            g.add(dr.text(self.poster.month_name(month), insert=(offset.x, round(y_pos - 2, decimals)), class_="month"))
+            g_month = dr.g(transform=f"translate(0,{round(y_pos + 1.15 * cell_size, decimals)})")
+            g.add(g_month)
 
             day_offset = date.weekday()
             while date.month == month:
                 x = date.day - 1
-                x_pos = offset.x + (day_offset + x) * cell_size + x * spacing.x
-                pos = (x_pos + 0.05 * cell_size, y_pos + 1.15 * cell_size)
-                dim = (cell_size * 0.9, cell_size * 0.9)
-                text_date = date.strftime("%Y-%m-%d")
-                if text_date in self.poster.tracks_by_date:
-                    tracks = self.poster.tracks_by_date[text_date]
-                    length = pint.Quantity(sum(t.length() for t in tracks))
-                    has_special = len([t for t in tracks if t.special]) > 0
-                    color = self.color(self.poster.length_range_by_date, length, has_special)
-                    g.add(dr.rect(pos, dim, fill=color))
-                    g.add(
+                x_pos = offset.x + (day_offset + x) * cell_size + x * spacing.x + 0.05 * cell_size
+                href = f"#year{year}weekday{date.weekday()}"
+                day_index = daily_stats.index(date)
+                if daily_stats.count[day_index] > 0:
+                    length = daily_stats.distance[day_index]
+                    has_special = daily_stats.special[day_index] == 1
+                    color = self.color_by_index(daily_stats.color_index[day_index], has_special)
+                    g_month.add(dr.use(href, x=round(x_pos, decimals), fill=color))
+                    g_month.add(
                         dr.text(
                             utils.format_float(self.poster.m2u(length)),
-                            insert=(
-                                pos[0] + cell_size / 2,
-                                pos[1] + cell_size + cell_size / 2,
-                            ),
-                            text_anchor="middle",
-                            style=day_length_style,
-                            fill=self.poster.colors["text"],
+                            insert=(round(x_pos + cell_size / 2, decimals), round(cell_size * 1.5, decimals)),
+                            class_="day-length",
                         )
                     )
                 else:
-                    g.add(dr.rect(pos, dim, fill="#444444"))
-
-                g.add(
-                    dr.text(
-                        localized_day_of_week_name(date.weekday(), short=True),
-                        insert=(
-                            offset.x + (day_offset + x) * cell_size + cell_size / 2,
-                            pos[1] + cell_size / 2,
-                        ),
-                        text_anchor="middle",
-                        alignment_baseline="middle",
-                        style=day_style,
-                    )
-                )
+                    g_month.add(dr.use(href, x=round(x_pos, decimals), class_="empty-day"))
                 date += datetime.timedelta(1)
@@ -10,14 +10,13 @@ import datetime
 import math
 import typing
 
-import pint  # type: ignore
 import svgwrite  # type: ignore
 
+from gpxtrackposter import svg_stream
 from gpxtrackposter.exceptions import PosterError
 from gpxtrackposter.poster import Poster
-from gpxtrackposter.track import Track
-from gpxtrackposter.tracks_drawer import TracksDrawer
-from gpxtrackposter.units import Units
+from gpxtrackposter.tracks_drawer import PARALLEL_MIN_YEARS, TracksDrawer
+from gpxtrackposter.units import meters_per_unit
 from gpxtrackposter.value_range import ValueRange
 from gpxtrackposter.xy import XY
 from gpxtrackposter import utils
@@ -43,10 +42,10 @@ class CircularDrawer(TracksDrawer):
         super().__init__(the_poster)
         self._rings = False
         self._ring_color = "darkgrey"
-        self._max_distance = None
-        self._unit = Units().km
+        self._max_distance: typing.Optional[float] = None
 
-    def create_args(self, args_parser: argparse.ArgumentParser) -> None:
+    @classmethod
+    def create_args(cls, args_parser: argparse.ArgumentParser) -> None:
         """Add arguments to the parser"""
         group = args_parser.add_argument_group("Circular Type Options")
         group.add_argument(
@@ -85,10 +84,9 @@ class CircularDrawer(TracksDrawer):
         if self.poster.length_range_by_date is None:
             return
 
-        if self.poster.units == "imperial":
-            self._unit = Units().mile
         if self._max_distance:
-            self._max_distance = self._max_distance * self._unit
+            unit = "mile" if self.poster.units == "imperial" else "km"
+            self._max_distance = self._max_distance * meters_per_unit(unit)
 
         years = self.poster.years.count()
         _, counts = utils.compute_grid(years, size)
@@ -103,14 +101,23 @@ class CircularDrawer(TracksDrawer):
         if count_y <= 1:
             margin.y = 0
         sub_size = cell_size - 2 * margin
+        keys = []
         for year in self.poster.years.iter():
-            g_year = dr.g(id=f"year{year}")
-            g.add(g_year)
-            self._draw_year(dr, g_year, sub_size, offset + margin + cell_size * XY(x, y), year)
+            keys.append((year, sub_size, offset + margin + cell_size * XY(x, y)))
             x += 1
             if x >= count_x:
                 x = 0
                 y += 1
+        for markup in self.render_fragments(keys, PARALLEL_MIN_YEARS):
+            g.add(svg_stream.Fragment(markup))
+
+    def render_fragment(self, key: typing.Tuple[int, XY, XY]) -> str:
+        """Render the circle of a year, given as (year, size, offset)."""
+        year, size, offset = key
+        dr = self.fragment_drawing()
+        g_year = dr.g(id=f"year{year}")
+        self._draw_year(dr, g_year, size, offset, year)
+        return g_year.tostring()
 
     def _draw_year(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, size: XY, offset: XY, year: int) -> None:
         min_size = min(size.x, size.y)
@@ -138,8 +145,9 @@ class CircularDrawer(TracksDrawer):
         day = 0
         date = datetime.date(year, 1, 1)
         animate_index = 1
+        daily_stats = self.poster.daily_stats
         while date.year == year:
-            text_date = date.strftime("%Y-%m-%d")
+            day_index = daily_stats.index(date)
             a1 = math.radians(day * df)
             a2 = math.radians((day + 1) * df)
             if date.day == 1:
@@ -158,16 +166,18 @@ class CircularDrawer(TracksDrawer):
                         stroke_width=0.3,
                     )
                 )
+                # explicit id: automatic ids depend on the process rendering the year
                 path = dr.path(
                     d=("M", center.x + r3 * sin_a1, center.y - r3 * cos_a1),
+                    id=f"year{year}month{date.month}",
                     fill="none",
                     stroke="none",
                 )
                 path.push(f"a{r3},{r3} 0 0,1 {r3 * (sin_a3 - sin_a1)},{r3 * (cos_a1 - cos_a3)}")
-                g.add(path)
                 tpath = svgwrite.text.TextPath(
                     path, self.poster.month_name(date.month), startOffset=(0.5 * r3 * (a3 - a1))
                 )
+                g.add(path)
                 text = dr.text(
                     "",
                     fill=self.poster.colors["text"],
@@ -179,14 +189,16 @@ class CircularDrawer(TracksDrawer):
             year_count = self.poster.year_tracks_date_count_dict[year]
             key_times_list = utils.make_key_times(year_count)
             key_times_len = len(key_times_list)
-            if text_date in self.poster.tracks_by_date:
+            if daily_stats.count[day_index] > 0:
                 values = ""
                 if self.poster.with_animation:
                     values = ";".join(["0"] * animate_index) + ";" + ";".join(["1"] * (key_times_len - animate_index))
                 self._draw_circle_segment(
                     dr,
                     g,
-                    self.poster.tracks_by_date[text_date],
+                    date,
+                    daily_stats.distance[day_index],
+                    daily_stats.special[day_index] == 1,
                     a1,
                     a2,
                     radius_range,
@@ -198,9 +210,10 @@ class CircularDrawer(TracksDrawer):
             day += 1
             date += datetime.timedelta(1)
 
-    def _determine_ring_distance(self, max_length: pint.Quantity) -> typing.Optional[pint.Quantity]:
+    @staticmethod
+    def _determine_ring_distance(max_length: float) -> typing.Optional[float]:
         ring_distance = None
-        for distance in [1.0 * self._unit, 5.0 * self._unit, 10.0 * self._unit, 50.0 * self._unit]:
+        for distance in [1.0, 5.0, 10.0, 50.0]:
             if max_length < distance:
                 continue
             ring_distance = distance
@@ -218,13 +231,13 @@ class CircularDrawer(TracksDrawer):
         if self._max_distance:
             max_length = self._max_distance
         assert max_length is not None
-        max_length = max_length.to(self._unit)
+        max_length = self.poster.m2u(max_length)
         ring_distance = self._determine_ring_distance(max_length)
         if ring_distance is None:
             return
         distance = ring_distance
         while distance < max_length:
-            radius = radius_range.interpolate((distance / max_length).magnitude)
+            radius = radius_range.interpolate(distance / max_length)
             g.add(
                 dr.circle(
                     center=center.tuple(),
@@ -241,7 +254,9 @@ class CircularDrawer(TracksDrawer):
         self,
         dr: svgwrite.Drawing,
         g: svgwrite.container.Group,
-        tracks: typing.List[Track],
+        date: datetime.date,
+        length: float,
+        has_special: bool,
         a1: float,
         a2: float,
         rr: ValueRange,
@@ -249,16 +264,14 @@ class CircularDrawer(TracksDrawer):
         values: str = "",
         key_times: str = "",
     ) -> None:
-        length = pint.Quantity(sum(t.length() for t in tracks))
-        has_special = len([t for t in tracks if t.special]) > 0
         color = self.color(self.poster.length_range_by_date, length, has_special)
         max_length = self.poster.length_range_by_date.upper()
         if self._max_distance:
-            max_length = self._max_distance.to_base_units()
+            max_length = self._max_distance
         assert max_length is not None
         r1 = rr.lower()
         assert r1 is not None
-        r2 = rr.interpolate((length / max_length).magnitude)
+        r2 = rr.interpolate(length / max_length)
         sin_a1, cos_a1 = math.sin(a1), math.cos(a1)
         sin_a2, cos_a2 = math.sin(a2), math.cos(a2)
         path = dr.path(
@@ -269,7 +282,7 @@ class CircularDrawer(TracksDrawer):
         path.push("l", (r2 - r1) * sin_a1, (r1 - r2) * cos_a1)
         path.push(f"a{r2},{r2} 0 0,0 {r2 * (sin_a2 - sin_a1)},{r2 * (cos_a1 - cos_a2)}")
         path.push("l", (r1 - r2) * sin_a2, (r2 - r1) * cos_a2)
-        date_title = str(tracks[0].start_time().date())
+        date_title = str(date)
         str_length = utils.format_float(self.poster.m2u(length))
         path.set_desc(title=f"{date_title} {str_length} {self.poster.u()}")
         if self.poster.with_animation:
@@ -6,35 +6,48 @@
 # license that can be found in the LICENSE file.
 
 import argparse
+import importlib
 import logging
 import os
 import sys
+import typing
 
 import appdirs  # type: ignore
 
 from gpxtrackposter import poster, track_loader
-from gpxtrackposter import grid_drawer, circular_drawer, heatmap_drawer
-from gpxtrackposter import github_drawer, calendar_drawer
 from gpxtrackposter.exceptions import ParameterError, PosterError
-from gpxtrackposter.units import Units
+from gpxtrackposter.tracks_drawer import TracksDrawer
+from gpxtrackposter.units import Units, meters_per_unit
 
 
 __app_name__ = "create_poster"
 __app_author__ = "flopp.net"
 
+if typing.TYPE_CHECKING:
+    from gpxtrackposter.heatmap_drawer import HeatmapDrawer
 
+# Drawer modules are only imported when their poster type is selected (all of them for the help text).
+DRAWERS: typing.Dict[str, typing.Tuple[str, str]] = {
+    "grid": ("gpxtrackposter.grid_drawer", "GridDrawer"),
+    "calendar": ("gpxtrackposter.calendar_drawer", "CalendarDrawer"),
+    "heatmap": ("gpxtrackposter.heatmap_drawer", "HeatmapDrawer"),
+    "circular": ("gpxtrackposter.circular_drawer", "CircularDrawer"),
+    "github": ("gpxtrackposter.github_drawer", "GithubDrawer"),
+    "hexbin": ("gpxtrackposter.hexbin_drawer", "HexbinDrawer"),
+}
+
+
+def load_drawer_class(name: str) -> typing.Type[TracksDrawer]:
+    """Import the module of the drawer of the given poster type and return the drawer class."""
+    module_name, class_name = DRAWERS[name]
+    drawer_class: typing.Type[TracksDrawer] = getattr(importlib.import_module(module_name), class_name)
+    return drawer_class
+
+
+# pylint: disable=too-many-branches
 def main() -> None:
     """Handle command line arguments and call other modules as needed."""
 
-    p = poster.Poster()
-    drawers = {
-        "grid": grid_drawer.GridDrawer(p),
-        "calendar": calendar_drawer.CalendarDrawer(p),
-        "heatmap": heatmap_drawer.HeatmapDrawer(p),
-        "circular": circular_drawer.CircularDrawer(p),
-        "github": github_drawer.GithubDrawer(p),
-    }
-
     args_parser = argparse.ArgumentParser(prog=__app_name__)
     args_parser.add_argument(
         "--gpx-dir",
@@ -49,7 +62,8 @@ def main() -> None:
         metavar="FILE",
         type=str,
         default="poster.svg",
-        help='Name of generated SVG image file (default: "poster.svg").',
+        help='Name of generated SVG image file; use the extension ".svgz" for a gzip-compressed file '
+        '(default: "poster.svg").',
     )
     args_parser.add_argument(
         "--language",
@@ -86,12 +100,12 @@ def main() -> None:
         default=[],
         help="Mark track file from the GPX directory as special; use multiple times to mark " "multiple tracks.",
     )
-    types = '", "'.join(drawers.keys())
+    types = '", "'.join(DRAWERS.keys())
     args_parser.add_argument(
         "--type",
         metavar="TYPE",
         default="grid",
-        choices=drawers.keys(),
+        choices=DRAWERS.keys(),
         help=f'Type of poster to create (default: "grid", available: "{types}").',
     )
     args_parser.add_argument(
@@ -153,12 +167,65 @@ def main() -> None:
         action="store_true",
         help="Clear the track cache.",
     )
+    args_parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        metavar="DIR",
+        type=str,
+        help="Directory used to cache loaded tracks (default: the user's cache directory).",
+    )
+    args_parser.add_argument(
+        "--shard",
+        dest="shard",
+        metavar="I/N",
+        type=str,
+        help="Only load the I-th of N deterministic shards of the GPX files into the cache and exit; "
+        "run once per shard (e.g. on multiple hosts sharing --cache-dir), then create the poster as usual.",
+    )
+    args_parser.add_argument(
+        "--verify-cache",
+        dest="verify_cache",
+        action="store_true",
+        help="Check that all GPX files (of the selected shard) are cached and exit.",
+    )
+    args_parser.add_argument(
+        "--streaming",
+        dest="streaming",
+        action="store_true",
+        help="Only keep track metadata in memory and reload each track's geometry from the cache while drawing "
+        "(reduces memory usage for huge numbers of tracks).",
+    )
+    args_parser.add_argument(
+        "--cache-mercator",
+        dest="cache_mercator",
+        action="store_true",
+        help="Also store the projected (Web-Mercator) coordinates in new cache entries, such that drawing cached "
+        "tracks skips the projection math (larger cache files).",
+    )
+    args_parser.add_argument(
+        "--cache-pyramid",
+        dest="cache_pyramid",
+        action="store_true",
+        help="Also store pre-simplified versions of the tracks next to new cache entries, such that posters "
+        "with a coarse --dpi load less geometry.",
+    )
     args_parser.add_argument(
         "--workers",
         dest="workers",
         metavar="NUMBER_OF_WORKERS",
         type=int,
-        help="Number of parallel track loading workers (default: number of CPU cores)",
+        help="Number of parallel workers for loading tracks and drawing large posters (default: number of CPU "
+        "cores)",
+    )
+    args_parser.add_argument(
+        "--workers-backend",
+        dest="workers_backend",
+        metavar="BACKEND",
+        type=str,
+        choices=["auto", "process", "thread"],
+        default="auto",
+        help='Type of parallel track loading workers; "process", "thread", "auto" (default: "auto", i.e. threads '
+        "on free-threaded Python builds, processes otherwise).",
     )
     args_parser.add_argument(
         "--from-strava",
@@ -202,6 +269,14 @@ def main() -> None:
         default="all",
         help="Filter tracks by activity type; e.g. 'running' (default: all activity types)",
     )
+    args_parser.add_argument(
+        "--region",
+        dest="region",
+        metavar="LAT,LNG,RADIUS_KM",
+        type=str,
+        help="Filter tracks by region; only keep tracks passing through the area within RADIUS_KM around LAT,LNG "
+        "(tracks known to be outside are skipped without parsing them).",
+    )
     args_parser.add_argument(
         "--with-animation",
         dest="with_animation",
@@ -215,14 +290,45 @@ def main() -> None:
         default=30,
         help="animation duration (default: 30s)",
     )
+    args_parser.add_argument(
+        "--dpi",
+        dest="dpi",
+        metavar="DPI",
+        type=float,
+        help="Resolution the poster is intended for; track details smaller than a pixel are simplified away "
+        "(default: no simplification).",
+    )
+    args_parser.add_argument(
+        "--max-output-size",
+        dest="max_output_size",
+        metavar="BYTES",
+        type=int,
+        help="Simplify the tracks further until their estimated size in the output is at most BYTES "
+        "(default: no limit).",
+    )
 
-    for _, drawer in drawers.items():
-        drawer.create_args(args_parser)
-
-    args = args_parser.parse_args()
+    # Only the arguments of the selected poster type are needed for drawing; the other drawers are loaded for the
+    # help text, for an invalid type, and for arguments that belong to other poster types.
+    type_parser = argparse.ArgumentParser(add_help=False)
+    type_parser.add_argument("-h", "--help", action="store_true")
+    type_parser.add_argument("--type", default="grid")
+    type_args, _ = type_parser.parse_known_args()
+    if type_args.help or type_args.type not in DRAWERS:
+        selected = list(DRAWERS.keys())
+    else:
+        selected = [type_args.type]
+    for name in selected:
+        load_drawer_class(name).create_args(args_parser)
+    args, unknown_args = args_parser.parse_known_args()
+    if unknown_args:
+        for name in DRAWERS:
+            if name not in selected:
+                load_drawer_class(name).create_args(args_parser)
+        args = args_parser.parse_args()
 
-    for _, drawer in drawers.items():
-        drawer.fetch_args(args)
+    p = poster.Poster()
+    drawer = load_drawer_class(args.type)(p)
+    drawer.fetch_args(args)
 
     log = logging.getLogger("gpxtrackposter")
     log.setLevel(logging.INFO if args.verbose else logging.ERROR)
@@ -231,16 +337,43 @@ def main() -> None:
         log.addHandler(handler)
 
     loader = track_loader.TrackLoader(args.workers)
-    loader.set_cache_dir(os.path.join(appdirs.user_cache_dir(__app_name__, __app_author__), "tracks"))
+    if args.cache_dir:
+        loader.set_cache_dir(args.cache_dir)
+    else:
+        loader.set_cache_dir(os.path.join(appdirs.user_cache_dir(__app_name__, __app_author__), "tracks"))
     if not loader.year_range.parse(args.year):
         raise ParameterError(f"Bad year range: {args.year}.")
+    if args.dpi is not None and args.dpi <= 0:
+        raise ParameterError(f"Not a valid DPI value: {args.dpi} (must be > 0)")
+    if args.max_output_size is not None and args.max_output_size <= 0:
+        raise ParameterError(f"Not a valid output size: {args.max_output_size} (must be > 0)")
+    if args.shard:
+        loader.set_shard(args.shard)
+    loader.set_streaming(args.streaming)
+    loader.set_cache_mercator(args.cache_mercator)
+    loader.set_cache_pyramid(args.cache_pyramid)
+    loader.set_backend(args.workers_backend)
 
     loader.special_file_names = args.special
     loader.set_min_length(args.min_distance * Units().km)
     loader.set_activity(args.activity_type)
+    if args.region:
+        loader.set_region(args.region)
     if args.clear_cache:
         print("Clearing cache...")
         loader.clear_cache()
+    if args.verify_cache:
+        missing = loader.verify_cache(args.gpx_dir)
+        for file_name in missing:
+            print(f"Not cached: {file_name}")
+        if missing:
+            raise PosterError(f"{len(missing)} GPX file(s) are missing in the cache.")
+        print("All GPX files are cached.")
+        return
+    if args.shard:
+        count = loader.ingest_tracks(args.gpx_dir)
+        print(f"Stored {count} track(s) of shard {args.shard} in cache {loader.cache_dir}.")
+        return
     if args.from_strava:
         tracks = loader.load_strava_tracks(args.from_strava)
     else:
@@ -250,7 +383,6 @@ def main() -> None:
             print("No tracks found.")
         return
 
-    print(f"Creating poster of type {args.type} with {len(tracks)} tracks and storing it in file {args.output}...")
     p.set_language(args.language, args.localedir)
     p.set_athlete(args.athlete)
     p.set_title(args.title if args.title else p.translate("MY TRACKS"))
@@ -258,8 +390,8 @@ def main() -> None:
     p.set_animation_time(args.animation_time)
 
     p.special_distance = {
-        "special_distance": args.special_distance * Units().km,
-        "special_distance2": args.special_distance2 * Units().km,
+        "special_distance": args.special_distance * meters_per_unit("km"),
+        "special_distance2": args.special_distance2 * meters_per_unit("km"),
     }
 
     p.colors = {
@@ -271,10 +403,20 @@ def main() -> None:
         "text": args.text_color,
     }
     p.units = args.units
+    p.dpi = args.dpi
+    p.max_output_bytes = args.max_output_size
+    p.workers = args.workers
     p.set_tracks(tracks)
+    heatmap = typing.cast("HeatmapDrawer", drawer) if args.type == "heatmap" else None
+    if heatmap and heatmap.tiles_dir:
+        print(f"Exporting heatmap tiles of {len(tracks)} tracks to directory {heatmap.tiles_dir}...")
+        rendered, unchanged = heatmap.export_tiles(args.workers)
+        print(f"Rendered {rendered} tile(s), {unchanged} tile(s) unchanged.")
+        return
+    print(f"Creating poster of type {args.type} with {len(tracks)} tracks and storing it in file {args.output}...")
     if args.type == "github":
         p.height = 55 + p.years.count() * 43
-    p.draw(drawers[args.type], args.output)
+    p.draw(drawer, args.output)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,53 @@
+"""Precomputed color gradient between two colors"""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import typing
+
+import numpy as np
+
+from gpxtrackposter import utils
+
+GRADIENT_STEPS = 256
+
+
+def gradient_index(ratio: float, steps: int = GRADIENT_STEPS) -> int:
+    """Return the index of the gradient color closest to the relative position ratio (clamped to [0, 1])."""
+    if ratio <= 0:
+        return 0
+    if ratio >= 1:
+        return steps - 1
+    return int(ratio * (steps - 1) + 0.5)
+
+
+class ColorGradient:
+    """Lookup table of colors interpolated between two colors.
+
+    Attributes:
+        colors: Hex strings of the interpolated colors, from color1 to color2.
+
+    Methods:
+        color: Return the color at a relative position.
+        indices: Return the gradient indices for an array of relative positions.
+        colors_at: Return the colors for an array of relative positions.
+        rgb: Return the interpolated colors as an array of RGB values.
+    """
+
+    def __init__(self, color1: str, color2: str, steps: int = GRADIENT_STEPS) -> None:
+        assert steps >= 2
+        self.colors = [utils.interpolate_color(color1, color2, i / (steps - 1)) for i in range(steps)]
+
+    def color(self, ratio: float) -> str:
+        return self.colors[gradient_index(ratio, len(self.colors))]
+
+    def indices(self, ratios: np.ndarray) -> np.ndarray:
+        return np.floor(np.clip(ratios, 0.0, 1.0) * (len(self.colors) - 1) + 0.5).astype(np.intp)
+
+    def colors_at(self, ratios: np.ndarray) -> typing.List[str]:
+        return [self.colors[i] for i in self.indices(ratios)]
+
+    def rgb(self) -> np.ndarray:
+        """Return the colors as uint8 array of shape (steps, 3)."""
+        return np.array([[int(c[i : i + 2], 16) for i in (1, 3, 5)] for c in self.colors], dtype=np.uint8)
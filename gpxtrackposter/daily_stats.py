@@ -0,0 +1,86 @@
+"""Represent per-day statistics of tracks"""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import array
+import datetime
+import typing
+
+from gpxtrackposter.color_gradient import GRADIENT_STEPS, gradient_index
+from gpxtrackposter.track import Track
+from gpxtrackposter.value_range import ValueRange
+
+
+class DailyStats:
+    """Represent per-day statistics of tracks, in arrays indexed by date ordinal.
+
+    The table covers every day from January 1st of the first year to December 31st of the last year,
+    so drawers can look up a day with a single subtraction instead of formatting the date.
+
+    Attributes:
+        _first_ordinal: Ordinal of the first day in the table.
+        distance: Total length (in meters) of the tracks of each day.
+        count: Number of tracks of each day.
+        special: 1 if a track of the day is special, else 0.
+        color_index: Index into the color gradient for the distance of each day.
+
+    Methods:
+        build: Fill the table from a list of tracks.
+        compute_color_indices: Fill color_index based on the range of daily distances.
+        index: Return the table index of a date.
+        has_tracks: Return True if there are tracks on a date.
+        length_range: Return the range of total lengths of all days with tracks.
+        year_day_count: Return the number of days with tracks in a year.
+    """
+
+    def __init__(self) -> None:
+        self._first_ordinal = 0
+        self.distance = array.array("d")
+        self.count = array.array("l")
+        self.special = bytearray()
+        self.color_index = array.array("H")
+
+    def build(self, from_year: int, to_year: int, tracks: typing.Iterable[Track]) -> None:
+        """Fill the table for the years from_year..to_year; tracks outside these years are ignored."""
+        self._first_ordinal = datetime.date(from_year, 1, 1).toordinal()
+        days = datetime.date(to_year, 12, 31).toordinal() - self._first_ordinal + 1
+        self.distance = array.array("d", [0.0]) * days
+        self.count = array.array("l", [0]) * days
+        self.special = bytearray(days)
+        self.color_index = array.array("H", [0]) * days
+        for track in tracks:
+            i = track.start_time().toordinal() - self._first_ordinal
+            if not 0 <= i < days:
+                continue
+            self.distance[i] += track.length_meters
+            self.count[i] += 1
+            if track.special:
+                self.special[i] = 1
+
+    def compute_color_indices(self, length_range: ValueRange, steps: int = GRADIENT_STEPS) -> None:
+        if not length_range.is_valid():
+            return
+        for i, distance in enumerate(self.distance):
+            if self.count[i] > 0:
+                self.color_index[i] = gradient_index(length_range.relative_position(distance), steps)
+
+    def index(self, date: datetime.date) -> int:
+        return date.toordinal() - self._first_ordinal
+
+    def has_tracks(self, date: datetime.date) -> bool:
+        i = self.index(date)
+        return 0 <= i < len(self.count) and self.count[i] > 0
+
+    def length_range(self) -> ValueRange:
+        length_range = ValueRange()
+        for distance, count in zip(self.distance, self.count):
+            if count > 0:
+                length_range.extend(distance)
+        return length_range
+
+    def year_day_count(self, year: int) -> int:
+        first = self.index(datetime.date(year, 1, 1))
+        last = self.index(datetime.date(year, 12, 31))
+        return sum(1 for count in self.count[max(first, 0) : last + 1] if count > 0)
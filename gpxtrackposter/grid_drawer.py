@@ -6,8 +6,10 @@
 
 import typing
 
+import numpy as np
 import svgwrite  # type: ignore
 
+from gpxtrackposter import lod, svg_path, svg_stream
 from gpxtrackposter.exceptions import PosterError
 from gpxtrackposter.poster import Poster
 from gpxtrackposter.track import Track
@@ -15,16 +17,27 @@ from gpxtrackposter.tracks_drawer import TracksDrawer
 from gpxtrackposter.xy import XY
 from gpxtrackposter import utils
 
+# minimal number of tracks for which worker processes render the cells
+PARALLEL_MIN_TRACKS = 500
+
 
 class GridDrawer(TracksDrawer):
     """Drawer used to draw a grid poster
 
+    Each track is drawn as its thumbnail (see Track.thumbnail), which is placed in its cell by a transform.
+
+    Attributes:
+        _lines_per_track: Simplified thumbnails of the tracks, if they have to be simplified together.
+
     Methods:
         draw: For each track, draw it on the poster.
+        fragment_context: Return the copy of the drawer (with the tracks) sent to worker processes.
+        render_fragment: Render the cell of a track.
     """
 
     def __init__(self, the_poster: Poster) -> None:
         super().__init__(the_poster)
+        self._lines_per_track: typing.Optional[typing.List[typing.List[np.ndarray]]] = None
 
     def draw(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, size: XY, offset: XY) -> None:
         """For each track, draw it on the poster."""
@@ -38,37 +51,65 @@ class GridDrawer(TracksDrawer):
         spacing_y = 0 if count_y <= 1 else (size.y - cell_size * count_y) / (count_y - 1)
         offset.x += (size.x - count_x * cell_size - (count_x - 1) * spacing_x) / 2
         offset.y += (size.y - count_y * cell_size - (count_y - 1) * spacing_y) / 2
+        thumbnail_size = 0.9 * cell_size
+        if self.poster.max_output_bytes is None:
+            # tracks are simplified independently, so the fragments can do it
+            self._lines_per_track = None
+        else:
+            tolerance = lod.mm_per_pixel(self.poster.dpi) / thumbnail_size if self.poster.dpi else 0.0
+            lines_per_track = [tr.thumbnail(tolerance) for tr in self.poster.tracks]
+            self._lines_per_track = self.simplify_tracks(lines_per_track, unit=thumbnail_size)
+        keys = []
+        for index in range(len(self.poster.tracks)):
+            p = XY(index % count_x, index // count_x) * XY(cell_size + spacing_x, cell_size + spacing_y)
+            keys.append((index, thumbnail_size, offset + 0.05 * XY(cell_size, cell_size) + p))
         year_groups: typing.Dict[int, svgwrite.container.Group] = {}
-        for index, tr in enumerate(self.poster.tracks):
-            year = tr.start_time().year
+        for (index, _, _), markup in zip(keys, self.render_fragments(keys, PARALLEL_MIN_TRACKS)):
+            year = self.poster.tracks[index].start_time().year
             if year not in year_groups:
                 g_year = dr.g(id=f"year{year}")
                 g.add(g_year)
                 year_groups[year] = g_year
-            else:
-                g_year = year_groups[year]
-            p = XY(index % count_x, index // count_x) * XY(cell_size + spacing_x, cell_size + spacing_y)
-            self._draw_track(
-                dr,
-                g_year,
-                tr,
-                0.9 * XY(cell_size, cell_size),
-                offset + 0.05 * XY(cell_size, cell_size) + p,
-            )
+            year_groups[year].add(svg_stream.Fragment(markup))
+
+    def fragment_context(self) -> TracksDrawer:
+        drawer = super().fragment_context()
+        drawer.poster.tracks = self.poster.tracks
+        return drawer
+
+    def render_fragment(self, key: typing.Tuple[int, float, XY]) -> str:
+        """Render the cell of a track, given as (index of the track, size of the thumbnail, offset)."""
+        index, size, offset = key
+        tr = self.poster.tracks[index]
+        if self._lines_per_track is not None:
+            lines = self._lines_per_track[index]
+        else:
+            tolerance = lod.mm_per_pixel(self.poster.dpi) / size if self.poster.dpi else 0.0
+            lines = self.simplify_tracks([tr.thumbnail(tolerance)], unit=size)[0]
+        return self._draw_track(self.fragment_drawing(), tr, lines, size, offset).tostring()
 
-    def _draw_track(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, tr: Track, size: XY, offset: XY) -> None:
-        color = self.color(self.poster.length_range, tr.length(), tr.special)
-        str_length = utils.format_float(self.poster.m2u(tr.length()))
+    def _draw_track(
+        self,
+        dr: svgwrite.Drawing,
+        tr: Track,
+        lines: typing.List[np.ndarray],
+        size: float,
+        offset: XY,
+    ) -> svgwrite.container.Group:
+        color = self.color(self.poster.length_range, tr.length_meters, tr.special)
+        str_length = utils.format_float(self.poster.m2u(tr.length_meters))
 
         date_title = str(tr.start_time().date())
-        for line in utils.project(tr.bbox(), size, offset, tr.polylines):
-            polyline = dr.polyline(
-                points=line,
-                stroke=color,
-                fill="none",
-                stroke_width=0.5,
-                stroke_linejoin="round",
-                stroke_linecap="round",
-            )
-            polyline.set_desc(title=f"{date_title} {str_length} {self.poster.u()}")
-            g.add(polyline)
+        g_track = dr.g(
+            transform=f"translate({offset.x},{offset.y}) scale({size})",
+            stroke=color,
+            fill="none",
+            stroke_width=0.5 / size,
+            stroke_linejoin="round",
+            stroke_linecap="round",
+        )
+        g_track.set_desc(title=f"{date_title} {str_length} {self.poster.u()}")
+        path_data = svg_path.encode_lines(lines, self.path_decimals(size))
+        if path_data:
+            g_track.add(svg_path.path_element(path_data))
+        return g_track
@@ -5,22 +5,62 @@
 # license that can be found in the LICENSE file.
 
 import argparse
+import collections
+import concurrent.futures
+import itertools
 import logging
 import math
-from typing import Dict, List, Optional, Tuple
+import os
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 import s2sphere  # type: ignore
 import svgwrite  # type: ignore
-from geopy.distance import distance  # type: ignore
 
-from gpxtrackposter import utils
+from gpxtrackposter import lod, raster, shared_arrays, svg_path, tiles, utils
 from gpxtrackposter.exceptions import ParameterError
 from gpxtrackposter.poster import Poster
+from gpxtrackposter.segments import count_segments
 from gpxtrackposter.tracks_drawer import TracksDrawer
 from gpxtrackposter.xy import XY
 
 log = logging.getLogger(__name__)
 
+# resolution of raster and segment heatmaps if the poster's resolution is not given
+HEATMAP_DEFAULT_DPI = 300.0
+# number of distinct line styles of segment heatmaps
+SEGMENT_LEVELS = 16
+# minimal number of track points for which worker processes project and encode the tracks
+PARALLEL_MIN_POINTS = 200000
+# number of track points projected and encoded together (by a worker process)
+PARALLEL_CHUNK_POINTS = 50000
+
+
+def encode_tracks(
+    line_arrays: List[np.ndarray],
+    line_counts: List[int],
+    bbox: s2sphere.LatLngRect,
+    size: XY,
+    offset: XY,
+    tolerance: float,
+    decimals: int,
+) -> List[List[str]]:
+    """Project, simplify and encode the lines of tracks as SVG path data (one per line).
+
+    line_arrays holds the lines (arrays of latitude, longitude, Web-Mercator x and y) of all tracks, line_counts
+    the number of lines of each track.
+    """
+    path_data_per_track = []
+    start = 0
+    for count in line_counts:
+        arrays = line_arrays[start : start + count]
+        start += count
+        lines = utils.project_arrays(bbox, size, offset, [a[:, :2] for a in arrays], [a[:, 2:] for a in arrays])
+        path_data_per_track.append(
+            [svg_path.encode_lines([line], decimals) for line in lod.simplify_lines(lines, tolerance)]
+        )
+    return path_data_per_track
+
 
 class HeatmapDrawer(TracksDrawer):
     """Draw a heatmap Poster based on the tracks.
@@ -28,11 +68,19 @@ class HeatmapDrawer(TracksDrawer):
     Attributes:
         _center: Center of the heatmap.
         _radius: Scale the heatmap so that a circle with radius (in KM) is visible.
+        _merge_tracks: Draw the tracks of a year with the same color as a single path per line pass.
+        _raster: Draw the heatmap as embedded raster image of the track density.
+        _raster_gamma: Gamma of the tone curve of the raster image.
+        _segments: Draw each distinct segment (at the output resolution) of all tracks once.
+        tiles_dir: Export the heatmap as XYZ tile pyramid into this directory instead of drawing a poster.
+        _tiles_max_zoom: Highest zoom level of the tile pyramid.
+        _tiles_format: Image format of the tiles ("png" or "svg").
 
     Methods:
         create_args: Create arguments for heatmap.
         fetch_args: Get arguments passed.
         draw: Draw the heatmap based on the Poster's tracks.
+        export_tiles: Render the Poster's tracks as XYZ tile pyramid.
 
     """
 
@@ -45,8 +93,16 @@ class HeatmapDrawer(TracksDrawer):
         self._heatmap_line_width_lower: List[Tuple[float, float]] = [(0.10, 5.0), (0.20, 2.0), (1.0, 0.30)]
         self._heatmap_line_width_upper: List[Tuple[float, float]] = [(0.02, 0.5), (0.05, 0.2), (1.0, 0.05)]
         self._heatmap_line_width: Optional[List[Tuple[float, float]]] = self._heatmap_line_width_lower
+        self._merge_tracks = False
+        self._raster = False
+        self._raster_gamma = 1.0
+        self._segments = False
+        self.tiles_dir: Optional[str] = None
+        self._tiles_max_zoom = 14
+        self._tiles_format = "png"
 
-    def create_args(self, args_parser: argparse.ArgumentParser) -> None:
+    @classmethod
+    def create_args(cls, args_parser: argparse.ArgumentParser) -> None:
         group = args_parser.add_argument_group("Heatmap Type Options")
         group.add_argument(
             "--heatmap-center",
@@ -71,6 +127,63 @@ class HeatmapDrawer(TracksDrawer):
             help="Define three transparency and width tuples for the heatmap lines or set it to "
             "`automatic` for automatic calculation (default: 0.1,5.0, 0.2,2.0, 1.0,0.3).",
         )
+        group.add_argument(
+            "--heatmap-merge-tracks",
+            dest="heatmap_merge_tracks",
+            action="store_true",
+            help="Draw all tracks of a year with the same color as a single path per line pass; much smaller and "
+            "faster to render, but overlapping tracks no longer intensify each other.",
+        )
+        group.add_argument(
+            "--heatmap-raster",
+            dest="heatmap_raster",
+            action="store_true",
+            help="Draw the density of the tracks as raster image with the resolution of --dpi "
+            f"(default: {HEATMAP_DEFAULT_DPI:g}) instead of overlapping lines; the size of the poster does not "
+            "depend on the number of tracks.",
+        )
+        group.add_argument(
+            "--heatmap-segments",
+            dest="heatmap_segments",
+            action="store_true",
+            help="Snap the tracks to a grid with the resolution of --dpi (default: "
+            f"{HEATMAP_DEFAULT_DPI:g}) and draw each distinct segment once, styled by the number of tracks "
+            "traversing it; the size of the poster depends on the number of distinct streets only.",
+        )
+        group.add_argument(
+            "--heatmap-raster-gamma",
+            dest="heatmap_raster_gamma",
+            metavar="GAMMA",
+            type=float,
+            default=1.0,
+            help="Gamma applied to the logarithmic density of the raster heatmap; values < 1 emphasize rarely "
+            "visited locations (default: 1.0).",
+        )
+        group.add_argument(
+            "--heatmap-tiles",
+            dest="heatmap_tiles",
+            metavar="DIR",
+            type=str,
+            help="Instead of a poster, export the heatmap as XYZ tile pyramid (DIR/ZOOM/X/Y.png) for web maps; "
+            "re-exports only render the tiles whose tracks changed.",
+        )
+        group.add_argument(
+            "--heatmap-tiles-max-zoom",
+            dest="heatmap_tiles_max_zoom",
+            metavar="ZOOM",
+            type=int,
+            default=14,
+            help="Highest zoom level of the exported tiles (default: 14).",
+        )
+        group.add_argument(
+            "--heatmap-tiles-format",
+            dest="heatmap_tiles_format",
+            type=str,
+            choices=tiles.TILE_FORMATS,
+            default="png",
+            help='Format of the exported tiles; "png" for the track density, "svg" for the heatmap lines '
+            '(default: "png").',
+        )
 
     # pylint: disable=too-many-branches
     def fetch_args(self, args: argparse.Namespace) -> None:
@@ -84,6 +197,19 @@ class HeatmapDrawer(TracksDrawer):
             ParameterError: Line transparency and width values are not valid
         """
         self._center = None
+        self._merge_tracks = args.heatmap_merge_tracks
+        self._raster = args.heatmap_raster
+        self._segments = args.heatmap_segments
+        if self._raster and self._segments:
+            raise ParameterError("--heatmap-raster and --heatmap-segments cannot be combined")
+        if args.heatmap_raster_gamma <= 0:
+            raise ParameterError(f"Not a valid gamma: {args.heatmap_raster_gamma} (must be > 0)")
+        self._raster_gamma = args.heatmap_raster_gamma
+        if args.heatmap_tiles_max_zoom < 0:
+            raise ParameterError(f"Not a valid zoom level: {args.heatmap_tiles_max_zoom} (must be >= 0)")
+        self.tiles_dir = args.heatmap_tiles
+        self._tiles_max_zoom = args.heatmap_tiles_max_zoom
+        self._tiles_format = args.heatmap_tiles_format
         if args.heatmap_center:
             latlng_str = args.heatmap_center.split(",")
             if len(latlng_str) != 2:
@@ -127,6 +253,8 @@ class HeatmapDrawer(TracksDrawer):
         if self._heatmap_line_width:
             return self._heatmap_line_width
         # automatic calculation of line transparencies and widths
+        from geopy.distance import distance  # type: ignore
+
         low = self._heatmap_line_width_low
         upp = self._heatmap_line_width_upp
         lower = self._heatmap_line_width_lower
@@ -157,16 +285,12 @@ class HeatmapDrawer(TracksDrawer):
     def _determine_bbox(self) -> s2sphere.LatLngRect:
         if self._center:
             log.info("Forcing heatmap center to %s", str(self._center))
-            dlat, dlng = 0, 0
             if self._radius:
-                er = 6378.1
-                quarter = er * math.pi / 2
-                dlat = 90 * self._radius / quarter
-                scale = 1 / math.cos(self._center.lat().radians)
-                dlng = scale * 90 * self._radius / quarter
-            else:
-                for tr in self.poster.tracks:
-                    for line in tr.polylines:
+                return utils.region_rect(self._center, self._radius)
+            dlat, dlng = 0, 0
+            for tr in self.poster.tracks:
+                with tr.geometry() as polylines:
+                    for line in polylines:
                         for latlng in line:
                             d = abs(self._center.lat().degrees - latlng.lat().degrees)
                             dlat = max(dlat, d)
@@ -184,11 +308,31 @@ class HeatmapDrawer(TracksDrawer):
         return tracks_bbox
 
     def draw(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, size: XY, offset: XY) -> None:
-        """Draw the heatmap based on tracks."""
+        """Draw the heatmap based on tracks.
+
+        Unless the output size is limited, the tracks are projected, simplified and drawn one at a time (or in
+        chunks by worker processes), so that only the geometry of a few tracks is in memory at once.
+        """
         bbox = self._determine_bbox()
         line_transparencies_and_widths = self._get_line_transparencies_and_widths(bbox)
+        if self._raster:
+            self._draw_raster(g, bbox, size, offset)
+            return
+        if self._segments:
+            self._draw_segments(g, self._project_tracks(bbox, size, offset), offset, line_transparencies_and_widths)
+            return
+        colors = [self.color(self.poster.length_range, tr.length_meters, tr.special) for tr in self.poster.tracks]
+        color_classes = {color: f"color{index}" for index, color in enumerate(dict.fromkeys(colors))}
+        g.add(dr.style(self._style(color_classes, line_transparencies_and_widths)))
+        pass_classes = [f"pass{index}" for index in range(len(line_transparencies_and_widths))]
+        decimals = self.path_decimals()
+        if self._merge_tracks:
+            lines_per_track = self._simplify_projected_tracks(bbox, size, offset, len(line_transparencies_and_widths))
+            self._draw_merged_tracks(dr, g, lines_per_track, colors, color_classes, pass_classes, decimals)
+            return
+        path_data_per_track = self._encode_tracks(bbox, size, offset, len(line_transparencies_and_widths), decimals)
         year_groups: Dict[int, svgwrite.container.Group] = {}
-        for tr in self.poster.tracks:
+        for tr, track_path_data, color in zip(self.poster.tracks, path_data_per_track, colors):
             year = tr.start_time().year
             if year not in year_groups:
                 g_year = dr.g(id=f"year{year}")
@@ -196,17 +340,255 @@ class HeatmapDrawer(TracksDrawer):
                 year_groups[year] = g_year
             else:
                 g_year = year_groups[year]
-            color = self.color(self.poster.length_range, tr.length(), tr.special)
-            for line in utils.project(bbox, size, offset, tr.polylines):
-                for opacity, width in line_transparencies_and_widths:
-                    g_year.add(
-                        dr.polyline(
-                            points=line,
-                            stroke=color,
-                            stroke_opacity=opacity,
-                            fill="none",
-                            stroke_width=width,
-                            stroke_linejoin="round",
-                            stroke_linecap="round",
+            for path_data in track_path_data:
+                for pass_class in pass_classes:
+                    g_year.add(svg_path.path_element(path_data, class_=f"{color_classes[color]} {pass_class}"))
+
+    def _project_tracks(
+        self, bbox: s2sphere.LatLngRect, size: XY, offset: XY, special: Optional[bool] = None
+    ) -> Iterator[List[np.ndarray]]:
+        """Yield the projected lines of each track (or of the special or regular tracks only), one at a time."""
+        for tr in self.poster.tracks:
+            if special is not None and tr.special != special:
+                continue
+            # skip the projection of tracks that are entirely outside of the view
+            yield self.project_track(tr, bbox, size, offset) if bbox.intersects(tr.bbox()) else []
+
+    def _simplify_projected_tracks(
+        self, bbox: s2sphere.LatLngRect, size: XY, offset: XY, copies: int
+    ) -> Iterator[List[np.ndarray]]:
+        """Yield the projected and simplified lines of each track.
+
+        Only if the output size is limited, all tracks are projected before, since they are simplified together.
+        """
+        lines_per_track = self._project_tracks(bbox, size, offset)
+        if self.poster.max_output_bytes is not None:
+            yield from self.simplify_tracks(list(lines_per_track), copies)
+            return
+        for lines in lines_per_track:
+            yield self.simplify_tracks([lines], copies)[0]
+
+    def _geometry_chunks(
+        self, bbox: s2sphere.LatLngRect, size: XY, offset: XY
+    ) -> Iterator[Tuple[List[np.ndarray], List[int], int]]:
+        """Yield the lines (see encode_tracks), line counts and number of points of consecutive tracks with about
+        PARALLEL_CHUNK_POINTS points."""
+        line_arrays: List[np.ndarray] = []
+        line_counts: List[int] = []
+        points = 0
+        for tr in self.poster.tracks:
+            if bbox.intersects(tr.bbox()):
+                latlng_arrays, xy_arrays = self.track_geometry(tr, bbox, size, offset)
+                line_arrays.extend(np.hstack([latlng, xy]) for latlng, xy in zip(latlng_arrays, xy_arrays))
+                line_counts.append(len(latlng_arrays))
+                points += sum(len(latlng) for latlng in latlng_arrays)
+            else:
+                line_counts.append(0)
+            if points >= PARALLEL_CHUNK_POINTS:
+                yield line_arrays, line_counts, points
+                line_arrays, line_counts, points = [], [], 0
+        if line_counts:
+            yield line_arrays, line_counts, points
+
+    def _encode_tracks(
+        self, bbox: s2sphere.LatLngRect, size: XY, offset: XY, copies: int, decimals: int
+    ) -> Iterator[List[str]]:
+        """Yield the SVG path data of the lines of each track.
+
+        The tracks are projected, simplified and encoded in chunks of consecutive tracks; for large heatmaps, by
+        worker processes, which read the coordinates from shared memory (at most two chunks per worker at once).
+        The result does not depend on the number of workers. With a limited output size, all tracks are
+        simplified together in this process.
+        """
+        if self.poster.max_output_bytes is not None:
+            for lines in self._simplify_projected_tracks(bbox, size, offset, copies):
+                yield [svg_path.encode_lines([line], decimals) for line in lines]
+            return
+        tolerance = lod.mm_per_pixel(self.poster.dpi) if self.poster.dpi else 0.0
+        workers = self.poster.workers or os.cpu_count() or 1
+        chunks = self._geometry_chunks(bbox, size, offset)
+        # chunks read before deciding whether the heatmap is large enough for worker processes
+        first_chunks: List[Tuple[List[np.ndarray], List[int], int]] = []
+        first_points = 0
+        if workers > 1:
+            for chunk in chunks:
+                first_chunks.append(chunk)
+                first_points += chunk[2]
+                if first_points >= PARALLEL_MIN_POINTS:
+                    break
+        if workers <= 1 or first_points < PARALLEL_MIN_POINTS:
+            for line_arrays, line_counts, _ in itertools.chain(first_chunks, chunks):
+                yield from encode_tracks(line_arrays, line_counts, bbox, size, offset, tolerance, decimals)
+            return
+        pending: Deque[Tuple[shared_arrays.SharedArrays, concurrent.futures.Future]] = collections.deque()
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)  # pylint: disable=consider-using-with
+        try:
+            for line_arrays, line_counts, _ in itertools.chain(first_chunks, chunks):
+                shared = shared_arrays.SharedArrays(line_arrays, 4)
+                future = executor.submit(
+                    shared_arrays.call_with_views,
+                    shared.handle,
+                    0,
+                    len(line_arrays),
+                    encode_tracks,
+                    line_counts,
+                    bbox,
+                    size,
+                    offset,
+                    tolerance,
+                    decimals,
+                )
+                pending.append((shared, future))
+                while len(pending) > 2 * workers:
+                    shared, future = pending.popleft()
+                    with shared:
+                        yield from future.result()
+            while pending:
+                shared, future = pending.popleft()
+                with shared:
+                    yield from future.result()
+        finally:
+            # after an error, skip the chunks that have not been started, and let the workers finish the running
+            # ones before their shared memory is released
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            for shared, _ in pending:
+                shared.close()
+
+    def export_tiles(self, workers: Optional[int]) -> Tuple[int, int]:
+        """Render the Poster's tracks as XYZ tile pyramid into tiles_dir, using up to workers processes.
+
+        PNG tiles show the track density like the raster heatmap; SVG tiles use the line passes and colors of the
+        heatmap poster.
+
+        Returns:
+            Number of rendered tiles and number of unchanged tiles.
+        """
+        assert self.tiles_dir
+        exporter = tiles.TileExporter(self.tiles_dir, self._tiles_max_zoom, self._tiles_format, workers)
+        color_classes: Dict[str, str] = {}
+        colors = ["" for _ in self.poster.tracks]
+        if self._tiles_format == "png":
+            exporter.set_png_style([self.gradient(False), self.gradient(True)], self._raster_gamma)
+        else:
+            colors = [self.color(self.poster.length_range, tr.length_meters, tr.special) for tr in self.poster.tracks]
+            color_classes = {color: f"color{index}" for index, color in enumerate(dict.fromkeys(colors))}
+            passes = self._get_line_transparencies_and_widths(self._determine_bbox())
+            exporter.set_svg_style(self._style(color_classes, passes), passes)
+        # size of a pixel of the highest zoom level in Web-Mercator units
+        tolerance = 2 / (exporter.tile_size << self._tiles_max_zoom)
+        for tr, color in zip(self.poster.tracks, colors):
+            _, xy_arrays = tr.geometry_at(tolerance)
+            key = f"{','.join(tr.file_names)} {tr.start_time().isoformat()} {tr.length_meters}"
+            exporter.add_track(key, xy_arrays, color_classes.get(color, ""), tr.special)
+        return exporter.export()
+
+    def _draw_merged_tracks(
+        self,
+        dr: svgwrite.Drawing,
+        g: svgwrite.container.Group,
+        lines_per_track: Iterable[List[np.ndarray]],
+        colors: List[str],
+        color_classes: Dict[str, str],
+        pass_classes: List[str],
+        decimals: int,
+    ) -> None:
+        """Draw one path per year, line pass and color, containing the lines of all matching tracks."""
+        path_data_by_year: Dict[int, Dict[str, List[str]]] = {}
+        for tr, lines, color in zip(self.poster.tracks, lines_per_track, colors):
+            # the path data of lines can be concatenated, so only the encoded lines are kept
+            path_data_by_year.setdefault(tr.start_time().year, {}).setdefault(color, []).append(
+                svg_path.encode_lines(lines, decimals)
+            )
+        for year, path_data_by_color in path_data_by_year.items():
+            g_year = dr.g(id=f"year{year}")
+            g.add(g_year)
+            for pass_class in pass_classes:
+                for color, path_data in path_data_by_color.items():
+                    if any(path_data):
+                        g_year.add(
+                            svg_path.path_element("".join(path_data), class_=f"{color_classes[color]} {pass_class}")
                         )
-                    )
+
+    def _draw_raster(self, g: svgwrite.container.Group, bbox: s2sphere.LatLngRect, size: XY, offset: XY) -> None:
+        """Draw the density of the tracks as PNG image; special tracks are drawn on top of the regular ones."""
+        pixel_size = lod.mm_per_pixel(self.poster.dpi or HEATMAP_DEFAULT_DPI)
+        width = max(1, math.ceil(size.x / pixel_size))
+        height = max(1, math.ceil(size.y / pixel_size))
+        origin = np.array(offset.tuple())
+        densities = []
+        for special in [False, True]:
+            lines = (
+                (line - origin) / pixel_size
+                for track_lines in self._project_tracks(bbox, size, offset, special)
+                for line in track_lines
+            )
+            densities.append(raster.rasterize_lines(lines, width, height))
+        maximum = max(float(density.max()) for density in densities)
+        layers = [
+            (raster.tone_map(density, self._raster_gamma, maximum), self.gradient(special))
+            for special, density in zip([False, True], densities)
+            if density.any()
+        ]
+        if not layers:
+            return
+        png = raster.encode_png(raster.colorize(layers))
+        # skip svgwrite's validation, which would run a regular expression over the huge data URI
+        g.add(
+            svgwrite.image.Image(
+                raster.png_data_uri(png),
+                insert=offset.tuple(),
+                size=size.tuple(),
+                preserveAspectRatio="none",
+                debug=False,
+            )
+        )
+
+    def _draw_segments(
+        self,
+        g: svgwrite.container.Group,
+        lines_per_track: Iterable[List[np.ndarray]],
+        offset: XY,
+        line_transparencies_and_widths: List[Tuple[float, float]],
+    ) -> None:
+        """Draw each distinct grid segment once, styled by the number of tracks traversing it.
+
+        The segments are drawn with one path per level of the (logarithmic) track count; the opacity and width
+        range from the second to the last line pass, the color follows the track color gradient.
+        """
+        cell_size = lod.mm_per_pixel(self.poster.dpi or HEATMAP_DEFAULT_DPI)
+        origin = np.array(offset.tuple())
+        segments, counts = count_segments(([line - origin for line in lines] for lines in lines_per_track), cell_size)
+        if len(segments) == 0:
+            return
+        ratios = np.log1p(counts) / np.log1p(counts.max())
+        levels = np.minimum(SEGMENT_LEVELS - 1, np.floor(ratios * SEGMENT_LEVELS)).astype(np.intp)
+        (opacity1, width1), (opacity2, width2) = line_transparencies_and_widths[1], line_transparencies_and_widths[-1]
+        decimals = self.path_decimals()
+        for level in range(SEGMENT_LEVELS):
+            level_segments = segments[levels == level]
+            if len(level_segments) == 0:
+                continue
+            ratio = (level + 1) / SEGMENT_LEVELS
+            g.add(
+                svg_path.path_element(
+                    svg_path.encode_segments(level_segments * cell_size + np.tile(origin, 2), decimals),
+                    stroke=self.gradient().color(ratio),
+                    stroke_opacity=round(opacity1 + ratio * (opacity2 - opacity1), 4),
+                    stroke_width=round(width2 + ratio * (width1 - width2), 4),
+                    fill="none",
+                    stroke_linecap="round",
+                )
+            )
+
+    @staticmethod
+    def _style(color_classes: Dict[str, str], line_transparencies_and_widths: List[Tuple[float, float]]) -> str:
+        """Return the CSS rules of the color and line pass classes of the heatmap's paths."""
+        rules = [f".{color_class}{{stroke:{color}}}" for color, color_class in color_classes.items()]
+        for index, (opacity, width) in enumerate(line_transparencies_and_widths):
+            rules.append(
+                f".pass{index}{{fill:none;stroke-linejoin:round;stroke-linecap:round;"
+                f"stroke-opacity:{opacity};stroke-width:{width}}}"
+            )
+        return "\n".join(rules)
@@ -0,0 +1,63 @@
+"""Bin points into a grid of hexagons."""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import math
+import typing
+
+import numpy as np
+
+SQRT3 = math.sqrt(3)
+
+
+def hex_cells(points: np.ndarray, size: float) -> np.ndarray:
+    """Return the axial coordinates (q, r) of the pointy-top hexagons with circumradius size containing points.
+
+    Returns:
+        Integer array of shape (n, 2).
+    """
+    q = (SQRT3 / 3 * points[:, 0] - points[:, 1] / 3) / size
+    r = (2 / 3 * points[:, 1]) / size
+    s = -q - r
+    # round the cube coordinates and fix the component with the largest rounding error
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return np.stack([rq, rr], axis=1).astype(np.int64)
+
+
+def hex_centers(cells: np.ndarray, size: float) -> np.ndarray:
+    """Return the centers of the hexagons with axial coordinates cells."""
+    q, r = cells[:, 0], cells[:, 1]
+    return np.stack([size * SQRT3 * (q + r / 2), size * 1.5 * r], axis=1)
+
+
+def hex_corners(size: float) -> np.ndarray:
+    """Return the corners of a pointy-top hexagon with circumradius size around the origin."""
+    angles = np.radians(60 * np.arange(6) - 30)
+    return size * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+
+def bin_lines(lines: typing.Iterable[np.ndarray], size: float) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Sum up the lengths of the segments of lines per hexagon containing the segments' midpoints.
+
+    Returns:
+        Tuple of the axial coordinates of the non-empty hexagons and the total segment length per hexagon.
+    """
+    midpoints = []
+    lengths = []
+    for line in lines:
+        if len(line) < 2:
+            continue
+        midpoints.append((line[:-1] + line[1:]) / 2)
+        deltas = np.diff(line, axis=0)
+        lengths.append(np.hypot(deltas[:, 0], deltas[:, 1]))
+    if not midpoints:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0)
+    cells, inverse = np.unique(hex_cells(np.vstack(midpoints), size), axis=0, return_inverse=True)
+    return cells, np.bincount(inverse.ravel(), weights=np.concatenate(lengths), minlength=len(cells))
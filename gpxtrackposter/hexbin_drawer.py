@@ -0,0 +1,81 @@
+"""Draw a hexbin poster."""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import argparse
+
+import numpy as np
+import s2sphere  # type: ignore
+import svgwrite  # type: ignore
+
+from gpxtrackposter import hexbin
+from gpxtrackposter.exceptions import ParameterError, PosterError
+from gpxtrackposter.poster import Poster
+from gpxtrackposter.tracks_drawer import TracksDrawer
+from gpxtrackposter.value_range import ValueRange
+from gpxtrackposter.xy import XY
+
+
+class HexbinDrawer(TracksDrawer):
+    """Draw a map of the tracks' density as grid of hexagons.
+
+    The tracks are binned into hexagons by the midpoints of their (projected) segments; each non-empty hexagon
+    is colored by the (logarithmic) length of the segments within, so the number of SVG elements is bounded by
+    the number of hexagons.
+
+    Attributes:
+        _hexagon_size: Circumradius of the hexagons (in mm).
+
+    Methods:
+        create_args: Create arguments for hexbin.
+        fetch_args: Get arguments passed.
+        draw: Draw the hexagons of the Poster's tracks.
+    """
+
+    def __init__(self, the_poster: Poster):
+        super().__init__(the_poster)
+        self._hexagon_size = 2.0
+
+    @classmethod
+    def create_args(cls, args_parser: argparse.ArgumentParser) -> None:
+        group = args_parser.add_argument_group("Hexbin Type Options")
+        group.add_argument(
+            "--hexbin-size",
+            dest="hexbin_size",
+            metavar="SIZE_MM",
+            type=float,
+            default=2.0,
+            help="Circumradius of the hexagons in mm (default: 2.0).",
+        )
+
+    def fetch_args(self, args: argparse.Namespace) -> None:
+        if args.hexbin_size <= 0:
+            raise ParameterError(f"Not a valid hexagon size: {args.hexbin_size} (must be > 0)")
+        self._hexagon_size = args.hexbin_size
+
+    def draw(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, size: XY, offset: XY) -> None:
+        """Draw one filled hexagon per non-empty cell."""
+        if not self.poster.tracks:
+            raise PosterError("No tracks to draw")
+        bbox = s2sphere.LatLngRect()
+        for tr in self.poster.tracks:
+            bbox = bbox.union(tr.bbox())
+        origin = np.array(offset.tuple())
+        lines = [line - origin for tr in self.poster.tracks for line in self.project_track(tr, bbox, size, offset)]
+        cells, lengths = hexbin.bin_lines(lines, self._hexagon_size)
+        if len(cells) == 0:
+            return
+        values = np.log1p(lengths)
+        value_range = ValueRange.from_pair(float(values.min()), float(values.max()))
+        decimals = self.path_decimals()
+        corners = hexbin.hex_corners(self._hexagon_size)
+        for center, value in zip(hexbin.hex_centers(cells, self._hexagon_size) + origin, values):
+            g.add(
+                dr.polygon(
+                    points=np.round(center + corners, decimals).tolist(),
+                    fill=self.color(value_range, float(value)),
+                    stroke="none",
+                )
+            )
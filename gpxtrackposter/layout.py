@@ -0,0 +1,57 @@
+"""Compute grid layouts for posters."""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import functools
+import typing
+
+
+def _column_blocks(count: int) -> typing.Generator[typing.Tuple[int, int], None, None]:
+    """Yield (count_x, count_y) for the smallest count_x of each distinct count_y = ceil(count / count_x).
+
+    There are only O(sqrt(count)) distinct values of count_y, and within each block of columns sharing the
+    same count_y, the smallest count_x yields the largest cells.
+    """
+    count_x = 1
+    while count_x <= count:
+        count_y = (count + count_x - 1) // count_x
+        yield count_x, count_y
+        if count_y == 1:
+            return
+        count_x = (count - 1) // (count_y - 1) + 1
+
+
+@functools.lru_cache(maxsize=1024)
+def compute_grid_layout(
+    count: int, width: float, height: float, spacing: float = 0.0, aspect_ratio: float = 1.0
+) -> typing.Tuple[typing.Optional[float], typing.Optional[typing.Tuple[int, int]]]:
+    """Find the grid of count cells that fit into width x height with the largest cells (least waste).
+
+    Cells have a width of aspect_ratio times their height and are separated by spacing. The solver only
+    considers O(sqrt(count)) candidate grids; ties are resolved in favor of fewer columns. Results are
+    memoized.
+
+    Returns:
+        Tuple of the cell height and the (count_x, count_y) pair, or (None, None) if no grid fits.
+    """
+    min_waste = -1.0
+    best_size = None
+    best_counts = None
+    for count_x, count_y in _column_blocks(count):
+        available_x = width - (count_x - 1) * spacing
+        available_y = height - (count_y - 1) * spacing
+        if available_x <= 0:
+            break
+        if available_y <= 0:
+            continue
+        size = min(available_x / (count_x * aspect_ratio), available_y / count_y)
+        waste = width * height - count * (aspect_ratio * size) * size
+        if waste < 0:
+            continue
+        if best_size is None or waste < min_waste:
+            best_size = size
+            best_counts = count_x, count_y
+            min_waste = waste
+    return best_size, best_counts
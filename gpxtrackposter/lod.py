@@ -0,0 +1,113 @@
+"""Simplify projected lines to the level of detail visible at the output resolution."""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import math
+import typing
+
+import numpy as np
+
+MM_PER_INCH = 25.4
+# resolution assumed if the poster's resolution is not given
+DEFAULT_DPI = 1000.0
+
+# rough size of a point (relative move "dx dy ") and of a path element (tag and attributes) in the SVG output
+SVG_BYTES_PER_POINT = 12
+SVG_BYTES_PER_POLYLINE = 160
+
+
+def mm_per_pixel(dpi: float) -> float:
+    return MM_PER_INCH / dpi
+
+
+def merge_close_points(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Merge consecutive points that fall into the same cell of a grid with cell size tolerance.
+
+    The first and the last point of the line are always kept.
+    """
+    if len(points) <= 2 or tolerance <= 0:
+        return points
+    cells = np.floor(points / tolerance)
+    keep = np.empty(len(points), dtype=bool)
+    keep[0] = True
+    keep[1:] = (cells[1:] != cells[:-1]).any(axis=1)
+    keep[-1] = True
+    return points[keep]
+
+
+def _segment_distances(points: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    d = b - a
+    length_sq = float(d @ d)
+    if length_sq == 0:
+        return np.hypot(points[:, 0] - a[0], points[:, 1] - a[1])
+    t = np.clip(((points - a) @ d) / length_sq, 0.0, 1.0)
+    return np.hypot(points[:, 0] - (a[0] + t * d[0]), points[:, 1] - (a[1] + t * d[1]))
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Simplify a line with the Douglas-Peucker algorithm, using the distance of points to segments."""
+    if len(points) <= 2 or tolerance <= 0:
+        return points
+    return points[douglas_peucker_mask(points, tolerance)]
+
+
+def douglas_peucker_mask(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Return a mask of the points kept by douglas_peucker."""
+    keep = np.zeros(len(points), dtype=bool)
+    if len(points) <= 2 or tolerance <= 0:
+        keep[:] = True
+        return keep
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        distances = _segment_distances(points[start + 1 : end], points[start], points[end])
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def simplify_lines(lines: typing.List[np.ndarray], tolerance: float) -> typing.List[np.ndarray]:
+    """Simplify projected lines, such that no point deviates more than tolerance from the original lines."""
+    if tolerance <= 0:
+        return lines
+    return [douglas_peucker(merge_close_points(line, tolerance), tolerance) for line in lines]
+
+
+def estimate_svg_bytes(lines_per_track: typing.List[typing.List[np.ndarray]], copies: int = 1) -> int:
+    """Estimate the size of the SVG elements of the lines (one path per line), each one emitted copies times."""
+    points = sum(len(line) for lines in lines_per_track for line in lines)
+    polylines = sum(len(lines) for lines in lines_per_track)
+    return copies * (points * SVG_BYTES_PER_POINT + polylines * SVG_BYTES_PER_POLYLINE)
+
+
+def simplify_tracks(
+    lines_per_track: typing.List[typing.List[np.ndarray]],
+    tolerance: float,
+    max_bytes: typing.Optional[int] = None,
+    copies: int = 1,
+    initial_tolerance: float = MM_PER_INCH / DEFAULT_DPI,
+) -> typing.List[typing.List[np.ndarray]]:
+    """Simplify the projected lines of all tracks to tolerance.
+
+    If max_bytes is given, the tolerance (starting with at least initial_tolerance) is doubled until the
+    estimated size of the SVG elements fits into max_bytes (or the lines cannot be simplified any further).
+    """
+    simplified = [simplify_lines(lines, tolerance) for lines in lines_per_track]
+    if max_bytes is None:
+        return simplified
+    tolerance = max(tolerance, initial_tolerance)
+    while estimate_svg_bytes(simplified, copies) > max_bytes and math.isfinite(tolerance):
+        if all(len(line) <= 2 for lines in simplified for line in lines):
+            break
+        tolerance *= 2
+        simplified = [simplify_lines(lines, tolerance) for lines in lines_per_track]
+    return simplified
@@ -10,13 +10,14 @@ import locale
 import logging
 import typing
 
-import pint  # type: ignore
 import svgwrite  # type: ignore
 
-from gpxtrackposter.quantity_range import QuantityRange
+from gpxtrackposter.daily_stats import DailyStats
+from gpxtrackposter.svg_stream import StreamingDrawing
 from gpxtrackposter.track import Track
-from gpxtrackposter.units import Units
+from gpxtrackposter.units import meters_per_unit
 from gpxtrackposter.utils import format_float
+from gpxtrackposter.value_range import ValueRange
 from gpxtrackposter.xy import XY
 from gpxtrackposter.year_range import YearRange
 
@@ -33,16 +34,19 @@ class Poster:
     Attributes:
         _athlete: Name of athlete to be displayed on poster.
         _title: Title of poster.
-        tracks_by_date: Tracks organized temporally if needed.
+        daily_stats: Per-day distance, track count and special flag, indexed by date.
         tracks: List of tracks to be used in the poster.
-        length_range: Range of lengths of tracks in poster.
-        length_range_by_date: Range of lengths organized temporally.
-        units: Length units to be used in poster.
+        length_range: Range of lengths of tracks in poster (in meters).
+        length_range_by_date: Range of lengths organized temporally (in meters).
+        units: Length units to be used in poster; all lengths are handled in meters and only converted for display.
         colors: Colors for various components of the poster.
         width: Poster width.
         height: Poster height.
         years: Years included in the poster.
         tracks_drawer: drawer used to draw the poster.
+        dpi: Output resolution used to simplify track geometry finer than a pixel (None: no simplification).
+        max_output_bytes: Simplify track geometry until the (estimated) size of the drawn tracks fits (or None).
+        workers: Number of worker processes used by drawers for large posters (None: number of CPU cores).
 
     Methods:
         set_tracks: Associate the Poster with a set of tracks
@@ -54,12 +58,12 @@ class Poster:
     def __init__(self) -> None:
         self._athlete: typing.Optional[str] = None
         self._title: typing.Optional[str] = None
-        self.tracks_by_date: typing.Dict[str, typing.List[Track]] = defaultdict(list)
+        self.daily_stats = DailyStats()
         self.year_tracks_date_count_dict: typing.Dict[int, int] = defaultdict(int)
         self.tracks: typing.List[Track] = []
-        self.length_range = QuantityRange()
-        self.length_range_by_date = QuantityRange()
-        self.total_length_year_dict: typing.Dict[int, pint.Quantity] = defaultdict(int)  # type: ignore
+        self.length_range = ValueRange()
+        self.length_range_by_date = ValueRange()
+        self.total_length_year_dict: typing.Dict[int, float] = defaultdict(float)
         self.units = "metric"
         self.colors = {
             "background": "#222222",
@@ -67,11 +71,16 @@ class Poster:
             "special": "#FFFF00",
             "track": "#4DD2FF",
         }
-        self.special_distance: typing.Dict[str, float] = {"special_distance1": 10, "special_distance2": 20}
+        self.special_distance: typing.Dict[str, float] = {"special_distance": 10000.0, "special_distance2": 20000.0}
         self.width = 200
         self.height = 300
         self.years = YearRange()
         self.tracks_drawer: typing.Optional["TracksDrawer"] = None
+        self.dpi: typing.Optional[float] = None
+        self.max_output_bytes: typing.Optional[int] = None
+        self.workers: typing.Optional[int] = 1
+        self._language: typing.Optional[str] = None
+        self._localedir: typing.Optional[str] = None
         self._trans: typing.Optional[typing.Callable[[str], str]] = None
         self.with_animation = False
         self.animation_time: int = 30
@@ -85,19 +94,35 @@ class Poster:
                 log.warning("Unable to set the locale to %s (%s)", language, str(e))
                 language = None
 
-        # Fall-back to NullTranslations, if the specified language translation cannot be found.
-        if language:
-            lang = gettext.translation("gpxposter", localedir=localedir, languages=[language], fallback=True)
-            if len(lang.info()) == 0:
-                log.warning(
-                    "Unable to load translations for %s from %s; falling back to the default translation.",
-                    language,
-                    localedir if localedir else "the system's default locale directory",
-                )
-        else:
-            lang = gettext.NullTranslations()
+        self._language = language
+        self._localedir = localedir
+        lang = self._load_translation()
+        if language and len(lang.info()) == 0:
+            log.warning(
+                "Unable to load translations for %s from %s; falling back to the default translation.",
+                language,
+                localedir if localedir else "the system's default locale directory",
+            )
         self._trans = lang.gettext
 
+    def _load_translation(self) -> gettext.NullTranslations:
+        # Fall-back to NullTranslations, if the specified language translation cannot be found.
+        if self._language:
+            return gettext.translation(
+                "gpxposter", localedir=self._localedir, languages=[self._language], fallback=True
+            )
+        return gettext.NullTranslations()
+
+    def __getstate__(self) -> typing.Dict[str, typing.Any]:
+        # translations with plural forms cannot be pickled (e.g. for worker processes); they are reloaded instead
+        state = self.__dict__.copy()
+        state["_trans"] = None
+        return state
+
+    def __setstate__(self, state: typing.Dict[str, typing.Any]) -> None:
+        self.__dict__.update(state)
+        self._trans = self._load_translation().gettext
+
     def translate(self, s: str) -> str:
         if self._trans is None:
             return s
@@ -140,40 +165,38 @@ class Poster:
         based on this set of tracks.
         """
         self.tracks = tracks
-        self.tracks_by_date.clear()
         self.length_range.clear()
-        self.length_range_by_date.clear()
         self.year_tracks_date_count_dict.clear()
         self._compute_years(tracks)
+        if self.years.from_year is None or self.years.to_year is None:
+            self.daily_stats = DailyStats()
+            self.length_range_by_date.clear()
+            return
+        self.daily_stats.build(self.years.from_year, self.years.to_year, tracks)
         for track in tracks:
-            if not self.years.contains(track.start_time()):
-                continue
-            text_date = track.start_time().strftime("%Y-%m-%d")
-            year = track.start_time().year
-            if text_date not in self.tracks_by_date:
-                self.year_tracks_date_count_dict[year] += 1
-            self.tracks_by_date[text_date].append(track)
-            self.length_range.extend(track.length())
-        for date_tracks in self.tracks_by_date.values():
-            length = pint.Quantity(sum(t.length() for t in date_tracks))
-            self.length_range_by_date.extend(length)
+            if self.years.contains(track.start_time()):
+                self.length_range.extend(track.length_meters)
+        self.length_range_by_date = self.daily_stats.length_range()
+        self.daily_stats.compute_color_indices(self.length_range_by_date)
+        for year in self.years.iter():
+            self.year_tracks_date_count_dict[year] = self.daily_stats.year_day_count(year)
 
     def draw(self, drawer: "TracksDrawer", output: str) -> None:
         """Set the Poster's drawer and draw the tracks."""
         self.tracks_drawer = drawer
-        d = svgwrite.Drawing(output, (f"{self.width}mm", f"{self.height}mm"))
+        d = StreamingDrawing(output, (f"{self.width}mm", f"{self.height}mm"))
         d.viewbox(0, 0, self.width, self.height)
-        d.add(d.rect((0, 0), (self.width, self.height), fill=self.colors["background"]))
-        self._draw_header(d)
-        self._draw_footer(d)
-        self._draw_tracks(d, XY(self.width - 20, self.height - 30 - 30), XY(10, 30))
-        d.save()
+        with d:
+            d.add(d.rect((0, 0), (self.width, self.height), fill=self.colors["background"]))
+            self._draw_header(d)
+            self._draw_footer(d)
+            self._draw_tracks(d, XY(self.width - 20, self.height - 30 - 30), XY(10, 30))
 
-    def m2u(self, m: pint.Quantity) -> float:
+    def m2u(self, m: float) -> float:
         """Convert meters to kilometers or miles, according to units."""
         if self.units == "metric":
-            return m.m_as(Units().km)
-        return m.m_as(Units().mile)
+            return m / meters_per_unit("km")
+        return m / meters_per_unit("mile")
 
     def u(self) -> str:
         """Return the unit of distance being used on the Poster."""
@@ -181,8 +204,8 @@ class Poster:
             return self.translate("km")
         return self.translate("mi")
 
-    def format_distance(self, d: pint.Quantity) -> str:
-        """Formats a distance using the locale specific float format and the selected unit."""
+    def format_distance(self, d: float) -> str:
+        """Formats a distance (in meters) using the locale specific float format and the selected unit."""
         return format_float(self.m2u(d)) + " " + self.u()
 
     def _draw_tracks(self, d: svgwrite.Drawing, size: XY, offset: XY) -> None:
@@ -280,8 +303,8 @@ class Poster:
             assert min_length is not None
             assert max_length is not None
         else:
-            min_length = pint.Quantity(0.0)
-            max_length = pint.Quantity(0.0)
+            min_length = 0.0
+            max_length = 0.0
         g.add(
             d.text(
                 self.translate("Min") + ": " + self.format_distance(min_length),
@@ -301,15 +324,15 @@ class Poster:
 
     def _compute_track_statistics(
         self,
-    ) -> typing.Tuple[pint.Quantity, pint.Quantity, QuantityRange, int]:
-        length_range = QuantityRange()
-        total_length = 0.0 * Units().meter
+    ) -> typing.Tuple[float, float, ValueRange, int]:
+        length_range = ValueRange()
+        total_length = 0.0
         self.total_length_year_dict.clear()
         weeks = {}
         for t in self.tracks:
-            total_length += t.length()
-            self.total_length_year_dict[t.start_time().year] += t.length()
-            length_range.extend(t.length())
+            total_length += t.length_meters
+            self.total_length_year_dict[t.start_time().year] += t.length_meters
+            length_range.extend(t.length_meters)
             # time.isocalendar()[1] -> week number
             weeks[(t.start_time().year, t.start_time().isocalendar()[1])] = 1
         return (
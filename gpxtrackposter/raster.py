@@ -0,0 +1,130 @@
+"""Rasterize projected lines into density grids and encode them as PNG images."""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import base64
+import struct
+import typing
+import zlib
+
+import numpy as np
+
+from gpxtrackposter.color_gradient import ColorGradient
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _line_samples(line: np.ndarray, width: int, height: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Return the flat pixel indices and weights of the samples of line that fall into the grid."""
+    starts = line[:-1]
+    deltas = np.diff(line, axis=0)
+    lengths = np.hypot(deltas[:, 0], deltas[:, 1])
+    samples = np.maximum(1, np.ceil(lengths)).astype(np.intp)
+    segment = np.repeat(np.arange(len(starts)), samples)
+    # position of each sample within its segment: 0.5 / n, 1.5 / n, ...
+    first_sample = np.cumsum(samples) - samples
+    fractions = (np.arange(len(segment)) - first_sample[segment] + 0.5) / samples[segment]
+    points = starts[segment] + fractions[:, np.newaxis] * deltas[segment]
+    columns = np.floor(points[:, 0]).astype(np.intp)
+    rows = np.floor(points[:, 1]).astype(np.intp)
+    inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+    weights = (lengths / samples)[segment]
+    return rows[inside] * width + columns[inside], weights[inside]
+
+
+def rasterize_lines(
+    lines: typing.Iterable[np.ndarray], width: int, height: int, batch_size: int = 1 << 20
+) -> np.ndarray:
+    """Accumulate the lengths of lines (in pixel coordinates) per pixel of a height x width grid.
+
+    Each segment is sampled at least once per pixel of its length, and each sample adds its share of the
+    segment's length to the pixel it falls into; so the result does not depend on the sampling rate of the
+    tracks. Parts of the lines outside of the grid are ignored. Samples are accumulated in batches of about
+    batch_size samples.
+    """
+    density = np.zeros(width * height, dtype=np.float64)
+    indices: typing.List[np.ndarray] = []
+    weights: typing.List[np.ndarray] = []
+    count = 0
+
+    def flush() -> None:
+        density[:] += np.bincount(np.concatenate(indices), np.concatenate(weights), width * height)
+        indices.clear()
+        weights.clear()
+
+    for line in lines:
+        if len(line) < 2:
+            continue
+        line_indices, line_weights = _line_samples(line, width, height)
+        indices.append(line_indices)
+        weights.append(line_weights)
+        count += len(line_indices)
+        if count >= batch_size:
+            flush()
+            count = 0
+    if indices:
+        flush()
+    return density.reshape(height, width)
+
+
+def tone_map(density: np.ndarray, gamma: float = 1.0, maximum: typing.Optional[float] = None) -> np.ndarray:
+    """Map densities in [0, maximum] (default: the largest density) to [0, 1] with a log and a gamma curve."""
+    if maximum is None:
+        maximum = float(density.max()) if density.size else 0.0
+    if maximum <= 0:
+        return np.zeros_like(density)
+    values = np.log1p(np.minimum(density, maximum)) / np.log1p(maximum)
+    if gamma != 1.0:
+        values = values**gamma
+    return values
+
+
+def colorize(layers: typing.List[typing.Tuple[np.ndarray, ColorGradient]], block_rows: int = 256) -> np.ndarray:
+    """Color value grids in [0, 1] with gradients and composite them (later layers on top).
+
+    The values are also used as opacities. The image is processed in blocks of block_rows rows to limit the
+    memory needed for intermediate float arrays.
+
+    Returns:
+        uint8 array of shape (height, width, 4) with (straight alpha) RGBA values.
+    """
+    height, width = layers[0][0].shape
+    rgba = np.zeros((height, width, 4), dtype=np.uint8)
+    tables = [gradient.rgb().astype(np.float32) / 255 for _, gradient in layers]
+    for row in range(0, height, block_rows):
+        # premultiplied RGB and alpha of the composited layers
+        rgb = np.zeros((min(block_rows, height - row), width, 3), dtype=np.float32)
+        alpha = np.zeros(rgb.shape[:2] + (1,), dtype=np.float32)
+        for (values, gradient), table in zip(layers, tables):
+            block = values[row : row + block_rows].astype(np.float32)[..., np.newaxis]
+            rgb = table[gradient.indices(block[..., 0])] * block + rgb * (1 - block)
+            alpha = block + alpha * (1 - block)
+        np.divide(rgb, alpha, out=rgb, where=alpha > 0)
+        rgba[row : row + block_rows, :, :3] = np.round(np.clip(rgb, 0.0, 1.0) * 255)
+        rgba[row : row + block_rows, :, 3] = np.round(alpha[..., 0] * 255)
+    return rgba
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Encode an RGBA image (uint8 array of shape (height, width, 4)) as PNG."""
+    height, width, _ = rgba.shape
+    # every row is prefixed with filter type 0 (none)
+    rows = np.zeros((height, 1 + 4 * width), dtype=np.uint8)
+    rows[:, 1:] = rgba.reshape(height, 4 * width)
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 6))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def png_data_uri(png: bytes) -> str:
+    return "data:image/png;base64," + base64.b64encode(png).decode("ascii")
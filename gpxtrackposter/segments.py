@@ -0,0 +1,77 @@
+"""Count how many tracks traverse each segment of a grid."""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import typing
+
+import numpy as np
+
+
+def quantize_line(line: np.ndarray, cell_size: float) -> np.ndarray:
+    """Snap the points of line to a grid with cell_size and drop consecutive duplicates."""
+    cells = np.round(line / cell_size).astype(np.int64)
+    if len(cells) < 2:
+        return cells
+    keep = np.empty(len(cells), dtype=bool)
+    keep[0] = True
+    keep[1:] = (cells[1:] != cells[:-1]).any(axis=1)
+    return cells[keep]
+
+
+def rasterize_cells(cells: np.ndarray) -> np.ndarray:
+    """Insert the grid cells between consecutive cells, such that each step moves by at most one cell per axis.
+
+    Tracks with different point spacings on the same street then traverse the same steps. The cells between
+    two cells are computed with integer arithmetic, so that a step sequence does not depend on the direction.
+    """
+    if len(cells) < 2:
+        return cells
+    deltas = cells[1:] - cells[:-1]
+    steps = np.abs(deltas).max(axis=1)
+    segment = np.repeat(np.arange(len(deltas)), steps)
+    k = np.arange(len(segment)) - np.repeat(np.cumsum(steps) - steps, steps)
+    n = steps[segment, np.newaxis]
+    # round(delta * k / n), rounding halves up
+    inner = cells[segment] + (2 * deltas[segment] * k[:, np.newaxis] + n) // (2 * n)
+    return np.vstack([inner, cells[-1:]])
+
+
+def track_segments(lines: typing.Iterable[np.ndarray], cell_size: float) -> np.ndarray:
+    """Return the distinct undirected grid segments of the lines of a track.
+
+    The lines are snapped to the grid and split into steps to neighboring cells.
+
+    Returns:
+        Integer array of shape (n, 4) with the grid coordinates (x1, y1, x2, y2) of each segment, where
+        (x1, y1) is the lexicographically smaller end point.
+    """
+    parts = []
+    for line in lines:
+        cells = rasterize_cells(quantize_line(line, cell_size))
+        if len(cells) < 2:
+            continue
+        starts, ends = cells[:-1], cells[1:]
+        swap = (starts[:, 0] > ends[:, 0]) | ((starts[:, 0] == ends[:, 0]) & (starts[:, 1] > ends[:, 1]))
+        first = np.where(swap[:, np.newaxis], ends, starts)
+        second = np.where(swap[:, np.newaxis], starts, ends)
+        parts.append(np.hstack([first, second]))
+    if not parts:
+        return np.zeros((0, 4), dtype=np.int64)
+    return np.unique(np.vstack(parts), axis=0)
+
+
+def count_segments(
+    lines_per_track: typing.Iterable[typing.Iterable[np.ndarray]], cell_size: float
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Count the number of tracks traversing each grid segment (a track counts at most once per segment).
+
+    Returns:
+        Tuple of the distinct segments (see track_segments) and the number of tracks of each segment.
+    """
+    per_track = [track_segments(lines, cell_size) for lines in lines_per_track]
+    if not per_track:
+        return np.zeros((0, 4), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    segments, counts = np.unique(np.vstack(per_track), axis=0, return_counts=True)
+    return segments, counts
@@ -0,0 +1,87 @@
+"""Share numpy arrays with worker processes through shared memory."""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+from multiprocessing import shared_memory
+import typing
+
+import numpy as np
+
+# shared memory name, number of columns and row offsets of the arrays
+SharedArraysHandle = typing.Tuple[str, int, typing.List[int]]
+
+
+class SharedArrays:
+    """Copy of a list of float arrays with the same number of columns in a single shared memory block.
+
+    Worker processes access the arrays through the (small, picklable) handle instead of receiving pickled
+    copies; see views(). The creating process owns the block and releases it when leaving the context.
+
+    Attributes:
+        handle: Name of the block, number of columns and row offsets of the arrays.
+        _shm: The shared memory block.
+
+    Methods:
+        close: Release the shared memory block.
+    """
+
+    def __init__(self, arrays: typing.List[np.ndarray], columns: int) -> None:
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        np.cumsum([len(array) for array in arrays], out=offsets[1:])
+        rows = int(offsets[-1])
+        # a shared memory block must not be empty
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, rows * columns * 8))
+        try:
+            data = np.ndarray((rows, columns), dtype=np.float64, buffer=self._shm.buf)
+            for array, start, end in zip(arrays, offsets[:-1], offsets[1:]):
+                data[start:end] = array
+            del data
+        except BaseException:
+            self.close()
+            raise
+        self.handle: SharedArraysHandle = (self._shm.name, columns, offsets.tolist())
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._shm.close()
+        self._shm.unlink()
+
+
+def views(shm: shared_memory.SharedMemory, handle: SharedArraysHandle, start: int, end: int) -> typing.List[np.ndarray]:
+    """Return read-only views of the arrays start to end of an attached block.
+
+    The views must be released before the block is closed.
+    """
+    _, columns, offsets = handle
+    data = np.ndarray((offsets[-1], columns), dtype=np.float64, buffer=shm.buf)
+    data.flags.writeable = False
+    return [data[offsets[i] : offsets[i + 1]] for i in range(start, end)]
+
+
+def call_with_views(
+    handle: SharedArraysHandle,
+    start: int,
+    end: int,
+    function: typing.Callable[..., typing.Any],
+    *args: typing.Any,
+) -> typing.Any:
+    """Attach to the block of handle and return function(views of the arrays start to end, *args).
+
+    The result of function must not reference the views.
+    """
+    shm = shared_memory.SharedMemory(name=handle[0])
+    try:
+        return function(views(shm, handle, start, end), *args)
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # the views are still referenced by the traceback of an exception; closed when garbage collected
+            pass
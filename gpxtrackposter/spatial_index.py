@@ -0,0 +1,94 @@
+"""Persist the border boxes of cached tracks for region queries."""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import json
+import logging
+import os
+import typing
+
+import s2sphere  # type: ignore
+
+from gpxtrackposter import utils
+
+log = logging.getLogger(__name__)
+
+
+class SpatialIndex:
+    """Map the checksums of GPX files to the border boxes of their tracks.
+
+    The index is stored as a single JSON file next to the cached tracks, such that tracks outside of a region
+    can be skipped without parsing them. It is advisory: entries that are missing (e.g. because concurrent
+    writers overwrote each other's updates) simply mean that the track has to be loaded to be filtered.
+
+    Attributes:
+        file_name: Name of the JSON file storing the index.
+        _boxes: Dict of checksum => (lat_lo, lng_lo, lat_hi, lng_hi) in degrees.
+        _modified: Whether the index has been changed since it was loaded.
+
+    Methods:
+        load: Load the index from its file, if it exists.
+        save: Store the index to its file, if it has been changed.
+        add: Add the border box of a track.
+        get: Return the border box of a track.
+        intersects: Whether the border box of a track intersects a region.
+    """
+
+    FILE_NAME = "index.json"
+
+    def __init__(self, cache_dir: str) -> None:
+        self.file_name = os.path.join(cache_dir, self.FILE_NAME)
+        self._boxes: typing.Dict[str, typing.List[float]] = {}
+        self._modified = False
+
+    def __len__(self) -> int:
+        return len(self._boxes)
+
+    def __contains__(self, checksum: str) -> bool:
+        return checksum in self._boxes
+
+    def load(self) -> None:
+        """Load the index from its file; a missing or corrupt file results in an empty index"""
+        self._boxes = {}
+        self._modified = False
+        try:
+            with open(self.file_name, "r", encoding="utf8") as json_file:
+                data = json.load(json_file)
+            self._boxes = {str(checksum): [float(v) for v in box] for checksum, box in data["boxes"].items()}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            log.warning("Ignoring corrupt spatial index %s: %s", self.file_name, str(e))
+
+    def save(self) -> None:
+        """Store the index to its file, if it has been changed"""
+        if not self._modified:
+            return
+        utils.write_json_atomically(self.file_name, {"boxes": self._boxes})
+        self._modified = False
+
+    def add(self, checksum: str, bbox: s2sphere.LatLngRect) -> None:
+        if bbox.is_empty():
+            return
+        lo, hi = bbox.lo(), bbox.hi()
+        box = [lo.lat().degrees, lo.lng().degrees, hi.lat().degrees, hi.lng().degrees]
+        if self._boxes.get(checksum) != box:
+            self._boxes[checksum] = box
+            self._modified = True
+
+    def get(self, checksum: str) -> typing.Optional[s2sphere.LatLngRect]:
+        """Return the border box of the track with checksum, or None if the track is not indexed"""
+        box = self._boxes.get(checksum)
+        if box is None:
+            return None
+        # the constructor keeps inverted longitude intervals (crossing the antimeridian) as they are
+        return s2sphere.LatLngRect(
+            s2sphere.LatLng.from_degrees(box[0], box[1]), s2sphere.LatLng.from_degrees(box[2], box[3])
+        )
+
+    def intersects(self, checksum: str, region: s2sphere.LatLngRect) -> bool:
+        """Whether the track with checksum may intersect region; unknown tracks may always intersect"""
+        bbox = self.get(checksum)
+        return bbox is None or bbox.intersects(region)
@@ -0,0 +1,74 @@
+"""Encode projected lines as compact SVG path data."""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import math
+import typing
+
+import numpy as np
+import svgwrite  # type: ignore
+
+
+def path_decimals(resolution: float) -> int:
+    """Return the number of decimals needed to keep rounding errors below a tenth of resolution."""
+    return max(0, math.ceil(-math.log10(resolution / 10)))
+
+
+def format_numbers(values: np.ndarray, decimals: int) -> str:
+    """Format integers (in units of 10^-decimals) as a compact, space separated list of SVG numbers.
+
+    Each number is formatted with as few decimals as possible, and leading zeros are omitted.
+    """
+    if len(values) == 0:
+        return ""
+    if decimals == 0:
+        return " ".join(map(str, values.tolist()))
+    # number of decimals needed by each value, i.e. without trailing zeros
+    precisions = np.full(len(values), decimals)
+    for i in range(1, decimals + 1):
+        precisions[values % 10**i == 0] = decimals - i
+    arguments = np.empty(2 * len(values), dtype=object)
+    arguments[0::2] = precisions.tolist()
+    arguments[1::2] = (values / 10**decimals).tolist()
+    text = " " + " ".join(["%.*f"] * len(values)) % tuple(arguments)
+    return text.replace(" 0.", " .").replace(" -0.", " -.")[1:]
+
+
+def encode_lines(lines: typing.Iterable[np.ndarray], decimals: int) -> str:
+    """Encode lines (arrays of shape (n, 2)) as SVG path data with relative moves.
+
+    The points are rounded to decimals before computing the relative moves, so rounding errors do not
+    accumulate along the lines.
+    """
+    parts = []
+    for line in lines:
+        if len(line) == 0:
+            continue
+        points = np.round(np.asarray(line, dtype=float) * 10**decimals).astype(np.int64)
+        parts.append("M" + format_numbers(points[0], decimals))
+        if len(points) > 1:
+            parts.append("l" + format_numbers(np.diff(points, axis=0).ravel(), decimals))
+    return "".join(parts)
+
+
+def path_element(path_data: str, **extra: typing.Any) -> svgwrite.path.Path:
+    """Create a path element for data created by encode_lines.
+
+    The element skips svgwrite's validation, which re-parses the (potentially huge) path data with a regular
+    expression.
+    """
+    return svgwrite.path.Path(d=path_data, debug=False, **extra)
+
+
+def encode_segments(segments: np.ndarray, decimals: int) -> str:
+    """Encode segments (array of shape (n, 4) with the end points x1, y1, x2, y2) as SVG path data.
+
+    Each segment becomes a subpath of an absolute move and a relative line.
+    """
+    if len(segments) == 0:
+        return ""
+    points = np.round(np.asarray(segments, dtype=float) * 10**decimals).astype(np.int64)
+    values = np.hstack([points[:, :2], points[:, 2:] - points[:, :2]]).ravel()
+    return ("M%s %sl%s %s" * len(segments)) % tuple(format_numbers(values, decimals).split(" "))
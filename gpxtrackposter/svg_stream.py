@@ -0,0 +1,156 @@
+"""Write SVG drawings incrementally instead of building the whole element tree in memory."""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import gzip
+import os
+import re
+import types
+import typing
+from xml.etree import ElementTree
+
+import svgwrite  # type: ignore
+
+from gpxtrackposter.exceptions import PosterError
+
+
+class Fragment:
+    """Pre-rendered SVG markup of a single element, which can be added to (streaming) svgwrite containers.
+
+    Attributes:
+        markup: SVG markup of the element.
+        elementname: Tag name of the element.
+
+    Methods:
+        tostring: Return the markup.
+        get_xml: Return the element as ElementTree element.
+    """
+
+    def __init__(self, markup: str) -> None:
+        m = re.match(r"<([\w:-]+)", markup)
+        if not m:
+            raise PosterError("Not an SVG element")
+        self.markup = markup
+        self.elementname = m.group(1)
+
+    def tostring(self) -> str:
+        return self.markup
+
+    def get_xml(self) -> ElementTree.Element:
+        return ElementTree.fromstring(self.markup)
+
+
+class StreamingGroup(svgwrite.container.Group):
+    """Group of a StreamingDrawing.
+
+    As long as the group has not been added to an open parent, elements are collected in memory like in a regular
+    svgwrite group. If it is added to an open parent while still empty, its start tag is written and all elements
+    added afterwards are written to the output immediately, until the group is closed.
+    """
+
+    def __init__(self, drawing: "StreamingDrawing", **extra: typing.Any) -> None:
+        super().__init__(factory=drawing, **extra)
+        self._drawing = drawing
+        self.is_written = False
+
+    def add(self, element: typing.Any) -> typing.Any:
+        if not self.is_written:
+            return super().add(element)
+        return self._drawing.write_element(self, element)
+
+
+class StreamingDrawing(svgwrite.Drawing):  # pylint: disable=too-many-ancestors
+    """svgwrite Drawing that writes its elements to the output file as soon as they are added.
+
+    Use the drawing as a context manager: entering it writes the XML header and the start tag of the svg element
+    (so its attributes, e.g. the viewbox, have to be set before), leaving it closes all open groups and the svg
+    element. Elements must be added in document order, i.e. once an element has been added to a group, its
+    previously opened sibling groups are closed and cannot be extended.
+    Output files ending with ".svgz" are gzip compressed.
+
+    Attributes:
+        _file: Output file, while the drawing is open.
+        _open_groups: Stack of the currently open groups, starting with the drawing itself.
+        _defs_count: Number of definitions that have been written with the svg start tag.
+
+    Methods:
+        g: Create a new (streaming) group.
+        add: Write an element to the svg element.
+        write_element: Write an element to an open group.
+    """
+
+    def __init__(self, filename: str, size: typing.Tuple[str, str], **extra: typing.Any) -> None:
+        self._file: typing.Optional[typing.TextIO] = None
+        self._open_groups: typing.List[svgwrite.container.Group] = []
+        self._defs_count = 0
+        super().__init__(filename, size, **extra)
+
+    def g(self, **extra: typing.Any) -> StreamingGroup:  # pylint: disable=invalid-name
+        return StreamingGroup(self, **extra)
+
+    def add(self, element: typing.Any) -> typing.Any:
+        if self._file is None:
+            return super().add(element)
+        return self.write_element(self, element)
+
+    def __enter__(self) -> "StreamingDrawing":
+        if self.filename.endswith(".svgz"):
+            self._file = gzip.open(self.filename, "wt", encoding="utf-8")
+        else:
+            self._file = open(self.filename, "w", encoding="utf-8")  # pylint: disable=consider-using-with
+        self._file.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+        root = self.tostring()
+        assert root.endswith("</svg>")
+        self._file.write(root[: -len("</svg>")])
+        self._defs_count = len(self.defs.elements)
+        self._open_groups = [self]
+        return self
+
+    def __exit__(
+        self,
+        exc_type: typing.Optional[typing.Type[BaseException]],
+        exc_value: typing.Optional[BaseException],
+        traceback: typing.Optional[types.TracebackType],
+    ) -> None:
+        assert self._file is not None
+        try:
+            if exc_type is None:
+                self._close_groups(self)
+                if len(self.defs.elements) > self._defs_count:
+                    # definitions added while drawing; SVG allows references to later definitions
+                    defs = svgwrite.container.Defs(factory=self)
+                    for element in self.defs.elements[self._defs_count :]:
+                        defs.add(element)
+                    self._file.write(defs.tostring())
+                self._file.write("</svg>")
+        finally:
+            self._file.close()
+            self._file = None
+            self._open_groups = []
+            if exc_type is not None:
+                os.remove(self.filename)
+
+    def write_element(self, parent: svgwrite.container.Group, element: typing.Any) -> typing.Any:
+        """Write element as the next child of the open group parent (or the drawing itself)."""
+        assert self._file is not None
+        if parent not in self._open_groups:
+            raise PosterError("Cannot add an element to an SVG group that has already been written.")
+        self._close_groups(parent)
+        if isinstance(element, StreamingGroup) and not element.elements:
+            start_tag = element.tostring()
+            assert start_tag.endswith(" />")
+            self._file.write(f"{start_tag[:-3]}>")
+            element.is_written = True
+            self._open_groups.append(element)
+        else:
+            self._file.write(element.tostring())
+        return element
+
+    def _close_groups(self, parent: svgwrite.container.Group) -> None:
+        """Close all open groups nested in parent."""
+        assert self._file is not None
+        while self._open_groups[-1] is not parent:
+            group = self._open_groups.pop()
+            self._file.write(f"</{group.elementname}>")
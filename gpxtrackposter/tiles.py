@@ -0,0 +1,294 @@
+"""Render tracks as XYZ tile pyramid for web maps."""
+# Copyright 2016-2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import os
+import typing
+
+import numpy as np
+import svgwrite  # type: ignore
+
+from gpxtrackposter import lod, raster, svg_path, utils
+from gpxtrackposter.color_gradient import ColorGradient
+from gpxtrackposter.exceptions import ParameterError
+
+log = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+TILE_FORMATS = ["png", "svg"]
+# number of tracks per pixel at which the colors of PNG tiles saturate; a fixed value (instead of the densest
+# pixel) keeps neighboring tiles consistent and allows to render them independently
+TILE_SATURATION = 32.0
+
+# lines (in pixels of the tile), color class and special flag of a track within a tile
+TileTrack = typing.Tuple[typing.List[np.ndarray], str, bool]
+# zoom, x, y of a tile
+TileKey = typing.Tuple[int, int, int]
+# format, size, format specific render arguments and tracks of a tile
+TileJob = typing.Tuple[str, int, typing.Tuple[typing.Any, ...], typing.List[TileTrack]]
+
+
+def tile_coordinates(xy: np.ndarray, zoom: int) -> np.ndarray:
+    """Convert Web-Mercator coordinates (see utils.mercator_xy) to tile units at zoom."""
+    # utils.mercator_xy maps the world to x in [0, 2] and y in [-0.5, 1.5]
+    tiles = np.empty_like(xy)
+    tiles[:, 0] = xy[:, 0] * (1 << zoom) / 2
+    tiles[:, 1] = (xy[:, 1] + 0.5) * (1 << zoom) / 2
+    return tiles
+
+
+def line_tiles(line: np.ndarray, margin: float) -> np.ndarray:
+    """Return the (x, y) tiles that line (in tile units) passes within margin (in tile units, < 0.5).
+
+    Returns:
+        Integer array of shape (n, 2).
+    """
+    if len(line) < 2:
+        points = line
+    else:
+        # sample each segment at least twice per tile of its length
+        deltas = np.diff(line, axis=0)
+        samples = np.maximum(1, np.ceil(2 * np.hypot(deltas[:, 0], deltas[:, 1]))).astype(np.intp)
+        segment = np.repeat(np.arange(len(deltas)), samples)
+        first_sample = np.cumsum(samples) - samples
+        fractions = (np.arange(len(segment)) - first_sample[segment]) / samples[segment]
+        points = np.vstack([line[:-1][segment] + fractions[:, np.newaxis] * deltas[segment], line[-1:]])
+    corners = [points + (dx, dy) for dx in (-margin, margin) for dy in (-margin, margin)]
+    return np.unique(np.floor(np.vstack(corners)).astype(np.int64), axis=0)
+
+
+def track_tiles(lines: typing.List[np.ndarray], zoom: int, margin: float) -> typing.Set[typing.Tuple[int, int]]:
+    """Return the tiles at zoom that the lines (in tile units) of a track pass within margin."""
+    count = 1 << zoom
+    tiles: typing.Set[typing.Tuple[int, int]] = set()
+    for line in lines:
+        if len(line) == 0:
+            continue
+        cells = line_tiles(line, margin)
+        inside = np.all((cells >= 0) & (cells < count), axis=1)
+        tiles.update(map(tuple, cells[inside].tolist()))
+    return tiles
+
+
+def clip_lines(lines: typing.List[np.ndarray], lo: np.ndarray, hi: np.ndarray) -> typing.List[np.ndarray]:
+    """Drop the parts of lines whose segments do not overlap the box [lo, hi], splitting the lines."""
+    clipped: typing.List[np.ndarray] = []
+    for line in lines:
+        if len(line) < 2:
+            continue
+        seg_lo = np.minimum(line[:-1], line[1:])
+        seg_hi = np.maximum(line[:-1], line[1:])
+        overlaps = np.all((seg_hi >= lo) & (seg_lo <= hi), axis=1)
+        # keep the end points of all overlapping segments
+        mask = np.zeros(len(line), dtype=bool)
+        mask[:-1] |= overlaps
+        mask[1:] |= overlaps
+        clipped.extend(run for run in utils.split_runs(line, mask) if len(run) >= 2)
+    return clipped
+
+
+def render_png_tile(
+    tracks: typing.List[TileTrack], tile_size: int, gradients: typing.List[ColorGradient], gamma: float
+) -> typing.Optional[bytes]:
+    """Render the density of the tracks as PNG tile; special tracks are drawn on top of the regular ones."""
+    layers = []
+    for special in [False, True]:
+        density = raster.rasterize_lines(
+            (line for lines, _, is_special in tracks if is_special == special for line in lines), tile_size, tile_size
+        )
+        if density.any():
+            layers.append((raster.tone_map(density, gamma, TILE_SATURATION), gradients[special]))
+    if not layers:
+        return None
+    return raster.encode_png(raster.colorize(layers))
+
+
+def render_svg_tile(tracks: typing.List[TileTrack], tile_size: int, style: str, passes: int) -> typing.Optional[bytes]:
+    """Render the tracks as SVG tile with the line passes and color classes of the heatmap poster."""
+    decimals = svg_path.path_decimals(1.0)
+    paths = []
+    for lines, color_class, _ in tracks:
+        path_data = svg_path.encode_lines(lod.simplify_lines(lines, 0.5), decimals)
+        if path_data:
+            paths.append((path_data, color_class))
+    if not paths:
+        return None
+    dr = svgwrite.Drawing(size=(f"{tile_size}px", f"{tile_size}px"), viewBox=f"0 0 {tile_size} {tile_size}")
+    dr.add(dr.style(style))
+    for index in range(passes):
+        for path_data, color_class in paths:
+            dr.add(svg_path.path_element(path_data, class_=f"{color_class} pass{index}"))
+    return dr.tostring().encode("utf8")
+
+
+def render_tile(job: TileJob) -> typing.Optional[bytes]:
+    """Render a tile job (format, tile size, format specific arguments, tracks); returns None for empty tiles"""
+    tile_format, tile_size, render_args, tracks = job
+    if tile_format == "png":
+        return render_png_tile(tracks, tile_size, *render_args)
+    return render_svg_tile(tracks, tile_size, *render_args)
+
+
+class TileExporter:
+    """Render tracks as XYZ tile pyramid ("<zoom>/<x>/<y>.<format>") for zoom levels 0 to max_zoom.
+
+    Tiles are assigned to the tracks they are passed by, and rendered in parallel by a process pool. Tiles
+    without tracks are skipped. A manifest ("tiles.json") stores a digest of the tracks and settings of every
+    tile, such that re-exports only render the tiles whose tracks changed and remove the obsolete ones.
+
+    Attributes:
+        directory: Output directory of the tiles.
+        max_zoom: Highest zoom level to render.
+        tile_format: "png" for density images, "svg" for heatmap line drawings.
+        tile_size: Width and height of the tiles in pixels.
+        workers: Number of parallel rendering processes (None: number of CPU cores, <= 1: no parallelism).
+        _render_args: Format specific arguments passed to the render function.
+        _settings: Description of the render arguments, which is part of the digests of the tiles.
+        _pad: Width of the border (in pixels) around a tile whose lines may be visible on the tile.
+        _tracks: List of (key, Web-Mercator lines, color class, special flag) of the tracks.
+
+    Methods:
+        set_png_style: Set the color gradients and gamma of PNG tiles.
+        set_svg_style: Set the CSS rules and line passes of SVG tiles.
+        add_track: Add the lines of a track.
+        export: Render the changed tiles.
+    """
+
+    MANIFEST_FILE_NAME = "tiles.json"
+
+    def __init__(self, directory: str, max_zoom: int, tile_format: str, workers: typing.Optional[int]) -> None:
+        if tile_format not in TILE_FORMATS:
+            raise ParameterError(f"Not a valid tile format: {tile_format}")
+        if max_zoom < 0:
+            raise ParameterError(f"Not a valid zoom level: {max_zoom} (must be >= 0)")
+        self.directory = directory
+        self.max_zoom = max_zoom
+        self.tile_format = tile_format
+        self.tile_size = TILE_SIZE
+        self.workers = workers
+        self._render_args: typing.Tuple[typing.Any, ...] = ()
+        self._settings = ""
+        self._pad = 1.0
+        self._tracks: typing.List[typing.Tuple[str, typing.List[np.ndarray], str, bool]] = []
+
+    def set_png_style(self, gradients: typing.List[ColorGradient], gamma: float) -> None:
+        """Set the color gradients of regular and special tracks and the gamma of the tone curve"""
+        self._render_args = (gradients, gamma)
+        self._settings = repr(([gradient.colors for gradient in gradients], gamma))
+        self._pad = 1.0
+
+    def set_svg_style(self, style: str, passes: typing.List[typing.Tuple[float, float]]) -> None:
+        """Set the CSS rules of the color and pass classes and the (opacity, width) of the line passes"""
+        self._render_args = (style, len(passes))
+        self._settings = repr((style, len(passes)))
+        self._pad = 1.0 + max(width for _, width in passes) / 2
+
+    def add_track(self, key: str, lines: typing.List[np.ndarray], color_class: str, special: bool) -> None:
+        """Add the Web-Mercator lines of a track; key identifies the track for incremental exports"""
+        self._tracks.append((key, lines, color_class, special))
+
+    def export(self) -> typing.Tuple[int, int]:
+        """Render the tiles whose tracks or settings changed since the last export
+
+        Returns:
+            Number of rendered tiles and number of unchanged tiles.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        old_digests = self._load_manifest()
+        digests: typing.Dict[str, str] = {}
+        rendered, unchanged = 0, 0
+        settings = repr((self.tile_format, self.tile_size, self._settings))
+        with contextlib.ExitStack() as stack:
+            map_jobs: typing.Callable[..., typing.Iterator[typing.Optional[bytes]]] = map
+            if self.workers is None or self.workers > 1:
+                executor = stack.enter_context(concurrent.futures.ProcessPoolExecutor(max_workers=self.workers))
+                map_jobs = functools.partial(executor.map, chunksize=8)
+            for zoom in range(self.max_zoom + 1):
+                keys = []
+                jobs = []
+                for (x, y), track_indices in sorted(self._assign_tiles(zoom).items()):
+                    name = f"{zoom}/{x}/{y}"
+                    tile_tracks = [self._tracks[i] for i in track_indices]
+                    digest = hashlib.sha256(
+                        "\n".join(
+                            [settings] + [f"{key} {color} {special}" for key, _, color, special in tile_tracks]
+                        ).encode("utf8")
+                    ).hexdigest()
+                    digests[name] = digest
+                    if old_digests.get(name) == digest:
+                        unchanged += 1
+                        continue
+                    keys.append((zoom, x, y))
+                    jobs.append(
+                        (
+                            self.tile_format,
+                            self.tile_size,
+                            self._render_args,
+                            self._tile_tracks(zoom, x, y, tile_tracks),
+                        )
+                    )
+                for key, data in zip(keys, map_jobs(render_tile, jobs)):
+                    self._write_tile(key, data)
+                rendered += len(jobs)
+                log.info("Zoom level %d: %d tile(s) rendered", zoom, len(jobs))
+        for name in old_digests.keys() - digests.keys():
+            zoom, x, y = (int(v) for v in name.split("/"))
+            self._write_tile((zoom, x, y), None)
+        utils.write_json_atomically(os.path.join(self.directory, self.MANIFEST_FILE_NAME), {"tiles": digests})
+        return rendered, unchanged
+
+    def _assign_tiles(self, zoom: int) -> typing.Dict[typing.Tuple[int, int], typing.List[int]]:
+        """Map the tiles at zoom to the indices of the tracks passing them"""
+        margin = self._pad / self.tile_size
+        tiles: typing.Dict[typing.Tuple[int, int], typing.List[int]] = {}
+        for index, (_, lines, _, _) in enumerate(self._tracks):
+            tile_lines = [tile_coordinates(line, zoom) for line in lines]
+            for tile in track_tiles(tile_lines, zoom, margin):
+                tiles.setdefault(tile, []).append(index)
+        return tiles
+
+    def _tile_tracks(
+        self, zoom: int, x: int, y: int, tracks: typing.List[typing.Tuple[str, typing.List[np.ndarray], str, bool]]
+    ) -> typing.List[TileTrack]:
+        """Return the lines of the tracks clipped to the (padded) tile, in pixels of the tile"""
+        origin = np.array([x, y], dtype=float)
+        margin = self._pad / self.tile_size
+        tile_tracks = []
+        for _, lines, color_class, special in tracks:
+            clipped = clip_lines([tile_coordinates(line, zoom) for line in lines], origin - margin, origin + 1 + margin)
+            if clipped:
+                tile_tracks.append(([(line - origin) * self.tile_size for line in clipped], color_class, special))
+        return tile_tracks
+
+    def _tile_file_name(self, key: TileKey) -> str:
+        zoom, x, y = key
+        return os.path.join(self.directory, str(zoom), str(x), f"{y}.{self.tile_format}")
+
+    def _write_tile(self, key: TileKey, data: typing.Optional[bytes]) -> None:
+        file_name = self._tile_file_name(key)
+        if data is None:
+            # empty or obsolete tile
+            if os.path.isfile(file_name):
+                os.remove(file_name)
+            return
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with open(file_name, "wb") as tile_file:
+            tile_file.write(data)
+
+    def _load_manifest(self) -> typing.Dict[str, str]:
+        try:
+            with open(os.path.join(self.directory, self.MANIFEST_FILE_NAME), "r", encoding="utf8") as json_file:
+                return {str(name): str(digest) for name, digest in json.load(json_file)["tiles"].items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            log.warning("Ignoring corrupt tile manifest: %s", str(e))
+            return {}
@@ -4,28 +4,47 @@
 # license that can be found in the LICENSE file.
 
 import datetime
+import threading
 import typing
 
 import pytz
 import s2sphere  # type: ignore
-import timezonefinder  # type: ignore
+
+if typing.TYPE_CHECKING:
+    # timezonefinder is only imported when needed, as importing and initializing it is slow
+    import timezonefinder  # type: ignore
 
 
 class TimezoneAdjuster:
-    _timezonefinder: typing.Optional[timezonefinder.TimezoneFinder] = None
+    """Adjust naive timestamps to the local time of a location; safe to use from multiple threads.
+
+    The underlying TimezoneFinder of each thread is created on its first adjustment, so that runs using only
+    cached tracks never load it.
+    """
+
+    # TimezoneFinder is not guaranteed to be thread-safe (some versions read from shared file handles), so each
+    # thread creates its own instance; only the creation is serialized
+    _local = threading.local()
+    _lock = threading.Lock()
+
+    @classmethod
+    def _timezonefinder(cls) -> "timezonefinder.TimezoneFinder":
+        finder = getattr(cls._local, "timezonefinder", None)
+        if finder is None:
+            with cls._lock:
+                import timezonefinder  # type: ignore
 
-    def __init__(self) -> None:
-        if not TimezoneAdjuster._timezonefinder:
-            TimezoneAdjuster._timezonefinder = timezonefinder.TimezoneFinder()
+                finder = timezonefinder.TimezoneFinder()
+            cls._local.timezonefinder = finder
+        return finder
 
     @classmethod
     def adjust(cls, time: datetime.datetime, latlng: s2sphere.LatLng) -> datetime.datetime:
         # If a timezone is set, there's nothing to do.
         if time.utcoffset():
             return time
-        assert cls._timezonefinder
         # if tz_name name is None set it to UTC
-        tz_name = cls._timezonefinder.timezone_at(lat=latlng.lat().degrees, lng=latlng.lng().degrees) or "UTC"
+        tz_name = cls._timezonefinder().timezone_at(lat=latlng.lat().degrees, lng=latlng.lng().degrees) or "UTC"
         tz = pytz.timezone(tz_name)
         tz_time = time.astimezone(tz)
         return tz_time
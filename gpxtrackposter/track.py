@@ -4,23 +4,37 @@
 # Use of this source code is governed by a MIT-style
 # license that can be found in the LICENSE file.
 
+import contextlib
 import datetime
 import json
+import math
 import os
 import typing
 
-import gpxpy  # type: ignore
+import numpy as np
 import pint  # type: ignore
 import s2sphere  # type: ignore
-import polyline  # type: ignore
-from stravalib.model import Activity as StravaActivity  # type: ignore
 
+from gpxtrackposter import lod, utils
 from gpxtrackposter.exceptions import TrackLoadError
 from gpxtrackposter.timezone_adjuster import TimezoneAdjuster
 from gpxtrackposter.units import Units
+from gpxtrackposter.xy import XY
 
+if typing.TYPE_CHECKING:
+    # gpxpy and stravalib are only imported when needed, as importing them is slow
+    import gpxpy  # type: ignore
+    from stravalib.model import Activity as StravaActivity  # type: ignore
 
-class Track:
+# Tolerances of the pre-simplified levels of the geometry pyramid, in Web-Mercator units (2 units = 360°);
+# at the equator they correspond to roughly 2m, 20m, 200m and 2km.
+PYRAMID_TOLERANCES = (1e-7, 1e-6, 1e-5, 1e-4)
+
+# precision of thumbnail coordinates, relative to the thumbnail size
+THUMBNAIL_DECIMALS = 5
+
+
+class Track:  # pylint: disable=too-many-public-methods
     """Create and maintain info about a given activity track (corresponding to one GPX file).
 
     Attributes:
@@ -31,13 +45,28 @@ class Track:
         _length_meters: Length of the track (2-dimensional).
         special: True if track is special, else False.
         activity_type: Activity type
+        _cache_file_names: Cache files the polylines can be reloaded from.
+        _polylines_released: True if the polylines have been dropped from memory, else False.
+        _bbox: Border box of the track, computed once after loading or appending (kept while the polylines are
+            released).
+        _mercator: Web-Mercator coordinates of the polylines, if they have been loaded from the cache.
+        _pyramids: For each cache file, the tolerances of the pre-simplified levels stored next to it.
+        _thumbnails: Thumbnails of the track that have already been computed, by tolerance.
 
     Methods:
         load_gpx: Load a GPX file into the current track.
-        bbox: Compute the border box of the track.
+        parse_gpx: Parse the contents of a GPX file into the current track.
+        bbox: Return the border box of the track.
         append: Append other track to current track.
         load_cache: Load track from cached json data.
         store_cache: Cache the current track.
+        release_polylines: Drop the polylines from memory, if they can be reloaded from the cache.
+        reload_polylines: Reload released polylines from the cache.
+        mercator_arrays: Return the Web-Mercator coordinates of the polylines.
+        geometry_at: Return the coordinates of the polylines, simplified to a tolerance.
+        polylines_at: Return the polylines as coordinate arrays, simplified to a tolerance.
+        thumbnail: Return the track projected into the unit square.
+        geometry: Context manager providing the polylines, reloading released ones temporarily.
     """
 
     def __init__(self) -> None:
@@ -45,11 +74,17 @@ class Track:
         self.polylines: typing.List[typing.List[s2sphere.LatLng]] = []
         self._start_time: typing.Optional[datetime.datetime] = None
         self._end_time: typing.Optional[datetime.datetime] = None
-        # Don't use Units().meter here, as this constructor is called from
-        # within a thread (which would create a second unit registry!)
+        # Store a plain float instead of a pint quantity, which keeps tracks cheap to create
+        # and to pickle when they are passed between loader processes.
         self._length_meters = 0.0
         self.special = False
         self.activity_type = None
+        self._cache_file_names: typing.List[str] = []
+        self._polylines_released = False
+        self._bbox: typing.Optional[s2sphere.LatLngRect] = None
+        self._mercator: typing.Optional[typing.List[np.ndarray]] = None
+        self._pyramids: typing.List[typing.List[float]] = []
+        self._thumbnails: typing.Dict[float, typing.List[np.ndarray]] = {}
 
     def load_gpx(self, file_name: str, timezone_adjuster: typing.Optional[TimezoneAdjuster]) -> None:
         """Load the GPX file into self.
@@ -59,27 +94,49 @@ class Track:
             timezone_adjuster: timezone adjuster
 
         Raises:
-            TrackLoadError: An error occurred while parsing the GPX file (empty or bad format).
-            PermissionError: An error occurred while opening the GPX file.
+            TrackLoadError: An error occurred while reading or parsing the GPX file (empty, bad format or bad
+                permissions).
+        """
+        self.file_names = [os.path.basename(file_name)]
+        try:
+            with open(file_name, "rb") as file:
+                data = file.read()
+        except PermissionError as e:
+            raise TrackLoadError("Cannot load GPX (bad permissions)") from e
+        except Exception as e:
+            raise TrackLoadError("Something went wrong when loading GPX.") from e
+        self.parse_gpx(file_name, data, timezone_adjuster)
+
+    def parse_gpx(self, file_name: str, data: bytes, timezone_adjuster: typing.Optional[TimezoneAdjuster]) -> None:
+        """Parse the already read contents of a GPX file into self.
+
+        Args:
+            file_name: Name of the GPX file the data has been read from.
+            data: Raw contents of the GPX file.
+            timezone_adjuster: timezone adjuster
+
+        Raises:
+            TrackLoadError: An error occurred while parsing the GPX data (empty or bad format).
         """
+        import gpxpy  # type: ignore
+
         try:
             self.file_names = [os.path.basename(file_name)]
             # Handle empty gpx files
             # (for example, treadmill runs pulled via garmin-connect-export)
-            if os.path.getsize(file_name) == 0:
+            if not data:
                 raise TrackLoadError("Empty GPX file")
-            with open(file_name, "r", encoding="utf8") as file:
-                self._load_gpx_data(gpxpy.parse(file), timezone_adjuster)
+            self._load_gpx_data(gpxpy.parse(data.decode("utf8")), timezone_adjuster)
         except TrackLoadError as e:
             raise e
         except gpxpy.gpx.GPXXMLSyntaxException as e:
             raise TrackLoadError("Failed to parse GPX.") from e
-        except PermissionError as e:
-            raise TrackLoadError("Cannot load GPX (bad permissions)") from e
         except Exception as e:
             raise TrackLoadError("Something went wrong when loading GPX.") from e
 
-    def load_strava(self, activity: StravaActivity) -> None:
+    def load_strava(self, activity: "StravaActivity") -> None:
+        import polyline  # type: ignore
+
         # use strava as file name
         self.file_names = [str(activity.id)]
         self.set_start_time(activity.start_date_local)
@@ -88,6 +145,7 @@ class Track:
         summary_polyline = activity.map.summary_polyline
         polyline_data = polyline.decode(summary_polyline) if summary_polyline else []
         self.polylines = [[s2sphere.LatLng.from_degrees(p[0], p[1]) for p in polyline_data]]
+        self._bbox = self._compute_bbox()
 
     def has_time(self) -> bool:
         return self._start_time is not None and self._end_time is not None
@@ -114,18 +172,49 @@ class Track:
     def length_meters(self, value: float) -> None:
         self._length_meters = value
 
+    @property
+    def polylines_released(self) -> bool:
+        return self._polylines_released
+
+    @property
+    def cache_file_names(self) -> typing.List[str]:
+        return self._cache_file_names
+
+    @property
+    def pyramids(self) -> typing.List[typing.List[float]]:
+        return self._pyramids
+
     def length(self) -> pint.Quantity:
         return self._length_meters * Units().meter
 
     def bbox(self) -> s2sphere.LatLngRect:
-        """Compute the smallest rectangle that contains the entire track (border box)."""
+        """Return the smallest rectangle that contains the entire track (border box).
+
+        The border box is computed once, after the track has been loaded or appended to.
+        """
+        if self._bbox is None:
+            assert not self._polylines_released
+            self._bbox = self._compute_bbox()
+        return self._bbox
+
+    def _compute_bbox(self) -> s2sphere.LatLngRect:
+        points = np.array(
+            [(latlng.lat().radians, latlng.lng().radians) for line in self.polylines for latlng in line], dtype=float
+        ).reshape(-1, 2)
+        if len(points) == 0:
+            return s2sphere.LatLngRect()
+        lat_lo, lng_lo = points.min(axis=0)
+        lat_hi, lng_hi = points.max(axis=0)
+        if -math.pi / 2 <= lat_lo and lat_hi <= math.pi / 2 and -math.pi < lng_lo and lng_hi - lng_lo < math.pi:
+            # the shortest longitude interval containing all points does not cross the antimeridian
+            return s2sphere.LatLngRect(s2sphere.LatLng(lat_lo, lng_lo), s2sphere.LatLng(lat_hi, lng_hi))
         bbox = s2sphere.LatLngRect()
         for line in self.polylines:
             for latlng in line:
                 bbox = bbox.union(s2sphere.LatLngRect.from_point(latlng.normalized()))
         return bbox
 
-    def _load_gpx_data(self, gpx: gpxpy.gpx.GPX, timezone_adjuster: typing.Optional[TimezoneAdjuster]) -> None:
+    def _load_gpx_data(self, gpx: "gpxpy.gpx.GPX", timezone_adjuster: typing.Optional[TimezoneAdjuster]) -> None:
         self._start_time, self._end_time = gpx.get_time_bounds()
         if not self.has_time():
             raise TrackLoadError("Track has no start or end time.")
@@ -144,10 +233,25 @@ class Track:
                 self.polylines.append(line)
         if gpx.tracks[0].type:
             self.activity_type = gpx.tracks[0].type.lower()
+        self._bbox = self._compute_bbox()
 
     def append(self, other: "Track") -> None:
         """Append other track to self."""
+        if self._polylines_released != other.polylines_released:
+            self.reload_polylines()
+            other.reload_polylines()
+        self._bbox = self.bbox().union(other.bbox())
+        if self._cache_file_names and other.cache_file_names:
+            self._cache_file_names.extend(other.cache_file_names)
+            self._pyramids.extend(other.pyramids)
+        else:
+            # the cache files would only hold a part of the merged track; use the polylines in memory instead
+            self._cache_file_names = []
+            self._pyramids = []
+        self._thumbnails.clear()
         self._end_time = other.end_time()
+        if self._mercator is not None:
+            self._mercator.extend(other.mercator_arrays())
         self.polylines.extend(other.polylines)
         self._length_meters += other.length_meters
         self.file_names.extend(other.file_names)
@@ -168,29 +272,180 @@ class Track:
                 self.set_start_time(datetime.datetime.strptime(data["start"], "%Y-%m-%d %H:%M:%S"))
                 self.set_end_time(datetime.datetime.strptime(data["end"], "%Y-%m-%d %H:%M:%S"))
                 self._length_meters = float(data["length"])
-                self.polylines = []
-                for data_line in data["segments"]:
-                    self.polylines.append(
-                        [s2sphere.LatLng.from_degrees(float(d["lat"]), float(d["lng"])) for d in data_line]
-                    )
+                self.polylines = self._polylines_from_cache_data(data)
+                self._mercator = self._mercator_from_cache_data(data)
+                pyramid = [float(tolerance) for tolerance in data.get("pyramid", [])]
         except Exception as e:
             raise TrackLoadError("Failed to load track data from cache.") from e
+        self._cache_file_names = [cache_file_name]
+        self._pyramids = [pyramid]
+        self._thumbnails.clear()
+        self._polylines_released = False
+        self._bbox = self._compute_bbox()
 
-    def store_cache(self, cache_file_name: str) -> None:
-        """Cache the current track"""
-        dir_name = os.path.dirname(cache_file_name)
-        if not os.path.isdir(dir_name):
-            os.makedirs(dir_name)
-        with open(cache_file_name, "w", encoding="utf8") as json_file:
-            lines_data = []
-            for line in self.polylines:
-                lines_data.append([{"lat": latlng.lat().degrees, "lng": latlng.lng().degrees} for latlng in line])
-            json.dump(
+    @staticmethod
+    def _polylines_from_cache_data(data: typing.Dict[str, typing.Any]) -> typing.List[typing.List[s2sphere.LatLng]]:
+        return [
+            [s2sphere.LatLng.from_degrees(float(d["lat"]), float(d["lng"])) for d in data_line]
+            for data_line in data["segments"]
+        ]
+
+    @staticmethod
+    def _mercator_from_cache_data(data: typing.Dict[str, typing.Any]) -> typing.Optional[typing.List[np.ndarray]]:
+        if "mercator" not in data:
+            return None
+        return [np.array(data_line, dtype=float).reshape(-1, 2) for data_line in data["mercator"]]
+
+    def release_polylines(self) -> None:
+        """Drop the polylines from memory, if they can be reloaded from the cache.
+
+        The border box of the track is kept, so that bbox() is still available.
+        """
+        if self._polylines_released or not self._cache_file_names:
+            return
+        self.bbox()
+        self.polylines = []
+        self._mercator = None
+        self._polylines_released = True
+
+    def reload_polylines(self) -> None:
+        """Reload released polylines from the cache permanently."""
+        if not self._polylines_released:
+            return
+        polylines = []
+        mercator: typing.Optional[typing.List[np.ndarray]] = []
+        try:
+            for cache_file_name in self._cache_file_names:
+                with open(cache_file_name, encoding="utf8") as data_file:
+                    data = json.load(data_file)
+                polylines.extend(self._polylines_from_cache_data(data))
+                mercator_lines = self._mercator_from_cache_data(data)
+                if mercator is not None and mercator_lines is not None:
+                    mercator.extend(mercator_lines)
+                else:
+                    mercator = None
+        except Exception as e:
+            raise TrackLoadError("Failed to reload track data from cache.") from e
+        self.polylines = polylines
+        self._mercator = mercator
+        self._polylines_released = False
+
+    @contextlib.contextmanager
+    def geometry(self) -> typing.Iterator[typing.List[typing.List[s2sphere.LatLng]]]:
+        """Provide the polylines of the track; released polylines are reloaded for the duration of the context."""
+        released = self._polylines_released
+        self.reload_polylines()
+        try:
+            yield self.polylines
+        finally:
+            if released:
+                self.release_polylines()
+
+    def mercator_arrays(self) -> typing.List[np.ndarray]:
+        """Return the Web-Mercator coordinates of the polylines as (n, 2) arrays.
+
+        The coordinates are taken from the cache, if it contains them, else they are computed.
+        """
+        if self._mercator is not None and len(self._mercator) == len(self.polylines):
+            return self._mercator
+        return [utils.mercator_xy(utils.latlngs_to_array(line)) for line in self.polylines]
+
+    def geometry_at(self, tolerance: float) -> typing.Tuple[typing.List[np.ndarray], typing.List[np.ndarray]]:
+        """Return the polylines simplified to at most tolerance (in Web-Mercator units).
+
+        If all cache files of the track have a pyramid level with a tolerance <= tolerance, the coarsest such
+        levels are read from the cache; else the full resolution polylines are returned.
+
+        Returns:
+            Tuple of lists of (n, 2) arrays with latitudes/longitudes (in degrees) and Web-Mercator coordinates.
+        """
+        if tolerance > 0 and self._pyramids and all(p and p[0] <= tolerance for p in self._pyramids):
+            latlng_arrays: typing.List[np.ndarray] = []
+            mercator_arrays: typing.List[np.ndarray] = []
+            try:
+                for cache_file_name, pyramid in zip(self._cache_file_names, self._pyramids):
+                    level = max(i for i, level_tolerance in enumerate(pyramid) if level_tolerance <= tolerance)
+                    with open(self._level_file_name(cache_file_name, level), encoding="utf8") as data_file:
+                        data = json.load(data_file)
+                    latlng_arrays.extend(np.array(line, dtype=float).reshape(-1, 2) for line in data["segments"])
+                    mercator_arrays.extend(np.array(line, dtype=float).reshape(-1, 2) for line in data["mercator"])
+            except Exception as e:
+                raise TrackLoadError("Failed to load track data from cache.") from e
+            return latlng_arrays, mercator_arrays
+        with self.geometry() as polylines:
+            return [utils.latlngs_to_array(line) for line in polylines], self.mercator_arrays()
+
+    def polylines_at(self, tolerance: float) -> typing.List[np.ndarray]:
+        """Return the polylines as (n, 2) arrays of latitudes/longitudes, simplified to at most tolerance."""
+        return self.geometry_at(tolerance)[0]
+
+    def thumbnail(self, tolerance: float = 0.0) -> typing.List[np.ndarray]:
+        """Return the track projected to fit into the unit square [0, 1] x [0, 1].
+
+        tolerance (relative to the unit square) selects the level of detail that is loaded (see geometry_at).
+        The thumbnail is computed once and kept with the track, unless its polylines are released.
+        """
+        if tolerance in self._thumbnails:
+            return self._thumbnails[tolerance]
+        bbox = self.bbox()
+        unit = XY(1, 1)
+        mercator_tolerance = 0.0
+        if tolerance > 0:
+            scale, _ = utils.projection_transform(bbox, unit, XY(0, 0))
+            mercator_tolerance = tolerance / scale
+        latlng_arrays, xy_arrays = self.geometry_at(mercator_tolerance)
+        lines = [
+            np.round(line, THUMBNAIL_DECIMALS)
+            for line in utils.project_arrays(bbox, unit, XY(0, 0), latlng_arrays, xy_arrays)
+        ]
+        if not self._polylines_released:
+            self._thumbnails[tolerance] = lines
+        return lines
+
+    @staticmethod
+    def _level_file_name(cache_file_name: str, level: int) -> str:
+        return f"{os.path.splitext(cache_file_name)[0]}.lod{level}.json"
+
+    def _store_pyramid(self, cache_file_name: str) -> None:
+        latlng_arrays = [utils.latlngs_to_array(line) for line in self.polylines]
+        mercator_arrays = self.mercator_arrays()
+        for level, tolerance in enumerate(PYRAMID_TOLERANCES):
+            masks = [lod.douglas_peucker_mask(xy, tolerance) for xy in mercator_arrays]
+            utils.write_json_atomically(
+                self._level_file_name(cache_file_name, level),
                 {
-                    "start": self.start_time().strftime("%Y-%m-%d %H:%M:%S"),
-                    "end": self.end_time().strftime("%Y-%m-%d %H:%M:%S"),
-                    "length": self._length_meters,
-                    "segments": lines_data,
+                    "tolerance": tolerance,
+                    "segments": [latlng[mask].ravel().tolist() for latlng, mask in zip(latlng_arrays, masks)],
+                    "mercator": [xy[mask].ravel().tolist() for xy, mask in zip(mercator_arrays, masks)],
                 },
-                json_file,
             )
+
+    def store_cache(self, cache_file_name: str, with_mercator: bool = False, with_pyramid: bool = False) -> None:
+        """Cache the current track
+
+        The cache file is written to a temporary file first and then renamed, such that concurrent
+        readers and writers (e.g. multiple hosts sharing one cache directory) never see partial files.
+        If with_mercator is True, the Web-Mercator coordinates of the polylines are stored as well.
+        If with_pyramid is True, pre-simplified versions of the polylines (see PYRAMID_TOLERANCES) are stored
+        in additional files next to the cache file.
+        """
+        dir_name = os.path.dirname(cache_file_name)
+        os.makedirs(dir_name, exist_ok=True)
+        lines_data = []
+        for line in self.polylines:
+            lines_data.append([{"lat": latlng.lat().degrees, "lng": latlng.lng().degrees} for latlng in line])
+        data: typing.Dict[str, typing.Any] = {
+            "start": self.start_time().strftime("%Y-%m-%d %H:%M:%S"),
+            "end": self.end_time().strftime("%Y-%m-%d %H:%M:%S"),
+            "length": self._length_meters,
+            "segments": lines_data,
+        }
+        if with_mercator:
+            data["mercator"] = [xy.ravel().tolist() for xy in self.mercator_arrays()]
+        if with_pyramid:
+            # the levels are stored first, such that they exist as soon as the cache file refers to them
+            self._store_pyramid(cache_file_name)
+            data["pyramid"] = list(PYRAMID_TOLERANCES)
+        utils.write_json_atomically(cache_file_name, data)
+        self._cache_file_names = [cache_file_name]
+        self._pyramids = [list(data.get("pyramid", []))]
@@ -7,20 +7,25 @@
 # license that can be found in the LICENSE file.
 
 import concurrent.futures
+import contextlib
 import hashlib
 import logging
 import os
 import json
 import datetime
+import re
 import shutil
+import sys
+import threading
 import typing
 from typing import Any
 
 import pint  # type: ignore
 import s2sphere  # type: ignore
-from stravalib import Client  # type: ignore
 
+from gpxtrackposter import utils
 from gpxtrackposter.exceptions import ParameterError, TrackLoadError
+from gpxtrackposter.spatial_index import SpatialIndex
 from gpxtrackposter.timezone_adjuster import TimezoneAdjuster
 from gpxtrackposter.track import Track
 from gpxtrackposter.units import Units
@@ -37,12 +42,41 @@ def load_gpx_file(file_name: str, timezone_adjuster: TimezoneAdjuster) -> Track:
     return t
 
 
-def load_cached_track_file(cache_file_name: str, file_name: str) -> Track:
+def parse_gpx_data(
+    file_name: str,
+    data: bytes,
+    timezone_adjuster: TimezoneAdjuster,
+    cache_file_name: typing.Optional[str] = None,
+    cache_mercator: bool = False,
+    cache_pyramid: bool = False,
+) -> Track:
+    """Parse the already read contents of an individual GPX file as a track by using Track.parse_gpx()
+
+    If cache_file_name is given, the track is stored to the cache (including its Web-Mercator coordinates,
+    if cache_mercator is True, and its geometry pyramid, if cache_pyramid is True) and its polylines are released.
+    """
+    log.info("Parsing track %s...", os.path.basename(file_name))
+    t = Track()
+    t.parse_gpx(file_name, data, timezone_adjuster)
+    if cache_file_name:
+        try:
+            t.store_cache(cache_file_name, cache_mercator, cache_pyramid)
+        except Exception as e:
+            log.error("Failed to store track %s to cache: %s", file_name, str(e))
+        else:
+            log.info("Stored track %s to cache", file_name)
+            t.release_polylines()
+    return t
+
+
+def load_cached_track_file(cache_file_name: str, file_name: str, release_polylines: bool = False) -> Track:
     """Load an individual track from cache files"""
     try:
         t = Track()
         t.load_cache(cache_file_name)
         t.file_names = [os.path.basename(file_name)]
+        if release_polylines:
+            t.release_polylines()
         log.info("Loaded track %s from cache file %s", file_name, cache_file_name)
         return t
     except Exception as e:
@@ -53,26 +87,42 @@ class TrackLoader:
     """Handle the loading of tracks from cache and/or GPX files
 
     Attributes:
-        _min_length: All tracks shorter than this value are filtered out.
+        _min_length_meters: All tracks shorter than this value (in meters) are filtered out.
         special_file_names: Tracks marked as special in command line args
         year_range: All tracks outside of this range will be filtered out.
         cache_dir: Directory used to store cached tracks
         _activity_type: Only gpx files with activity type are considered
+        _shard: Only GPX files of this shard (index, count) are considered
+        _region: Only tracks intersecting this border box are considered
+        _streaming: Only keep track metadata in memory (metadata-only tracks); polylines are reloaded from the cache
+            when drawing
+        _backend: Type of workers used for parsing ("process", "thread" or "auto")
+        _cache_mercator: Store the Web-Mercator coordinates of the tracks in new cache entries
+        _cache_pyramid: Store pre-simplified versions of the tracks next to new cache entries
 
     Methods:
         clear_cache: Remove cache directory
         load_tracks: Load all data from cache and GPX files
+        iter_tracks: Load all data from cache and GPX files and yield the sorted and merged tracks
+        ingest_tracks: Load the GPX files of the current shard into the cache
+        verify_cache: Return the GPX files that are missing in the cache
     """
 
     def __init__(self, workers: typing.Optional[int]) -> None:
         self._workers = workers
-        self._min_length: pint.Quantity = 1 * Units().km
+        self._min_length_meters = 1000.0
         self.special_file_names: typing.List[str] = []
         self.year_range = YearRange()
         self.cache_dir: typing.Optional[str] = None
         self.strava_cache_file = ""
-        self._cache_file_names: typing.Dict[str, str] = {}
+        self._checksums: typing.Dict[str, str] = {}
         self._activity_type: str = "all"
+        self._shard: typing.Optional[typing.Tuple[int, int]] = None
+        self._region: typing.Optional[s2sphere.LatLngRect] = None
+        self._streaming = False
+        self._backend = "auto"
+        self._cache_mercator = False
+        self._cache_pyramid = False
 
     def set_cache_dir(self, cache_dir: str) -> None:
         self.cache_dir = cache_dir
@@ -87,16 +137,211 @@ class TrackLoader:
                 log.error("Failed: %s", str(e))
 
     def set_min_length(self, min_length: pint.Quantity) -> None:
-        self._min_length = min_length
+        self._min_length_meters = min_length.m_as(Units().meter)
 
     def set_activity(self, activity_type: str) -> None:
         self._activity_type = activity_type.lower()
 
+    def set_shard(self, shard: str) -> None:
+        """Restrict loading to one shard of the GPX files
+
+        Args:
+            shard: A string "I/N" selecting the I-th of N shards (1 <= I <= N).
+
+        Raises:
+            ParameterError: The shard string is malformed.
+        """
+        m = re.match(r"^(\d+)/(\d+)$", shard)
+        if not m:
+            raise ParameterError(f"Not a valid shard (expected I/N): {shard}")
+        index, count = int(m.group(1)), int(m.group(2))
+        if not 1 <= index <= count:
+            raise ParameterError(f"Not a valid shard (1 <= I <= N): {shard}")
+        self._shard = (index - 1, count)
+
+    def set_region(self, region: str) -> None:
+        """Restrict loading to the tracks passing through a region
+
+        Args:
+            region: A string "LAT,LNG,RADIUS_KM" selecting the area within RADIUS_KM around LAT,LNG.
+
+        Raises:
+            ParameterError: The region string is malformed.
+        """
+        values = region.split(",")
+        if len(values) != 3:
+            raise ParameterError(f"Not a valid region (expected LAT,LNG,RADIUS_KM): {region}")
+        try:
+            lat, lng, radius = (float(v) for v in values)
+        except ValueError as e:
+            raise ParameterError(f"Not a valid region (expected LAT,LNG,RADIUS_KM): {region}") from e
+        if not (-90 < lat < 90 and -180 <= lng <= 180):
+            raise ParameterError(f"Not a valid region center: {region}")
+        if radius <= 0:
+            raise ParameterError(f"Not a valid region radius: {region} (must be > 0)")
+        self._region = utils.region_rect(s2sphere.LatLng.from_degrees(lat, lng), radius)
+
+    def set_backend(self, backend: str) -> None:
+        """Select the type of parallel workers
+
+        Args:
+            backend: "process" for a process pool, "thread" for a thread pool sharing the unit registry and
+                timezone finder, or "auto" for threads on free-threaded Python builds and processes otherwise.
+
+        Raises:
+            ParameterError: The backend is unknown.
+        """
+        if backend not in ("auto", "process", "thread"):
+            raise ParameterError(f"Not a valid worker backend: {backend}")
+        self._backend = backend
+
+    def _uses_threads(self) -> bool:
+        if self._backend == "auto":
+            # sys._is_gil_enabled() exists since Python 3.13
+            is_gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)
+            return not is_gil_enabled()
+        return self._backend == "thread"
+
+    def _create_executor(self) -> concurrent.futures.Executor:
+        if self._uses_threads():
+            return concurrent.futures.ThreadPoolExecutor(max_workers=self._workers or os.cpu_count())
+        return concurrent.futures.ProcessPoolExecutor(max_workers=self._workers)
+
+    def set_cache_mercator(self, cache_mercator: bool) -> None:
+        """Store the Web-Mercator coordinates of new cache entries, such that drawing them skips the projection math"""
+        self._cache_mercator = cache_mercator
+
+    def set_cache_pyramid(self, cache_pyramid: bool) -> None:
+        """Store pre-simplified versions of new cache entries, such that coarse posters load less geometry"""
+        self._cache_pyramid = cache_pyramid
+
+    def set_streaming(self, streaming: bool) -> None:
+        """Only keep track metadata in memory; the polylines are stored in and reloaded from the cache"""
+        self._streaming = streaming
+
     def load_tracks(self, base_dir: str) -> typing.List[Track]:
         """Load tracks base_dir and return as a List of tracks"""
+        return list(self.iter_tracks(base_dir))
+
+    def iter_tracks(self, base_dir: str) -> typing.Generator[Track, None, None]:
+        """Load tracks from base_dir and yield them in chronological order, merging them on the fly
+
+        All tracks are loaded and sorted before the first one is yielded. In streaming mode, they only hold their
+        metadata and border box, i.e. only their polylines are kept out of memory; use Track.geometry() to access
+        them.
+        """
+        if self._streaming and not self.cache_dir:
+            raise ParameterError("Streaming tracks requires a cache directory")
+        file_names = self._list_shard_gpx_files(base_dir)
+        spatial_index = SpatialIndex(self.cache_dir) if self.cache_dir else None
+        if spatial_index is not None:
+            spatial_index.load()
+            if self._region is not None:
+                file_names = self._list_region_gpx_files(file_names, spatial_index)
+        tracks = self._load_tracks_from_files(file_names)
+        if spatial_index is not None:
+            self._update_spatial_index(spatial_index, tracks)
+        yield from self._filter_and_merge_tracks(tracks)
+
+    def ingest_tracks(self, base_dir: str) -> int:
+        """Load the GPX files of the current shard into the (possibly shared) cache
+
+        Returns:
+            Number of tracks of the shard that are available in the cache.
+        """
+        if not self.cache_dir:
+            raise ParameterError("Ingesting tracks requires a cache directory")
+        file_names = self._list_shard_gpx_files(base_dir)
+        tracks = self._load_tracks_from_files(file_names)
+        spatial_index = SpatialIndex(self.cache_dir)
+        spatial_index.load()
+        self._update_spatial_index(spatial_index, tracks)
+        return len(tracks)
+
+    def verify_cache(self, base_dir: str) -> typing.List[str]:
+        """Return the GPX files of base_dir that have no valid entry in the cache"""
+        if not self.cache_dir:
+            raise ParameterError("Verifying the cache requires a cache directory")
+        file_names = self._list_shard_gpx_files(base_dir)
+        missing = []
+        for file_name in file_names:
+            try:
+                cache_file_name = self._get_cache_file_name(file_name)
+            except TrackLoadError:
+                missing.append(file_name)
+                continue
+            if not self._is_complete_cache_file(cache_file_name):
+                missing.append(file_name)
+        return missing
+
+    @staticmethod
+    def _is_complete_cache_file(cache_file_name: str) -> bool:
+        """Cheaply check that a cache file exists and is a complete JSON object, without parsing it"""
+        # cache files are written atomically; the check only catches truncated files of other writers
+        try:
+            with open(cache_file_name, "rb") as cache_file:
+                if cache_file.read(1) != b"{":
+                    return False
+                cache_file.seek(max(1, os.fstat(cache_file.fileno()).st_size - 16))
+                return cache_file.read().rstrip().endswith(b"}")
+        except OSError:
+            return False
+
+    def _list_shard_gpx_files(self, base_dir: str) -> typing.List[str]:
         file_names = list(self._list_gpx_files(base_dir))
         log.info("GPX files: %d", len(file_names))
+        if self._shard is not None:
+            if not self.cache_dir:
+                raise ParameterError("Sharding requires a cache directory")
+            file_names = [f for f in file_names if self._is_in_shard(os.path.relpath(f, os.path.abspath(base_dir)))]
+            log.info("GPX files in shard %d/%d: %d", self._shard[0] + 1, self._shard[1], len(file_names))
+        return file_names
+
+    def _list_region_gpx_files(self, file_names: typing.List[str], spatial_index: SpatialIndex) -> typing.List[str]:
+        """Drop the GPX files whose indexed tracks are entirely outside of the region"""
+        assert self._region is not None
+        region_file_names = []
+        for file_name in file_names:
+            try:
+                checksum = self._get_checksum(file_name)
+            except TrackLoadError:
+                # let the loader report the error
+                region_file_names.append(file_name)
+                continue
+            if spatial_index.intersects(checksum, self._region):
+                region_file_names.append(file_name)
+        log.info("GPX files possibly in region: %d", len(region_file_names))
+        return region_file_names
+
+    def _update_spatial_index(self, spatial_index: SpatialIndex, tracks: typing.List[Track]) -> None:
+        """Add the border boxes of newly loaded tracks to the spatial index and store it"""
+        # tracks only know the base names of their GPX files
+        checksums = {os.path.basename(file_name): checksum for file_name, checksum in self._checksums.items()}
+        for t in tracks:
+            checksum = checksums.get(t.file_names[0])
+            if checksum is not None and checksum not in spatial_index:
+                spatial_index.add(checksum, t.bbox())
+        try:
+            spatial_index.save()
+        except OSError as e:
+            log.error("Failed to store spatial index %s: %s", spatial_index.file_name, str(e))
+
+    def _is_in_shard(self, relative_file_name: str) -> bool:
+        """Deterministically assign a GPX file to a shard based on its path relative to the GPX directory
 
+        The path is hashed (instead of the file contents), so that each host only reads the files of its shard.
+        """
+        assert self._shard is not None
+        index, count = self._shard
+        path_hash = hashlib.sha256(relative_file_name.replace(os.sep, "/").encode("utf-8")).hexdigest()
+        return int(path_hash[:16], 16) % count == index
+
+    def _load_tracks_from_files(self, file_names: typing.List[str]) -> typing.List[Track]:
+        if self._workers is not None and self._workers <= 1:
+            return self._load_tracks_sequentially(file_names)
+        return self._load_tracks_pipelined(file_names)
+
+    def _load_tracks_sequentially(self, file_names: typing.List[str]) -> typing.List[Track]:
         tracks: typing.List[Track] = []
 
         # load track from cache
@@ -111,13 +356,126 @@ class TrackLoader:
         remaining_file_names = [f for f in file_names if f not in cached_tracks]
         if remaining_file_names:
             log.info("Trying to load %d track(s) from GPX files; this may take a while...", len(remaining_file_names))
-            timezone_adjuster = TimezoneAdjuster()
-            loaded_tracks = self._load_tracks(remaining_file_names, timezone_adjuster)
+            loaded_tracks = self._load_gpx_files(remaining_file_names, TimezoneAdjuster())
             tracks.extend(loaded_tracks.values())
             log.info("Conventionally loaded tracks: %d", len(loaded_tracks))
-            self._store_tracks_to_cache(loaded_tracks)
 
-        return self._filter_and_merge_tracks(tracks)
+        return tracks
+
+    def _load_tracks_pipelined(self, file_names: typing.List[str]) -> typing.List[Track]:
+        """Load tracks in overlapping stages connected by futures
+
+        A thread pool reads the files and computes their checksums, a process (or thread) pool parses the
+        cached tracks or GPX data, and a single writer thread stores newly parsed tracks to the cache. Each stage
+        is submitted as soon as its input is available. The number of files that have been read but not yet
+        parsed is bounded, which limits the memory used by raw file contents.
+        """
+        log.info("Trying to load %d track(s) from cache or GPX files...", len(file_names))
+        max_workers = self._workers or os.cpu_count() or 1
+        pending_slots = threading.BoundedSemaphore(4 * max_workers)
+        timezone_adjuster = TimezoneAdjuster()
+        tracks: typing.Dict[str, Track] = {}
+        cached_count = 0
+
+        def read(file_name: str, use_cache: bool) -> typing.Tuple[bytes, typing.Optional[str], bool]:
+            """Return the contents of the GPX file, its cache file name, and whether it is loaded from the cache"""
+            pending_slots.acquire()  # pylint: disable=consider-using-with
+            try:
+                with open(file_name, "rb") as file:
+                    data = file.read()
+                self._checksums[file_name] = hashlib.sha256(data).hexdigest()
+                cache_file_name = self._get_cache_file_name(file_name) if self.cache_dir else None
+                if use_cache and cache_file_name is not None and os.path.isfile(cache_file_name):
+                    return b"", cache_file_name, True
+                return data, cache_file_name, False
+            except BaseException:
+                pending_slots.release()
+                raise
+
+        with contextlib.ExitStack() as stack:
+            io_executor = stack.enter_context(concurrent.futures.ThreadPoolExecutor())
+            parse_executor = stack.enter_context(self._create_executor())
+            store_executor = stack.enter_context(concurrent.futures.ThreadPoolExecutor(max_workers=1))
+
+            def parse(
+                file_name: str, data: bytes, cache_file_name: typing.Optional[str], from_cache: bool
+            ) -> "concurrent.futures.Future[Track]":
+                if from_cache:
+                    assert cache_file_name is not None
+                    future = parse_executor.submit(load_cached_track_file, cache_file_name, file_name, self._streaming)
+                elif self._streaming:
+                    # store the track from within the worker, such that its polylines never enter this process
+                    future = parse_executor.submit(
+                        parse_gpx_data,
+                        file_name,
+                        data,
+                        timezone_adjuster,
+                        cache_file_name,
+                        self._cache_mercator,
+                        self._cache_pyramid,
+                    )
+                else:
+                    future = parse_executor.submit(parse_gpx_data, file_name, data, timezone_adjuster)
+                future.add_done_callback(lambda _: pending_slots.release())
+                return future
+
+            # the stage and file name of each unfinished future
+            stages: typing.Dict["concurrent.futures.Future[Any]", typing.Tuple[str, str]] = {
+                io_executor.submit(read, file_name, True): ("read", file_name) for file_name in file_names
+            }
+            while stages:
+                done, _ = concurrent.futures.wait(stages, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    stage, file_name = stages.pop(future)
+                    if stage == "read":
+                        try:
+                            data, cache_file_name, from_cache = future.result()
+                        except Exception as e:
+                            log.error("Error while reading %s: %s", file_name, str(e))
+                            continue
+                        parse_future = parse(file_name, data, cache_file_name, from_cache)
+                        stages[parse_future] = ("cache" if from_cache else "parse", file_name)
+                    elif stage in ("cache", "parse"):
+                        try:
+                            t = future.result()
+                        except TrackLoadError as e:
+                            if stage == "cache":
+                                # corrupt cache file: fall back to parsing the GPX file
+                                stages[io_executor.submit(read, file_name, False)] = ("read", file_name)
+                            else:
+                                log.error("Error while loading %s: %s", file_name, str(e))
+                            continue
+                        tracks[file_name] = t
+                        if stage == "cache":
+                            cached_count += 1
+                        elif self.cache_dir and not self._streaming:
+                            store_future = store_executor.submit(self._store_track_to_cache, file_name, t)
+                            stages[store_future] = ("store", file_name)
+                    else:
+                        # stored track; errors are logged by _store_track_to_cache
+                        future.result()
+
+        log.info("Loaded tracks from cache: %d", cached_count)
+        log.info("Conventionally loaded tracks: %d", len(tracks) - cached_count)
+        return [tracks[f] for f in file_names if f in tracks]
+
+    def _load_gpx_files(
+        self, file_names: typing.List[str], timezone_adjuster: TimezoneAdjuster
+    ) -> typing.Dict[str, Track]:
+        """Load GPX files one by one and store them to the cache"""
+        tracks = {}
+        for file_name in file_names:
+            try:
+                t = load_gpx_file(file_name, timezone_adjuster)
+            except TrackLoadError as e:
+                log.error("Error while loading %s: %s", file_name, str(e))
+                continue
+            if self.cache_dir:
+                self._store_track_to_cache(file_name, t)
+                if self._streaming:
+                    t.release_polylines()
+            tracks[file_name] = t
+        return tracks
 
     def load_strava_tracks(self, strava_config: str) -> typing.List[Track]:
         tracks = []
@@ -133,6 +491,8 @@ class TrackLoader:
         with open(strava_config, encoding="utf8") as f:
             strava_data = json.load(f)
         filter_type = strava_data.pop("activity_type", None)
+        from stravalib import Client  # type: ignore
+
         client = Client()
         response = client.refresh_access_token(**strava_data)
         client.access_token = response["access_token"]
@@ -152,125 +512,79 @@ class TrackLoader:
             t.load_strava(activity)
             tracks.append(t)
         self._store_strava_tracks_to_cache(tracks)
-        return self._filter_and_merge_tracks(tracks)
+        return list(self._filter_and_merge_tracks(tracks))
 
     def _filter_tracks(self, tracks: typing.List[Track]) -> typing.List[Track]:
         filtered_tracks = []
         for t in tracks:
             file_name = t.file_names[0]
-            if t.length().magnitude == 0:
+            if t.length_meters == 0:
                 log.info("%s: skipping empty track", file_name)
             elif not t.has_time():
                 log.info("%s: skipping track without start or end time", file_name)
             elif not self.year_range.contains(t.start_time()):
                 log.info("%s: skipping track with wrong year %d", file_name, t.start_time().year)
+            elif self._region is not None and not self._region.intersects(t.bbox()):
+                log.info("%s: skipping track outside of region", file_name)
             else:
                 t.special = file_name in self.special_file_names
                 filtered_tracks.append(t)
         return filtered_tracks
 
-    def _filter_and_merge_tracks(self, tracks: typing.List[Track]) -> typing.List[Track]:
-        tracks = self._filter_tracks(tracks)
+    def _filter_and_merge_tracks(self, tracks: typing.List[Track]) -> typing.Generator[Track, None, None]:
+        tracks = sorted(self._filter_tracks(tracks), key=lambda t1: t1.start_time())
         # merge tracks that took place within one hour
-        tracks = self._merge_tracks(tracks)
-        # filter out tracks with length < min_length
-        tracks = [t for t in tracks if t.length() >= self._min_length]
-        # filter out tracks with wrong activity type
-        tracks = [t for t in tracks if self._activity_type in (t.activity_type, "all")]
-        return tracks
+        for t in self._merge_tracks(tracks):
+            # filter out tracks with length < min_length
+            if t.length_meters < self._min_length_meters:
+                continue
+            # filter out tracks with wrong activity type
+            if self._activity_type not in (t.activity_type, "all"):
+                continue
+            yield t
 
     @staticmethod
-    def _merge_tracks(tracks: typing.List[Track]) -> typing.List[Track]:
+    def _merge_tracks(tracks: typing.Iterable[Track]) -> typing.Generator[Track, None, None]:
+        """Merge consecutive tracks that took place within one hour; tracks must be sorted by start time"""
         log.info("Merging tracks...")
-        tracks = sorted(tracks, key=lambda t1: t1.start_time())
-        merged_tracks = []
+        merged_track = None
+        merged_count = 0
         last_end_time = None
         for t in tracks:
-            if last_end_time is None:
-                merged_tracks.append(t)
-            else:
+            if merged_track is not None and last_end_time is not None:
                 dt = (t.start_time() - last_end_time).total_seconds()
                 if 0 < dt < 3600:
-                    merged_tracks[-1].append(t)
-                else:
-                    merged_tracks.append(t)
+                    merged_track.append(t)
+                    merged_count += 1
+                    last_end_time = t.end_time()
+                    continue
+                yield merged_track
+            merged_track = t
             last_end_time = t.end_time()
-        log.info("Merged %d track(s)", len(tracks) - len(merged_tracks))
-        return merged_tracks
-
-    def _load_tracks(
-        self, file_names: typing.List[str], timezone_adjuster: TimezoneAdjuster
-    ) -> typing.Dict[str, Track]:
-        tracks = {}
-
-        if self._workers is not None and self._workers <= 1:
-            for file_name in file_names:
-                try:
-                    t = load_gpx_file(file_name, timezone_adjuster)
-                except TrackLoadError as e:
-                    log.error("Error while loading %s: %s", file_name, str(e))
-                else:
-                    tracks[file_name] = t
-            return tracks
-
-        with concurrent.futures.ProcessPoolExecutor(max_workers=self._workers) as executor:
-            future_to_file_name = {
-                executor.submit(load_gpx_file, file_name, timezone_adjuster): file_name for file_name in file_names
-            }
-        for future in concurrent.futures.as_completed(future_to_file_name):
-            file_name = future_to_file_name[future]
-            try:
-                t = future.result()
-            except TrackLoadError as e:
-                log.error("Error while loading %s: %s", file_name, str(e))
-            else:
-                tracks[file_name] = t
-
-        return tracks
+        if merged_track is not None:
+            yield merged_track
+        log.info("Merged %d track(s)", merged_count)
 
     def _load_tracks_from_cache(self, file_names: typing.List[str]) -> typing.Dict[str, Track]:
         tracks = {}
 
-        if self._workers is not None and self._workers <= 1:
-            for file_name in file_names:
-                try:
-                    t = load_cached_track_file(self._get_cache_file_name(file_name), file_name)
-                except Exception:
-                    # silently ignore failed cache load attempts
-                    pass
-                else:
-                    tracks[file_name] = t
-            return tracks
-
-        with concurrent.futures.ProcessPoolExecutor(max_workers=self._workers) as executor:
-            future_to_file_name = {
-                executor.submit(load_cached_track_file, self._get_cache_file_name(file_name), file_name): file_name
-                for file_name in file_names
-            }
-        for future in concurrent.futures.as_completed(future_to_file_name):
-            file_name = future_to_file_name[future]
+        for file_name in file_names:
             try:
-                t = future.result()
+                t = load_cached_track_file(self._get_cache_file_name(file_name), file_name, self._streaming)
             except Exception:
                 # silently ignore failed cache load attempts
                 pass
             else:
                 tracks[file_name] = t
-
         return tracks
 
-    def _store_tracks_to_cache(self, tracks: typing.Dict[str, Track]) -> None:
-        if (not tracks) or (not self.cache_dir):
-            return
-
-        log.info("Storing %d track(s) to cache...", len(tracks))
-        for file_name, t in tracks.items():
-            try:
-                t.store_cache(self._get_cache_file_name(file_name))
-            except Exception as e:
-                log.error("Failed to store track %s to cache: %s", file_name, str(e))
-            else:
-                log.info("Stored track %s to cache", file_name)
+    def _store_track_to_cache(self, file_name: str, t: Track) -> None:
+        try:
+            t.store_cache(self._get_cache_file_name(file_name), self._cache_mercator, self._cache_pyramid)
+        except Exception as e:
+            log.error("Failed to store track %s to cache: %s", file_name, str(e))
+        else:
+            log.info("Stored track %s to cache", file_name)
 
     def _store_strava_tracks_to_cache(self, tracks: typing.List[Track]) -> None:
         if (not tracks) or (not self.cache_dir):
@@ -318,11 +632,9 @@ class TrackLoader:
             if name.endswith(".gpx") and os.path.isfile(path_name):
                 yield path_name
 
-    def _get_cache_file_name(self, file_name: str) -> str:
-        assert self.cache_dir
-
-        if file_name in self._cache_file_names:
-            return self._cache_file_names[file_name]
+    def _get_checksum(self, file_name: str) -> str:
+        if file_name in self._checksums:
+            return self._checksums[file_name]
 
         try:
             with open(file_name, "rb") as file:
@@ -332,6 +644,10 @@ class TrackLoader:
         except Exception as e:
             raise TrackLoadError("Failed to compute checksum.") from e
 
-        cache_file_name = os.path.join(self.cache_dir, f"{checksum}.json")
-        self._cache_file_names[file_name] = cache_file_name
-        return cache_file_name
+        self._checksums[file_name] = checksum
+        return checksum
+
+    def _get_cache_file_name(self, file_name: str) -> str:
+        assert self.cache_dir
+
+        return os.path.join(self.cache_dir, f"{self._get_checksum(file_name)}.json")
@@ -5,23 +5,57 @@
 # license that can be found in the LICENSE file.
 
 import argparse
+import concurrent.futures
+import copy
+import locale
+import os
+import typing
 
-import pint  # type: ignore
+import numpy as np
+import s2sphere  # type: ignore
 import svgwrite  # type: ignore
 
-from gpxtrackposter import utils
+from gpxtrackposter import lod, svg_path, utils
+from gpxtrackposter.color_gradient import ColorGradient
+from gpxtrackposter.exceptions import PosterError
 from gpxtrackposter.poster import Poster
-from gpxtrackposter.quantity_range import QuantityRange
+from gpxtrackposter.track import Track
+from gpxtrackposter.value_range import ValueRange
 from gpxtrackposter.xy import XY
 
+# minimal number of years for which worker processes render the years of a poster
+PARALLEL_MIN_YEARS = 16
+
+# drawer rendering fragments in a worker process
+_fragment_drawer: typing.Optional["TracksDrawer"] = None
+
+
+def _init_fragment_worker(drawer: "TracksDrawer", locale_name: str) -> None:
+    global _fragment_drawer  # pylint: disable=global-statement
+    _fragment_drawer = drawer
+    # month names and number formats depend on the locale
+    locale.setlocale(locale.LC_ALL, locale_name)
+
+
+def _render_fragment(key: typing.Any) -> str:
+    assert _fragment_drawer is not None
+    return _fragment_drawer.render_fragment(key)
+
 
 class TracksDrawer:
-    """Base class that other drawer classes inherit from."""
+    """Base class that other drawer classes inherit from.
+
+    Drawers whose poster consists of independent parts (e.g. years or grid cells) can implement render_fragment,
+    which renders a part to SVG markup, and render the parts with render_fragments, which distributes them to
+    worker processes; the markup is added to the poster as svg_stream.Fragment.
+    """
 
     def __init__(self, the_poster: Poster):
         self.poster = the_poster
+        self._gradients: typing.Dict[typing.Tuple[str, str], ColorGradient] = {}
 
-    def create_args(self, args_parser: argparse.ArgumentParser) -> None:
+    @classmethod
+    def create_args(cls, args_parser: argparse.ArgumentParser) -> None:
         pass
 
     def fetch_args(self, args: argparse.Namespace) -> None:
@@ -30,7 +64,93 @@ class TracksDrawer:
     def draw(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, size: XY, offset: XY) -> None:
         pass
 
-    def color(self, length_range: QuantityRange, length: pint.Quantity, is_special: bool = False) -> str:
+    def render_fragment(self, key: typing.Any) -> str:
+        """Render the part of the poster identified by key (which must be picklable) to SVG markup."""
+        raise PosterError(f"{type(self).__name__} does not render fragments.")
+
+    def render_fragments(self, keys: typing.List[typing.Any], min_parallel: int = 2) -> typing.Iterator[str]:
+        """Render the parts of the poster identified by keys (see render_fragment) in the order of keys.
+
+        If there are at least min_parallel keys and the poster allows multiple workers, the parts are rendered by
+        a pool of worker processes, each of which gets the fragment_context of the drawer; so the drawer must be
+        prepared for rendering before. The markup does not depend on the number of workers.
+        """
+        workers = min(self.poster.workers or os.cpu_count() or 1, len(keys))
+        if workers <= 1 or len(keys) < max(2, min_parallel):
+            yield from map(self.render_fragment, keys)
+            return
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_fragment_worker,
+            initargs=(self.fragment_context(), locale.setlocale(locale.LC_ALL)),
+        ) as executor:
+            yield from executor.map(_render_fragment, keys, chunksize=max(1, len(keys) // (4 * workers)))
+
+    def fragment_context(self) -> "TracksDrawer":
+        """Return the copy of the drawer that is sent to worker processes rendering fragments.
+
+        The copy's poster has no tracks; drawers whose fragments need them have to override this.
+        """
+        drawer = copy.copy(self)
+        drawer.poster = copy.copy(self.poster)
+        drawer.poster.tracks = []
+        drawer.poster.tracks_drawer = None
+        return drawer
+
+    @staticmethod
+    def fragment_drawing() -> svgwrite.Drawing:
+        """Return a drawing used as element factory when rendering fragments."""
+        return svgwrite.Drawing()
+
+    def track_geometry(
+        self, tr: Track, bbox: s2sphere.LatLngRect, size: XY, offset: XY
+    ) -> typing.Tuple[typing.List[np.ndarray], typing.List[np.ndarray]]:
+        """Return the lines of the track (see Track.geometry_at) with the level of detail needed for the poster's dpi
+        when projected into size/offset."""
+        tolerance = 0.0
+        if self.poster.dpi:
+            scale, _ = utils.projection_transform(bbox, size, offset)
+            tolerance = lod.mm_per_pixel(self.poster.dpi) / scale
+        return tr.geometry_at(tolerance)
+
+    def project_track(self, tr: Track, bbox: s2sphere.LatLngRect, size: XY, offset: XY) -> typing.List[np.ndarray]:
+        """Project the track into size/offset, loading only the level of detail needed for the poster's dpi."""
+        latlng_arrays, xy_arrays = self.track_geometry(tr, bbox, size, offset)
+        return utils.project_arrays(bbox, size, offset, latlng_arrays, xy_arrays)
+
+    def simplify_tracks(
+        self, lines_per_track: typing.List[typing.List[np.ndarray]], copies: int = 1, unit: float = 1.0
+    ) -> typing.List[typing.List[np.ndarray]]:
+        """Simplify the projected lines of the tracks to the level of detail of the poster's output resolution.
+
+        copies is the number of times each line is drawn, which is needed to estimate the output size; unit is
+        the size of one unit of the lines on the poster (in mm), e.g. the size of a cell for thumbnails.
+        """
+        if self.poster.dpi is None and self.poster.max_output_bytes is None:
+            return lines_per_track
+        tolerance = lod.mm_per_pixel(self.poster.dpi) / unit if self.poster.dpi else 0.0
+        return lod.simplify_tracks(
+            lines_per_track, tolerance, self.poster.max_output_bytes, copies, lod.mm_per_pixel(lod.DEFAULT_DPI) / unit
+        )
+
+    def path_decimals(self, unit: float = 1.0) -> int:
+        """Return the number of decimals of path coordinates needed for the poster's output resolution.
+
+        unit is the size of one unit of the coordinates on the poster (in mm), see simplify_tracks.
+        """
+        return svg_path.path_decimals(lod.mm_per_pixel(self.poster.dpi or lod.DEFAULT_DPI) / unit)
+
+    def gradient(self, is_special: bool = False) -> ColorGradient:
+        """Return the (cached) color gradient for regular or special tracks."""
         color1 = self.poster.colors["special"] if is_special else self.poster.colors["track"]
         color2 = self.poster.colors["special2"] if is_special else self.poster.colors["track2"]
-        return utils.interpolate_color(color1, color2, length_range.relative_position(length))
+        key = (color1, color2)
+        if key not in self._gradients:
+            self._gradients[key] = ColorGradient(color1, color2)
+        return self._gradients[key]
+
+    def color(self, length_range: ValueRange, length: float, is_special: bool = False) -> str:
+        return self.gradient(is_special).color(length_range.relative_position(length))
+
+    def color_by_index(self, index: int, is_special: bool = False) -> str:
+        return self.gradient(is_special).colors[index]
@@ -3,17 +3,34 @@
 # Use of this source code is governed by a MIT-style
 # license that can be found in the LICENSE file.
 
+import functools
+import threading
 import typing
 
 import pint  # type: ignore
 
 
 class Units:
-    _instance = None
+    """Provide access to a single, process-wide unit registry; safe to use from multiple threads."""
+
+    _instance: typing.Optional[pint.UnitRegistry] = None
+    _lock = threading.Lock()
 
     def __init__(self) -> None:
         if not Units._instance:
-            Units._instance = pint.UnitRegistry()
+            with Units._lock:
+                if not Units._instance:
+                    try:
+                        # cache the parsed unit definitions on disk, which speeds up subsequent runs
+                        Units._instance = pint.UnitRegistry(cache_folder=":auto:")
+                    except OSError:
+                        Units._instance = pint.UnitRegistry()
 
     def __getattr__(self, name: str) -> typing.Any:
         return getattr(Units._instance, name)
+
+
+@functools.lru_cache(maxsize=None)
+def meters_per_unit(unit: str) -> float:
+    """Return the length of a unit of the unit registry (e.g. "km" or "mile") in meters."""
+    return float((1 * getattr(Units(), unit)).m_as(Units().meter))
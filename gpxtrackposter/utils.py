@@ -4,14 +4,19 @@
 # Use of this source code is governed by a MIT-style
 # license that can be found in the LICENSE file.
 
+import json
 import locale
 from itertools import takewhile, count as itercount
 import math
+import os
+import tempfile
 import typing
 
 import colour  # type: ignore
+import numpy as np
 import s2sphere  # type: ignore
 
+from gpxtrackposter.layout import compute_grid_layout
 from gpxtrackposter.value_range import ValueRange
 from gpxtrackposter.xy import XY
 
@@ -29,9 +34,31 @@ def lat2y(lat_deg: float) -> float:
     return 0.5 - math.log(math.tan(math.pi / 4 * (1 + lat_deg / 90))) / math.pi
 
 
-def project(
-    bbox: s2sphere.LatLngRect, size: XY, offset: XY, latlnglines: typing.List[typing.List[s2sphere.LatLng]]
-) -> typing.List[typing.List[typing.Tuple[float, float]]]:
+def latlngs_to_array(latlngs: typing.List[s2sphere.LatLng]) -> np.ndarray:
+    """Convert a list of LatLng objects to an (n, 2) array of latitudes and longitudes in degrees."""
+    return np.array([(latlng.lat().degrees, latlng.lng().degrees) for latlng in latlngs], dtype=float).reshape(-1, 2)
+
+
+def mercator_xy(latlng_array: np.ndarray) -> np.ndarray:
+    """Vectorized version of latlng2xy for an (n, 2) array of latitudes and longitudes in degrees."""
+    xy = np.empty_like(latlng_array)
+    xy[:, 0] = latlng_array[:, 1] / 180 + 1
+    xy[:, 1] = 0.5 - np.log(np.tan(math.pi / 4 * (1 + latlng_array[:, 0] / 90))) / math.pi
+    return xy
+
+
+def region_rect(center: s2sphere.LatLng, radius_km: float) -> s2sphere.LatLngRect:
+    """Return a border box around center such that a circle with radius_km (in KM) is visible."""
+    er = 6378.1
+    quarter = er * math.pi / 2
+    dlat = 90 * radius_km / quarter
+    scale = 1 / math.cos(center.lat().radians)
+    dlng = scale * 90 * radius_km / quarter
+    return s2sphere.LatLngRect.from_center_size(center, s2sphere.LatLng.from_degrees(2 * dlat, 2 * dlng))
+
+
+def projection_transform(bbox: s2sphere.LatLngRect, size: XY, offset: XY) -> typing.Tuple[float, XY]:
+    """Return scale and offset of the affine transform that maps the Mercator coordinates of bbox into size."""
     min_x = lng2x(bbox.lng_lo().degrees)
     d_x = lng2x(bbox.lng_hi().degrees) - min_x
     while d_x >= 2:
@@ -43,22 +70,66 @@ def project(
     d_y = abs(max_y - min_y)
 
     scale = size.x / d_x if size.x / size.y <= d_x / d_y else size.y / d_y
-    offset = offset + 0.5 * (size - scale * XY(d_x, -d_y)) - scale * XY(min_x, min_y)
+    return scale, offset + 0.5 * (size - scale * XY(d_x, -d_y)) - scale * XY(min_x, min_y)
+
+
+def bbox_mask(bbox: s2sphere.LatLngRect, latlng_array: np.ndarray) -> np.ndarray:
+    """Vectorized version of bbox.contains for an (n, 2) array of latitudes and longitudes in degrees."""
+    if bbox.is_empty():
+        return np.zeros(len(latlng_array), dtype=bool)
+    lat = latlng_array[:, 0]
+    lng = latlng_array[:, 1]
+    mask = (lat >= bbox.lat_lo().degrees) & (lat <= bbox.lat_hi().degrees)
+    if bbox.lng().is_full():
+        return mask
+    lng_lo = bbox.lng_lo().degrees
+    lng_hi = bbox.lng_hi().degrees
+    if bbox.lng().is_inverted():
+        return mask & ((lng >= lng_lo) | (lng <= lng_hi))
+    return mask & (lng >= lng_lo) & (lng <= lng_hi)
+
+
+def split_runs(points: np.ndarray, mask: np.ndarray) -> typing.List[np.ndarray]:
+    """Split points into the maximal runs of consecutive points for which mask is True."""
+    if mask.all():
+        return [points] if len(points) > 0 else []
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+    return [points[start:end] for start, end in zip(edges[::2], edges[1::2])]
+
+
+def project_arrays(
+    bbox: s2sphere.LatLngRect,
+    size: XY,
+    offset: XY,
+    latlng_arrays: typing.List[np.ndarray],
+    xy_arrays: typing.Optional[typing.List[np.ndarray]] = None,
+) -> typing.List[np.ndarray]:
+    """Project lines given as (n, 2) arrays of latitudes and longitudes in degrees into size/offset.
+
+    Points outside of bbox are clipped, splitting the lines at these points. If the Mercator coordinates of
+    the lines are already known, they can be passed as xy_arrays to skip their computation.
+
+    Returns:
+        List of (n, 2) arrays of projected points.
+    """
+    scale, transform_offset = projection_transform(bbox, size, offset)
     lines = []
-    for latlngline in latlnglines:
-        line = []
-        for latlng in latlngline:
-            if bbox.contains(latlng):
-                line.append((offset + scale * latlng2xy(latlng)).tuple())
-            else:
-                if len(line) > 0:
-                    lines.append(line)
-                    line = []
-        if len(line) > 0:
-            lines.append(line)
+    for i, latlng_array in enumerate(latlng_arrays):
+        xy = mercator_xy(latlng_array) if xy_arrays is None else xy_arrays[i]
+        points = np.empty_like(xy)
+        points[:, 0] = transform_offset.x + scale * xy[:, 0]
+        points[:, 1] = transform_offset.y + scale * xy[:, 1]
+        lines.extend(split_runs(points, bbox_mask(bbox, latlng_array)))
     return lines
 
 
+def project(
+    bbox: s2sphere.LatLngRect, size: XY, offset: XY, latlnglines: typing.List[typing.List[s2sphere.LatLng]]
+) -> typing.List[typing.List[typing.Tuple[float, float]]]:
+    lines = project_arrays(bbox, size, offset, [latlngs_to_array(line) for line in latlnglines])
+    return [[tuple(point) for point in line.tolist()] for line in lines]
+
+
 def compute_bounds_xy(lines: typing.List[typing.List[XY]]) -> typing.Tuple[ValueRange, ValueRange]:
     range_x = ValueRange()
     range_y = ValueRange()
@@ -72,24 +143,7 @@ def compute_bounds_xy(lines: typing.List[typing.List[XY]]) -> typing.Tuple[Value
 def compute_grid(
     count: int, dimensions: XY
 ) -> typing.Tuple[typing.Optional[float], typing.Optional[typing.Tuple[int, int]]]:
-    # this is somehow suboptimal O(count^2). I guess it's possible in O(count)
-    min_waste = -1.0
-    best_size = None
-    best_counts = None
-    for count_x in range(1, count + 1):
-        size_x = dimensions.x / count_x
-        for count_y in range(1, count + 1):
-            if count_x * count_y >= count:
-                size_y = dimensions.y / count_y
-                size = min(size_x, size_y)
-                waste = dimensions.x * dimensions.y - count * size * size
-                if waste < 0:
-                    continue
-                if best_size is None or waste < min_waste:
-                    best_size = size
-                    best_counts = count_x, count_y
-                    min_waste = waste
-    return best_size, best_counts
+    return compute_grid_layout(count, dimensions.x, dimensions.y)
 
 
 def interpolate_color(color1: str, color2: str, ratio: float) -> str:
@@ -121,3 +175,31 @@ def make_key_times(year_count: int) -> typing.List[str]:
     s = list(takewhile(lambda n: n < 1, itercount(0, 1 / year_count)))
     s.append(1)
     return [str(round(i, 2)) for i in s]
+
+
+def _read_umask() -> int:
+    # the umask can only be read by setting it; do this once at import, before any worker threads are started
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+_UMASK = _read_umask()
+
+
+def write_json_atomically(file_name: str, data: typing.Dict[str, typing.Any]) -> None:
+    """Write data as JSON to file_name, such that readers never see a partially written file.
+
+    The file gets the permissions of a file created with open(), so that a cache directory can be shared by several
+    users.
+    """
+    fd, tmp_file_name = tempfile.mkstemp(dir=os.path.dirname(file_name), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf8") as json_file:
+            json.dump(data, json_file)
+        # mkstemp creates the file with mode 0600
+        os.chmod(tmp_file_name, 0o666 & ~_UMASK)
+        os.replace(tmp_file_name, file_name)
+    except BaseException:
+        os.remove(tmp_file_name)
+        raise
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+"""Measure the time needed to compute grid layouts for increasing numbers of cells."""
+
+import timeit
+
+from gpxtrackposter.layout import compute_grid_layout
+
+COUNTS = [10, 100, 1000, 10000, 100000]
+REPETITIONS = 100
+
+
+def main() -> None:
+    print(f"{'cells':>8} {'grid':>12} {'time per layout':>16}")
+    for count in COUNTS:
+        # bypass the memoization to measure the solver itself
+        seconds = timeit.timeit(
+            lambda c=count: compute_grid_layout.__wrapped__(c, 180.0, 240.0), number=REPETITIONS  # type: ignore
+        )
+        _, counts = compute_grid_layout(count, 180.0, 240.0)
+        assert counts is not None
+        print(f"{count:>8} {f'{counts[0]}x{counts[1]}':>12} {1e6 * seconds / REPETITIONS:>13.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
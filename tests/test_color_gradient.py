@@ -0,0 +1,34 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import numpy as np
+
+from gpxtrackposter.color_gradient import ColorGradient, gradient_index
+from gpxtrackposter.utils import interpolate_color
+
+
+def test_gradient_index() -> None:
+    assert gradient_index(-1.0) == 0
+    assert gradient_index(0.0) == 0
+    assert gradient_index(0.5) == 128
+    assert gradient_index(1.0) == 255
+    assert gradient_index(2.0) == 255
+    assert gradient_index(0.5, 3) == 1
+
+
+def test_color_gradient() -> None:
+    gradient = ColorGradient("#000000", "#ffffff")
+    assert len(gradient.colors) == 256
+    assert gradient.color(0) == "#000000"
+    assert gradient.color(1) == "#ffffff"
+    assert gradient.color(-100) == "#000000"
+    assert gradient.color(12345) == "#ffffff"
+    assert gradient.color(0.25) == interpolate_color("#000000", "#ffffff", 64 / 255)
+
+
+def test_color_gradient_vectorized() -> None:
+    gradient = ColorGradient("#4DD2FF", "#FFFF00")
+    ratios = np.array([-1.0, 0.0, 0.3, 0.5, 0.77, 1.0, 3.0])
+    assert gradient.colors_at(ratios) == [gradient.color(r) for r in ratios]
@@ -0,0 +1,37 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import datetime
+
+from gpxtrackposter.daily_stats import DailyStats
+from tests.test_track import make_track
+
+
+def test_daily_stats() -> None:
+    t1 = make_track(datetime.datetime(2020, 1, 1, 10), [(48.0, 7.8), (48.1, 7.9)])
+    t2 = make_track(datetime.datetime(2020, 1, 1, 18), [(48.0, 7.8), (48.1, 7.9)])
+    t3 = make_track(datetime.datetime(2021, 12, 31, 8), [(48.0, 7.8), (48.1, 7.9)])
+    t3.length_meters = 5000.0
+    t3.special = True
+    stats = DailyStats()
+    stats.build(2020, 2021, [t1, t2, t3])
+
+    assert len(stats.count) == 366 + 365
+    i = stats.index(datetime.date(2020, 1, 1))
+    assert i == 0
+    assert stats.count[i] == 2
+    assert stats.distance[i] == 2000.0
+    assert stats.special[i] == 0
+    i = stats.index(datetime.date(2021, 12, 31))
+    assert stats.count[i] == 1
+    assert stats.special[i] == 1
+    assert not stats.has_tracks(datetime.date(2020, 1, 2))
+    assert not stats.has_tracks(datetime.date(2019, 12, 31))
+    assert not stats.has_tracks(datetime.date(2022, 1, 1))
+    length_range = stats.length_range()
+    assert length_range.lower() == 2000.0
+    assert length_range.upper() == 5000.0
+    assert stats.year_day_count(2020) == 1
+    assert stats.year_day_count(2021) == 1
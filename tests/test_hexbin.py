@@ -0,0 +1,39 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import numpy as np
+
+from gpxtrackposter.hexbin import bin_lines, hex_cells, hex_centers, hex_corners
+
+
+def test_hex_cells_of_centers() -> None:
+    cells = np.array([[0, 0], [1, 0], [0, 1], [-3, 2], [5, -7]])
+    assert np.array_equal(hex_cells(hex_centers(cells, 2.5), 2.5), cells)
+
+
+def test_hex_cells_contain_points() -> None:
+    # a point lies within the hexagon with the nearest center
+    rng = np.random.default_rng(1)
+    points = rng.uniform(-50.0, 50.0, (1000, 2))
+    centers = hex_centers(hex_cells(points, 3.0), 3.0)
+    neighbors = hex_centers(np.array([[1, 0], [0, 1], [-1, 1], [-1, 0], [0, -1], [1, -1]]), 3.0)
+    distances = np.hypot(*(points - centers).T)
+    for neighbor in neighbors:
+        assert np.all(distances <= np.hypot(*(points - centers - neighbor).T) + 1e-9)
+
+
+def test_hex_corners() -> None:
+    corners = hex_corners(2.0)
+    assert corners.shape == (6, 2)
+    assert np.allclose(np.hypot(corners[:, 0], corners[:, 1]), 2.0)
+
+
+def test_bin_lines_sums_lengths() -> None:
+    lines = [np.array([[0.0, 0.0], [0.5, 0.0], [0.5, 0.5]]), np.array([[30.0, 30.0], [30.0, 31.0]]), np.zeros((1, 2))]
+    cells, lengths = bin_lines(lines, 5.0)
+    assert len(cells) == 2
+    assert sorted(lengths.tolist()) == [1.0, 1.0]
+    cells, lengths = bin_lines([], 5.0)
+    assert len(cells) == len(lengths) == 0
@@ -0,0 +1,51 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import subprocess
+import sys
+import typing
+
+# Modules that are slow to import and only needed for some runs; they must not be imported at startup.
+LAZY_MODULES = ["stravalib", "timezonefinder", "geopy", "gpxpy", "polyline", "requests"]
+DRAWER_MODULES = [
+    "gpxtrackposter.grid_drawer",
+    "gpxtrackposter.calendar_drawer",
+    "gpxtrackposter.heatmap_drawer",
+    "gpxtrackposter.circular_drawer",
+    "gpxtrackposter.github_drawer",
+    "gpxtrackposter.hexbin_drawer",
+]
+
+
+def imported_modules(code: str) -> typing.List[str]:
+    script = f"import sys\n{code}\nprint('\\n'.join(sys.modules))"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, check=True, text=True)
+    return result.stdout.splitlines()
+
+
+def test_cli_import_does_not_import_lazy_modules_or_drawers() -> None:
+    modules = imported_modules("import gpxtrackposter.cli")
+    assert "gpxtrackposter.cli" in modules
+    assert not set(LAZY_MODULES + DRAWER_MODULES) & set(modules)
+
+
+def test_cli_imports_only_the_selected_drawer(tmp_path: typing.Any) -> None:
+    modules = imported_modules(
+        "from gpxtrackposter import cli\n"
+        f"sys.argv = ['create_poster', '--type', 'calendar', '--gpx-dir', {str(tmp_path)!r}, "
+        f"'--cache-dir', {str(tmp_path)!r}]\n"
+        "cli.main()\n"
+    )
+    assert set(DRAWER_MODULES) & set(modules) == {"gpxtrackposter.calendar_drawer"}
+
+
+def test_cached_loading_setup_does_not_import_lazy_modules() -> None:
+    modules = imported_modules(
+        "from gpxtrackposter.timezone_adjuster import TimezoneAdjuster\n"
+        "from gpxtrackposter.track_loader import TrackLoader\n"
+        "TimezoneAdjuster()\n"
+        "TrackLoader(workers=None)\n"
+    )
+    assert not set(LAZY_MODULES) & set(modules)
@@ -0,0 +1,48 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import typing
+
+import pytest
+
+from gpxtrackposter.layout import compute_grid_layout
+
+
+def brute_force_grid(
+    count: int, width: float, height: float
+) -> typing.Tuple[typing.Optional[float], typing.Optional[typing.Tuple[int, int]]]:
+    min_waste = -1.0
+    best_size = None
+    best_counts = None
+    for count_x in range(1, count + 1):
+        size_x = width / count_x
+        for count_y in range(1, count + 1):
+            if count_x * count_y >= count:
+                size_y = height / count_y
+                size = min(size_x, size_y)
+                waste = width * height - count * size * size
+                if waste < 0:
+                    continue
+                if best_size is None or waste < min_waste:
+                    best_size = size
+                    best_counts = count_x, count_y
+                    min_waste = waste
+    return best_size, best_counts
+
+
+@pytest.mark.parametrize("width, height", [(180.0, 240.0), (240.0, 180.0), (100.0, 100.0), (180.0, 33.3)])
+def test_compute_grid_layout_matches_brute_force(width: float, height: float) -> None:
+    for count in range(0, 120):
+        assert compute_grid_layout(count, width, height) == brute_force_grid(count, width, height)
+
+
+def test_compute_grid_layout_spacing_and_aspect_ratio() -> None:
+    size, counts = compute_grid_layout(6, 100.0, 50.0, spacing=10.0)
+    assert counts == (3, 2)
+    assert size == pytest.approx(20.0)
+    size, counts = compute_grid_layout(4, 100.0, 100.0, aspect_ratio=4.0)
+    assert counts == (1, 4)
+    assert size == pytest.approx(25.0)
+    assert compute_grid_layout(3, 10.0, 10.0, spacing=20.0) == (None, None)
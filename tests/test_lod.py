@@ -0,0 +1,34 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import numpy as np
+
+from gpxtrackposter.lod import douglas_peucker, estimate_svg_bytes, merge_close_points, simplify_tracks
+
+
+def test_merge_close_points() -> None:
+    line = np.array([[0.0, 0.0], [0.01, 0.01], [0.02, 0.0], [1.5, 0.0], [1.51, 0.0], [3.0, 0.0]])
+    assert np.array_equal(merge_close_points(line, 1.0), np.array([[0.0, 0.0], [1.5, 0.0], [3.0, 0.0]]))
+    assert np.array_equal(merge_close_points(line, 0.0), line)
+
+
+def test_douglas_peucker() -> None:
+    line = np.array([[0.0, 0.0], [1.0, 0.1], [2.0, -0.1], [3.0, 5.0], [4.0, 6.0], [5.0, 7.0]])
+    assert np.array_equal(douglas_peucker(line, 0.5), np.array([[0.0, 0.0], [2.0, -0.1], [3.0, 5.0], [5.0, 7.0]]))
+    # out and back: the turning point is far from the segment between start and end
+    line = np.array([[0.0, 0.0], [5.0, 0.0], [10.0, 0.0], [5.0, 0.1], [0.0, 0.0]])
+    assert np.array_equal(douglas_peucker(line, 0.5), np.array([[0.0, 0.0], [10.0, 0.0], [0.0, 0.0]]))
+
+
+def test_simplify_tracks_max_bytes() -> None:
+    t = np.linspace(0, 2 * np.pi, 1000)
+    circle = np.column_stack((10 * np.cos(t), 10 * np.sin(t)))
+    lines_per_track = [[circle], [circle + 20]]
+    assert estimate_svg_bytes(simplify_tracks(lines_per_track, 0.0)) == estimate_svg_bytes(lines_per_track)
+    assert estimate_svg_bytes(simplify_tracks(lines_per_track, 1e-6)) == estimate_svg_bytes(lines_per_track)
+    assert estimate_svg_bytes(simplify_tracks(lines_per_track, 0.01)) < estimate_svg_bytes(lines_per_track)
+    coarse = simplify_tracks(lines_per_track, 1e-6, max_bytes=5000)
+    assert estimate_svg_bytes(coarse) <= 5000
+    assert all(len(line) >= 2 for lines in coarse for line in lines)
@@ -0,0 +1,55 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import struct
+import zlib
+
+import numpy as np
+
+from gpxtrackposter.color_gradient import ColorGradient
+from gpxtrackposter.raster import colorize, encode_png, rasterize_lines, tone_map
+
+
+def test_rasterize_lines_accumulates_lengths() -> None:
+    lines = [np.array([[0.0, 0.5], [10.0, 0.5]]), np.array([[0.5, 0.0], [0.5, 3.0]])]
+    density = rasterize_lines(lines, 4, 2)
+    assert density.tolist() == [[2.0, 1.0, 1.0, 1.0], [1.0, 0.0, 0.0, 0.0]]
+
+
+def test_rasterize_lines_does_not_depend_on_sampling_rate() -> None:
+    coarse = np.array([[0.2, 0.2], [7.8, 5.9]])
+    fine = np.linspace(coarse[0], coarse[1], 101)
+    assert np.allclose(rasterize_lines([coarse], 8, 6).sum(), rasterize_lines([fine], 8, 6).sum())
+    assert np.allclose(rasterize_lines([fine], 8, 6, batch_size=10), rasterize_lines([fine], 8, 6))
+
+
+def test_tone_map() -> None:
+    values = tone_map(np.array([[0.0, 1.0], [3.0, 7.0]]))
+    assert values[0, 0] == 0.0
+    assert values[1, 1] == 1.0
+    assert np.all(np.diff(values.ravel()) > 0)
+    assert np.all(tone_map(np.zeros((2, 2))) == 0.0)
+
+
+def test_colorize_composites_layers() -> None:
+    values = np.array([[0.0, 1.0]])
+    red = ColorGradient("#ff0000", "#ff0000")
+    blue = ColorGradient("#0000ff", "#0000ff")
+    rgba = colorize([(values, red), (np.array([[0.0, 0.0]]), blue)])
+    assert rgba.tolist() == [[[0, 0, 0, 0], [255, 0, 0, 255]]]
+    rgba = colorize([(values, red), (np.array([[1.0, 1.0]]), blue)], block_rows=1)
+    assert rgba.tolist() == [[[0, 0, 255, 255], [0, 0, 255, 255]]]
+
+
+def test_encode_png() -> None:
+    rgba = np.arange(2 * 3 * 4, dtype=np.uint8).reshape(2, 3, 4)
+    png = encode_png(rgba)
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+    assert struct.unpack(">II", png[16:24]) == (3, 2)
+    (length,) = struct.unpack(">I", png[33:37])
+    assert png[37:41] == b"IDAT"
+    rows = np.frombuffer(zlib.decompress(png[41 : 41 + length]), dtype=np.uint8).reshape(2, 13)
+    assert np.all(rows[:, 0] == 0)
+    assert np.array_equal(rows[:, 1:].reshape(2, 3, 4), rgba)
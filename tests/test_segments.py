@@ -0,0 +1,65 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import numpy as np
+
+from gpxtrackposter.segments import count_segments, quantize_line, rasterize_cells, track_segments
+
+
+def test_quantize_line_drops_duplicates() -> None:
+    line = np.array([[0.1, 0.1], [0.2, -0.1], [1.1, 0.0], [0.9, 0.2], [2.0, 2.0]])
+    assert quantize_line(line, 1.0).tolist() == [[0, 0], [1, 0], [2, 2]]
+
+
+def test_rasterize_cells_steps_to_neighbors() -> None:
+    cells = np.array([[0, 0], [5, 2], [1, 7]])
+    rasterized = rasterize_cells(cells)
+    assert rasterized.tolist() == [
+        [0, 0],
+        [1, 0],
+        [2, 1],
+        [3, 1],
+        [4, 2],
+        [5, 2],
+        [4, 3],
+        [3, 4],
+        [3, 5],
+        [2, 6],
+        [1, 7],
+    ]
+    assert rasterize_cells(cells[::-1]).tolist() == rasterized[::-1].tolist()
+    assert rasterize_cells(cells[:1]).tolist() == [[0, 0]]
+
+
+def test_track_segments_are_undirected_and_distinct() -> None:
+    out_and_back = np.array([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0], [1.0, 0.0], [0.0, 0.0]])
+    assert track_segments([out_and_back], 1.0).tolist() == [[0, 0, 1, 0], [1, 0, 2, 0]]
+    assert track_segments([np.array([[0.0, 0.0]])], 1.0).shape == (0, 4)
+
+
+def test_count_segments_counts_tracks() -> None:
+    route = np.array([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0]])
+    detour = np.array([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0]])
+    segments, counts = count_segments([[route], [route[::-1]], [detour, detour]], 1.0)
+    assert dict(zip(map(tuple, segments.tolist()), counts.tolist())) == {
+        (0, 0, 1, 0): 3,
+        (1, 0, 1, 1): 2,
+        (1, 0, 2, 0): 1,
+    }
+    segments, counts = count_segments([], 1.0)
+    assert len(segments) == len(counts) == 0
+
+
+def test_count_segments_of_tracks_with_different_point_spacings() -> None:
+    # two tracks on the same street; the second one is sampled at other points and runs in the other direction
+    street = np.array([[0.0, 0.0], [10.0, 0.0], [20.0, 0.0], [30.0, 0.0]])
+    resampled = np.array([[30.0, 0.0], [15.0, 0.0], [7.0, 0.0], [0.0, 0.0]])
+    segments, counts = count_segments([[street], [resampled]], 0.1)
+    assert len(segments) == 300
+    assert set(counts.tolist()) == {2}
+    diagonal = np.array([[0.0, 0.0], [3.0, 1.0], [6.0, 2.0]])
+    segments, counts = count_segments([[diagonal], [diagonal[::2]]], 1.0)
+    assert len(segments) == 6
+    assert set(counts.tolist()) == {2}
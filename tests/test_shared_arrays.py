@@ -0,0 +1,141 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import concurrent.futures
+import datetime
+import typing
+
+import numpy as np
+import pytest
+import s2sphere  # type: ignore
+
+from gpxtrackposter import heatmap_drawer, utils
+from gpxtrackposter.heatmap_drawer import encode_tracks
+from gpxtrackposter.poster import Poster
+from gpxtrackposter.shared_arrays import SharedArrays, call_with_views
+from gpxtrackposter.track import Track
+from gpxtrackposter.xy import XY
+from tests.test_track import make_track
+
+
+def sums(arrays: typing.List[np.ndarray]) -> typing.List[float]:
+    return [float(array.sum()) for array in arrays]
+
+
+def failing_encode_tracks(*args: typing.Any) -> typing.List[typing.List[str]]:
+    raise ValueError("encoding failed")
+
+
+class RecordingExecutor(concurrent.futures.ProcessPoolExecutor):
+    """Process pool that records its submitted futures with the first argument of their function"""
+
+    futures: typing.List[typing.Tuple[typing.Any, concurrent.futures.Future]] = []
+
+    def submit(self, fn: typing.Any, /, *args: typing.Any, **kwargs: typing.Any) -> concurrent.futures.Future:
+        future = super().submit(fn, *args, **kwargs)
+        self.futures.append((args[0] if args else None, future))
+        return future
+
+
+def make_heatmap_drawer(track_count: int, points: int, workers: int) -> heatmap_drawer.HeatmapDrawer:
+    poster = Poster()
+    poster.workers = workers
+    poster.set_tracks(
+        [
+            make_track(
+                datetime.datetime(2020, 1, 1 + i), [(48.0 + j / 1000, 7.8 + i / 100 + j / 1000) for j in range(points)]
+            )
+            for i in range(track_count)
+        ]
+    )
+    return heatmap_drawer.HeatmapDrawer(poster)
+
+
+def encoded_tracks(drawer: heatmap_drawer.HeatmapDrawer) -> typing.List[typing.List[str]]:
+    # pylint: disable=protected-access
+    return list(drawer._encode_tracks(drawer._determine_bbox(), XY(100, 100), XY(0, 0), 1, 2))
+
+
+def test_call_with_views() -> None:
+    arrays = [np.arange(6, dtype=float).reshape(3, 2), np.zeros((0, 2)), np.ones((2, 2))]
+    with SharedArrays(arrays, 2) as shared:
+        assert call_with_views(shared.handle, 0, 3, sums) == [15.0, 0.0, 4.0]
+        assert call_with_views(shared.handle, 1, 3, len) == 2
+    with SharedArrays([], 2) as shared:
+        assert call_with_views(shared.handle, 0, 0, sums) == []
+
+
+def test_encode_tracks_in_worker_process() -> None:
+    latlngs = [np.array([[48.0, 7.8], [48.1, 7.9], [48.05, 7.95]]), np.array([[48.2, 7.7], [48.3, 7.6]])]
+    line_arrays = [np.hstack([latlng, utils.mercator_xy(latlng)]) for latlng in latlngs]
+    bbox = s2sphere.LatLngRect(s2sphere.LatLng.from_degrees(47.9, 7.5), s2sphere.LatLng.from_degrees(48.4, 8.0))
+    args = ([1, 0, 1], bbox, XY(100, 100), XY(10, 10), 0.1, 2)
+    expected = encode_tracks(line_arrays, *args)
+    assert [len(path_data) for path_data in expected] == [1, 0, 1]
+    with SharedArrays(line_arrays, 4) as shared, concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(call_with_views, shared.handle, 0, 2, encode_tracks, *args).result() == expected
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_heatmap_encodes_tracks_in_bounded_chunks(workers: int, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(heatmap_drawer, "PARALLEL_CHUNK_POINTS", 2)
+    monkeypatch.setattr(heatmap_drawer, "PARALLEL_MIN_POINTS", 4)
+    poster = Poster()
+    poster.workers = workers
+    poster.set_tracks(
+        [make_track(datetime.datetime(2020, 1, 1 + i), [(48.0, 7.8 + i / 100), (48.1, 7.9)]) for i in range(20)]
+    )
+    drawer = heatmap_drawer.HeatmapDrawer(poster)
+    loaded = []
+    track_geometry = drawer.track_geometry
+
+    def load_track_geometry(tr: Track, *args: typing.Any) -> typing.Any:
+        loaded.append(tr)
+        return track_geometry(tr, *args)
+
+    monkeypatch.setattr(drawer, "track_geometry", load_track_geometry)
+    bbox = drawer._determine_bbox()  # pylint: disable=protected-access
+    path_data_per_track = drawer._encode_tracks(bbox, XY(100, 100), XY(0, 0), 1, 2)  # pylint: disable=protected-access
+    assert len(next(path_data_per_track)) == 1
+    # the geometry of the tracks is loaded in chunks, at most two per worker ahead of the drawn tracks
+    assert len(loaded) <= 2 * (2 * workers + 1)
+    assert len(list(path_data_per_track)) == 19
+    assert len(loaded) == 20
+
+
+@pytest.mark.parametrize("track_count, points, parallel", [(3, 2, False), (1, 12, True)])
+def test_heatmap_counts_points_to_start_worker_processes(
+    track_count: int, points: int, parallel: bool, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # a few small tracks do not start worker processes, a single huge track does
+    monkeypatch.setattr(heatmap_drawer, "PARALLEL_CHUNK_POINTS", 2)
+    monkeypatch.setattr(heatmap_drawer, "PARALLEL_MIN_POINTS", 10)
+    monkeypatch.setattr(heatmap_drawer.concurrent.futures, "ProcessPoolExecutor", RecordingExecutor)
+    monkeypatch.setattr(RecordingExecutor, "futures", [])
+    drawer = make_heatmap_drawer(track_count, points, 2)
+    assert len(encoded_tracks(drawer)) == track_count
+    assert bool(RecordingExecutor.futures) == parallel
+
+
+def test_heatmap_releases_shared_memory_after_workers_finish(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(heatmap_drawer, "PARALLEL_CHUNK_POINTS", 2)
+    monkeypatch.setattr(heatmap_drawer, "PARALLEL_MIN_POINTS", 4)
+    monkeypatch.setattr(heatmap_drawer, "encode_tracks", failing_encode_tracks)
+    monkeypatch.setattr(heatmap_drawer.concurrent.futures, "ProcessPoolExecutor", RecordingExecutor)
+    monkeypatch.setattr(RecordingExecutor, "futures", [])
+    closed_while_running = []
+    close = SharedArrays.close
+
+    def checking_close(self: SharedArrays) -> None:
+        closed_while_running.extend(
+            f for handle, f in RecordingExecutor.futures if handle is self.handle and not f.done()
+        )
+        close(self)
+
+    monkeypatch.setattr(SharedArrays, "close", checking_close)
+    with pytest.raises(ValueError):
+        encoded_tracks(make_heatmap_drawer(20, 2, 2))
+    assert RecordingExecutor.futures
+    assert not closed_while_running
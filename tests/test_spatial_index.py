@@ -0,0 +1,50 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+from pathlib import Path
+
+import s2sphere  # type: ignore
+
+from gpxtrackposter.spatial_index import SpatialIndex
+
+
+def rect(lat_lo: float, lng_lo: float, lat_hi: float, lng_hi: float) -> s2sphere.LatLngRect:
+    return s2sphere.LatLngRect(
+        s2sphere.LatLng.from_degrees(lat_lo, lng_lo), s2sphere.LatLng.from_degrees(lat_hi, lng_hi)
+    )
+
+
+def test_save_and_load(tmp_path: Path) -> None:
+    index = SpatialIndex(str(tmp_path))
+    index.add("a", rect(48.0, 7.8, 48.1, 7.9))
+    index.add("b", rect(10.0, 179.0, 11.0, -179.0))
+    index.add("c", s2sphere.LatLngRect())
+    index.save()
+
+    loaded = SpatialIndex(str(tmp_path))
+    loaded.load()
+    assert len(loaded) == 2
+    bbox_a, bbox_b = loaded.get("a"), loaded.get("b")
+    assert bbox_a is not None and bbox_a.approx_equals(rect(48.0, 7.8, 48.1, 7.9))
+    assert bbox_b is not None and bbox_b.lng().is_inverted()
+    assert loaded.get("c") is None
+
+
+def test_intersects(tmp_path: Path) -> None:
+    index = SpatialIndex(str(tmp_path))
+    index.add("a", rect(48.0, 7.8, 48.1, 7.9))
+    index.add("b", rect(10.0, 179.0, 11.0, -179.0))
+    assert index.intersects("a", rect(48.05, 7.85, 49.0, 9.0))
+    assert not index.intersects("a", rect(40.0, -74.0, 41.0, -73.0))
+    assert index.intersects("b", rect(10.5, -179.5, 10.6, -179.4))
+    assert not index.intersects("b", rect(10.5, 170.0, 10.6, 171.0))
+    assert index.intersects("unknown", rect(40.0, -74.0, 41.0, -73.0))
+
+
+def test_load_corrupt_file(tmp_path: Path) -> None:
+    (tmp_path / SpatialIndex.FILE_NAME).write_text("{")
+    index = SpatialIndex(str(tmp_path))
+    index.load()
+    assert len(index) == 0
@@ -0,0 +1,51 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import numpy as np
+import pytest
+
+from gpxtrackposter.svg_path import encode_lines, encode_segments, format_numbers, path_decimals
+
+
+def decode(path_data: str) -> list:
+    lines = []
+    for sub_path in path_data.split("M")[1:]:
+        absolute, _, relative = sub_path.partition("l")
+        start = np.array([float(v) for v in absolute.split()])
+        moves = np.array([float(v) for v in relative.split()]).reshape(-1, 2)
+        lines.append(np.vstack([start, start + np.cumsum(moves, axis=0)]))
+    return lines
+
+
+@pytest.mark.parametrize(
+    "resolution, decimals",
+    [(25.4 / 96, 2), (25.4 / 300, 3), (25.4 / 1000, 3), (0.001, 4), (100.0, 0)],
+)
+def test_path_decimals(resolution: float, decimals: int) -> None:
+    assert path_decimals(resolution) == decimals
+
+
+def test_format_numbers() -> None:
+    assert format_numbers(np.array([100, -5, 0, 1500, -1500, 1000, 10]), 3) == ".1 -.005 0 1.5 -1.5 1 .01"
+    assert format_numbers(np.array([100, -5, 0]), 0) == "100 -5 0"
+    assert format_numbers(np.array([], dtype=np.int64), 2) == ""
+
+
+def test_encode_lines_uses_relative_moves() -> None:
+    lines = [np.array([[0.5, 1.25], [0.4, 1.3], [10.0, -3.0]]), np.array([[2.0, 2.0]])]
+    assert encode_lines(lines, 3) == "M.5 1.25l-.1 .05 9.6 -4.3M2 2"
+
+
+def test_encode_lines_does_not_accumulate_rounding_errors() -> None:
+    rng = np.random.default_rng(42)
+    line = np.cumsum(rng.uniform(-1.0, 1.0, (10000, 2)), axis=0)
+    decoded = decode(encode_lines([line], 2))[0]
+    assert np.abs(decoded - line).max() <= 0.005 + 1e-9
+
+
+def test_encode_segments() -> None:
+    segments = np.array([[0.5, 1.0, 1.5, -1.0], [2.0, 2.0, 2.0, 3.0]])
+    assert encode_segments(segments, 2) == "M.5 1l1 -2M2 2l0 1"
+    assert encode_segments(np.zeros((0, 4)), 2) == ""
@@ -0,0 +1,83 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import gzip
+import os
+import typing
+from xml.etree import ElementTree
+
+import pytest
+import svgwrite  # type: ignore
+
+from gpxtrackposter.exceptions import PosterError
+from gpxtrackposter.svg_stream import Fragment, StreamingDrawing
+
+
+def draw(d: svgwrite.Drawing) -> None:
+    d.add(d.rect((0, 0), (100, 50), fill="#222222"))
+    g = d.g(id="tracks")
+    d.add(g)
+    for year in [2020, 2021]:
+        g_year = d.g(id=f"year{year}")
+        g.add(g_year)
+        g_year.add(d.text(str(year), insert=(10, 20)))
+        g_track = d.g(stroke="red")
+        g_track.add(d.polyline(points=[(0, 0), (year % 10, 1)]))
+        g_year.add(g_track)
+        d.defs.add(d.linearGradient(id=f"gradient{year}"))
+    d.add(d.g(id="footer"))
+
+
+def test_streamed_output_matches_svgwrite(tmp_path: typing.Any) -> None:
+    expected = svgwrite.Drawing("expected.svg", ("100mm", "50mm"))
+    expected.viewbox(0, 0, 100, 50)
+    draw(expected)
+    file_name = os.path.join(tmp_path, "poster.svg")
+    d = StreamingDrawing(file_name, ("100mm", "50mm"))
+    d.viewbox(0, 0, 100, 50)
+    with d:
+        draw(d)
+    with open(file_name, encoding="utf-8") as f:
+        streamed = f.read()
+    assert streamed.startswith('<?xml version="1.0" encoding="utf-8" ?>\n')
+    # definitions added while drawing are written at the end of the document
+    expected_defs = expected.defs.tostring()
+    expected_text = expected.tostring().replace(expected_defs, "<defs />").replace("</svg>", expected_defs + "</svg>")
+    assert ElementTree.canonicalize(streamed) == ElementTree.canonicalize(expected_text)
+
+
+def test_svgz_output_is_compressed(tmp_path: typing.Any) -> None:
+    d = StreamingDrawing(os.path.join(tmp_path, "poster.svgz"), ("100mm", "50mm"))
+    with d:
+        draw(d)
+    with gzip.open(os.path.join(tmp_path, "poster.svgz"), "rt", encoding="utf-8") as f:
+        assert f.read().endswith("</svg>")
+
+
+def test_adding_to_closed_group_fails(tmp_path: typing.Any) -> None:
+    file_name = os.path.join(tmp_path, "poster.svg")
+    d = StreamingDrawing(file_name, ("100mm", "50mm"))
+    with pytest.raises(PosterError):
+        with d:
+            g1 = d.g(id="first")
+            d.add(g1)
+            d.add(d.g(id="second"))
+            g1.add(d.rect((0, 0), (1, 1)))
+    assert not os.path.exists(file_name)
+
+
+def test_fragment_is_written_like_its_element(tmp_path: typing.Any) -> None:
+    expected = svgwrite.Drawing("expected.svg", ("100mm", "50mm"))
+    draw(expected)
+    file_name = os.path.join(tmp_path, "poster.svg")
+    d = StreamingDrawing(file_name, ("100mm", "50mm"))
+    with d:
+        g = d.g(id="tracks")
+        d.add(g)
+        g.add(Fragment(d.text("2020", insert=(10, 20)).tostring()))
+    with open(file_name, encoding="utf-8") as f:
+        assert '<g id="tracks"><text x="10" y="20">2020</text></g>' in f.read()
+    with pytest.raises(PosterError):
+        Fragment("2020")
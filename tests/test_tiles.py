@@ -0,0 +1,49 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+from pathlib import Path
+
+import numpy as np
+
+from gpxtrackposter import utils
+from gpxtrackposter.color_gradient import ColorGradient
+from gpxtrackposter.tiles import TileExporter, clip_lines, line_tiles, tile_coordinates
+
+
+def test_tile_coordinates() -> None:
+    xy = utils.mercator_xy(np.array([[0.0, 0.0], [40.715, -73.99]]))
+    tiles = tile_coordinates(xy, 13)
+    assert np.allclose(tiles[0], [4096, 4096])
+    assert tiles[1].astype(int).tolist() == [2412, 3079]
+
+
+def test_line_tiles() -> None:
+    line = np.array([[0.5, 0.5], [3.5, 0.5]])
+    assert line_tiles(line, 0.1).tolist() == [[0, 0], [1, 0], [2, 0], [3, 0]]
+    assert line_tiles(np.array([[0.95, 0.5]]), 0.1).tolist() == [[0, 0], [1, 0]]
+
+
+def test_clip_lines() -> None:
+    line = np.array([[-5.0, 0.5], [-4.0, 0.5], [-3.0, 2.5], [2.0, 0.5], [3.0, 0.5], [4.0, 0.5]])
+    clipped = clip_lines([line], np.array([0.0, 0.0]), np.array([1.0, 1.0]))
+    assert [run.tolist() for run in clipped] == [[[-3.0, 2.5], [2.0, 0.5]]]
+
+
+def test_export_renders_changed_tiles_only(tmp_path: Path) -> None:
+    def export(lines_per_track: list) -> tuple:
+        exporter = TileExporter(str(tmp_path), 3, "png", workers=1)
+        exporter.set_png_style([ColorGradient("#ff0000", "#ffff00"), ColorGradient("#0000ff", "#00ffff")], 1.0)
+        for index, lines in enumerate(lines_per_track):
+            exporter.add_track(f"track{index}", lines, "", False)
+        return exporter.export()
+
+    track1 = [utils.mercator_xy(np.array([[48.0, 7.8], [48.1, 7.9]]))]
+    track2 = [utils.mercator_xy(np.array([[40.7, -74.0], [40.8, -73.9]]))]
+    assert export([track1, track2]) == (7, 0)
+    assert (tmp_path / "0" / "0" / "0.png").is_file()
+    assert len(list(tmp_path.glob("3/*/*.png"))) == 2
+    assert export([track1, track2]) == (0, 7)
+    assert export([track1]) == (1, 3)
+    assert len(list(tmp_path.glob("3/*/*.png"))) == 1
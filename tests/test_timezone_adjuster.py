@@ -3,6 +3,10 @@
 # Use of this source code is governed by a MIT-style
 # license that can be found in the LICENSE file.
 
+import concurrent.futures
+import threading
+import typing
+
 import dateutil.parser
 import s2sphere  # type: ignore
 
@@ -21,3 +25,21 @@ def test_adjust() -> None:
     newyork = s2sphere.LatLng.from_degrees(40.711344, -74.005382)
     time_newyork = tza.adjust(time, newyork)
     assert time_newyork.hour == 10
+
+
+def test_adjust_from_multiple_threads() -> None:
+    time = dateutil.parser.parse("2020-09-06T14:34:01.029Z")
+    latlngs = [s2sphere.LatLng.from_degrees(47.998933, 7.841819), s2sphere.LatLng.from_degrees(40.711344, -74.005382)]
+    barrier = threading.Barrier(3)
+
+    def adjust(latlng: s2sphere.LatLng) -> typing.Tuple[int, int]:
+        hour = TimezoneAdjuster().adjust(time, latlng).hour
+        # keep the threads alive until each one has created its finder
+        barrier.wait()
+        return hour, id(TimezoneAdjuster._timezonefinder())  # pylint: disable=protected-access
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(adjust, latlngs + latlngs[:1]))
+    assert [hour for hour, _ in results] == [16, 10, 16]
+    # each thread uses its own TimezoneFinder
+    assert len({finder for _, finder in results}) == 3
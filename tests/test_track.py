@@ -0,0 +1,154 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import datetime
+from pathlib import Path
+
+import numpy as np
+import pytest
+import s2sphere  # type: ignore
+
+from gpxtrackposter import utils
+from gpxtrackposter.track import Track
+
+
+def make_track(start: datetime.datetime, points: list) -> Track:
+    t = Track()
+    t.file_names = [f"{start}.gpx"]
+    t.set_start_time(start)
+    t.set_end_time(start + datetime.timedelta(minutes=30))
+    t.length_meters = 1000.0
+    t.polylines = [[s2sphere.LatLng.from_degrees(lat, lng) for lat, lng in points]]
+    return t
+
+
+def test_release_and_reload_polylines(tmp_path: Path) -> None:
+    t1 = make_track(datetime.datetime(2020, 1, 1, 10), [(48.0, 7.8), (48.1, 7.9)])
+    t2 = make_track(datetime.datetime(2020, 1, 1, 11), [(48.2, 7.7), (48.3, 7.6)])
+    t1.store_cache(str(tmp_path / "1.json"))
+    t2.store_cache(str(tmp_path / "2.json"))
+    bbox1 = t1.bbox()
+
+    t1.release_polylines()
+    t2.release_polylines()
+    assert not t1.polylines
+    assert t1.bbox() == bbox1
+
+    t1.append(t2)
+    assert not t1.polylines
+    with t1.geometry() as polylines:
+        assert [len(line) for line in polylines] == [2, 2]
+        assert t1.bbox().contains(s2sphere.LatLng.from_degrees(48.3, 7.6))
+    assert not t1.polylines
+    assert t1.bbox().contains(s2sphere.LatLng.from_degrees(48.3, 7.6))
+
+
+def test_release_polylines_without_cache() -> None:
+    t = make_track(datetime.datetime(2020, 1, 1, 10), [(48.0, 7.8), (48.1, 7.9)])
+    t.release_polylines()
+    assert len(t.polylines) == 1
+
+
+def test_store_cache_with_mercator(tmp_path: Path) -> None:
+    t = make_track(datetime.datetime(2020, 1, 1, 10), [(48.0, 7.8), (48.1, 7.9), (48.2, 8.0)])
+    t.store_cache(str(tmp_path / "plain.json"))
+    t.store_cache(str(tmp_path / "mercator.json"), with_mercator=True)
+    expected = t.mercator_arrays()
+
+    plain = Track()
+    plain.load_cache(str(tmp_path / "plain.json"))
+    cached = Track()
+    cached.load_cache(str(tmp_path / "mercator.json"))
+    # pylint: disable=protected-access
+    assert plain._mercator is None
+    assert cached._mercator is not None
+    assert len(cached.mercator_arrays()) == 1
+    assert np.array_equal(cached.mercator_arrays()[0], expected[0])
+    assert np.allclose(plain.mercator_arrays()[0], expected[0])
+
+    cached.release_polylines()
+    assert cached._mercator is None
+    with cached.geometry():
+        assert np.array_equal(cached.mercator_arrays()[0], expected[0])
+
+
+def test_geometry_pyramid(tmp_path: Path) -> None:
+    points = [(48.0 + 0.001 * i, 7.8 + 0.0001 * (i % 2)) for i in range(100)]
+    t = make_track(datetime.datetime(2020, 1, 1, 10), points)
+    t.store_cache(str(tmp_path / "1.json"), with_pyramid=True)
+    assert (tmp_path / "1.lod0.json").is_file()
+    assert (tmp_path / "1.lod3.json").is_file()
+
+    cached = Track()
+    cached.load_cache(str(tmp_path / "1.json"))
+    cached.release_polylines()
+    full = cached.polylines_at(0.0)
+    assert len(full[0]) == 100
+    coarse = cached.polylines_at(1e-4)
+    assert len(coarse[0]) == 2
+    assert np.array_equal(coarse[0], full[0][[0, -1]])
+    latlng_arrays, mercator_arrays = cached.geometry_at(1e-4)
+    assert np.array_equal(latlng_arrays[0], coarse[0])
+    assert np.allclose(mercator_arrays[0], utils.mercator_xy(coarse[0]))
+    assert cached.polylines_released
+
+
+def test_append_uncached_track_drops_pyramid(tmp_path: Path) -> None:
+    points = [(48.0 + 0.001 * i, 7.8 + 0.0001 * (i % 2)) for i in range(100)]
+    t1 = make_track(datetime.datetime(2020, 1, 1, 10), points)
+    t1.store_cache(str(tmp_path / "1.json"), with_pyramid=True)
+    cached = Track()
+    cached.load_cache(str(tmp_path / "1.json"))
+    uncached = make_track(datetime.datetime(2020, 1, 1, 11), [(48.2, 7.7), (48.3, 7.6), (48.4, 7.7)])
+
+    uncached.append(cached)
+    assert not uncached.cache_file_names
+    assert not uncached.pyramids
+    coarse = uncached.polylines_at(1e-4)
+    assert [len(line) for line in coarse] == [3, 100]
+    uncached.release_polylines()
+    assert not uncached.polylines_released
+
+
+def test_thumbnail() -> None:
+    t = make_track(datetime.datetime(2020, 1, 1, 10), [(48.0, 7.8), (48.1, 7.9), (48.2, 7.8)])
+    thumbnail = t.thumbnail()
+    assert len(thumbnail) == 1
+    assert len(thumbnail[0]) == 3
+    assert (thumbnail[0] >= 0).all() and (thumbnail[0] <= 1).all()
+    assert thumbnail[0][:, 1].min() == 0.0 and thumbnail[0][:, 1].max() == 1.0
+    assert t.thumbnail() is thumbnail
+
+
+def test_bbox() -> None:
+    start = datetime.datetime(2020, 1, 1, 10)
+    for points in ([(48.0, 7.8), (48.1, 7.9), (47.9, 7.85)], [(10.0, 179.5), (10.5, -179.5)]):
+        t = make_track(start, points)
+        expected = s2sphere.LatLngRect()
+        for latlng in t.polylines[0]:
+            expected = expected.union(s2sphere.LatLngRect.from_point(latlng))
+        assert t.bbox() == expected
+    assert make_track(start, []).bbox().is_empty()
+
+
+def test_bbox_is_computed_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    t1 = make_track(datetime.datetime(2020, 1, 1, 10), [(48.0, 7.8), (48.1, 7.9)])
+    t2 = make_track(datetime.datetime(2020, 1, 1, 11), [(48.2, 7.7), (48.3, 7.6)])
+    computed = []
+    compute_bbox = Track._compute_bbox  # pylint: disable=protected-access
+
+    def counting_compute_bbox(self: Track) -> s2sphere.LatLngRect:
+        computed.append(self)
+        return compute_bbox(self)
+
+    monkeypatch.setattr(Track, "_compute_bbox", counting_compute_bbox)
+    for _ in range(3):
+        t1.bbox()
+    assert computed == [t1]
+    t1.append(t2)
+    assert computed == [t1, t2]
+    for _ in range(3):
+        assert t1.bbox().contains(s2sphere.LatLng.from_degrees(48.3, 7.6))
+    assert computed == [t1, t2]
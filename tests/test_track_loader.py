@@ -5,15 +5,20 @@
 
 import datetime
 import json
+import os
 from pathlib import Path
-from typing import Union, Dict, List
+from typing import Any, Union, Dict, List, Tuple
 from unittest.mock import MagicMock
 
 import pytest
 from pytest_mock import MockerFixture
+import s2sphere  # type: ignore
 
+from gpxtrackposter import utils
+from gpxtrackposter.exceptions import ParameterError
+from gpxtrackposter.spatial_index import SpatialIndex
+from gpxtrackposter.track import Track
 from gpxtrackposter.track_loader import TrackLoader
-from gpxtrackposter.units import Units
 
 
 def mock_activity(mocker: MockerFixture, activity_type: Union[str, list]) -> MagicMock:
@@ -50,6 +55,39 @@ def strava_config(tmp_path: Path, activity_type: Union[str, List[str], None] = N
     return str(config_json)
 
 
+def write_gpx_files(gpx_dir: Path, count: int) -> List[str]:
+    """Write count GPX tracks and one broken GPX file
+
+    The later files start earlier. Each odd track starts 20 minutes after the end of the next even track, such that
+    the two are merged.
+    """
+    gpx_dir.mkdir()
+    for i in range(count):
+        start = datetime.datetime(2020, 1, 1, 10) + datetime.timedelta(days=(count - i) // 2, minutes=90 * (i % 2))
+        points = "".join(
+            f'<trkpt lat="{48.0 + i / 100 + j / 1000}" lon="{7.8 + j / 1000}">'
+            f"<time>{(start + datetime.timedelta(seconds=10 * j)).isoformat()}Z</time></trkpt>"
+            for j in range(400)
+        )
+        (gpx_dir / f"track{i:02}.gpx").write_text(
+            f'<?xml version="1.0"?><gpx version="1.1" creator="test"><trk><trkseg>{points}</trkseg></trk></gpx>'
+        )
+    (gpx_dir / "broken.gpx").write_text("<gpx")
+    return sorted(str(f) for f in gpx_dir.iterdir())
+
+
+def track_data(t: Track) -> Tuple[Any, ...]:
+    with t.geometry() as polylines:
+        points = [[(p.lat().degrees, p.lng().degrees) for p in line] for line in polylines]
+    # cached tracks have naive local times
+    start_time, end_time = t.start_time().replace(tzinfo=None), t.end_time().replace(tzinfo=None)
+    return t.file_names, start_time, end_time, t.length_meters, points
+
+
+def load_tracks_from_files(loader: TrackLoader, file_names: List[str]) -> List[Track]:
+    return loader._load_tracks_from_files(file_names)  # pylint: disable=protected-access
+
+
 @pytest.fixture(name="strava_config_without_type_filter")
 def fixture_strava_config_without_type_filter(tmp_path: Path) -> str:
     return strava_config(tmp_path)
@@ -70,7 +108,7 @@ def fixture_loader(
     mocker: MockerFixture, mock_run_activity: MagicMock, mock_walk_activity: MagicMock, mock_hike_activity: MagicMock
 ) -> TrackLoader:
     """Return a :class:`gpxtrackposter.track_loader.TrackLoader` object."""
-    mock_client_class = mocker.patch("gpxtrackposter.track_loader.Client")
+    mock_client_class = mocker.patch("stravalib.Client")
     instance = mock_client_class.return_value
     instance.get_activities.return_value = [mock_run_activity, mock_walk_activity, mock_hike_activity]
     return TrackLoader(workers=None)
@@ -80,7 +118,7 @@ def fixture_loader(
 def fixture_mock_track_instance(mocker: MockerFixture) -> MagicMock:
     mock_track_class = mocker.patch("gpxtrackposter.track_loader.Track")
     instance = mock_track_class.return_value
-    instance.length.return_value = 1 * Units().km
+    instance.length_meters = 1000.0
     instance.start_time.return_value = datetime.datetime.now()
     instance.end_time.return_value = datetime.datetime.now()
     return instance
@@ -123,3 +161,142 @@ def test_load_strava_tracks_with_list_activity_type_filter(
 
     mock_track_instance.load_strava.assert_any_call(mock_walk_activity)
     mock_track_instance.load_strava.assert_any_call(mock_hike_activity)
+
+
+@pytest.mark.parametrize("shard", ["", "1", "0/2", "3/2", "a/b", "1/0"])
+def test_set_shard_invalid(shard: str) -> None:
+    loader = TrackLoader(workers=None)
+    with pytest.raises(ParameterError):
+        loader.set_shard(shard)
+
+
+def test_shards_partition_gpx_files(tmp_path: Path) -> None:
+    gpx_dir = tmp_path / "gpx"
+    gpx_dir.mkdir()
+    for i in range(20):
+        (gpx_dir / f"track{i}.gpx").write_text(f"<gpx>{i}</gpx>")
+    all_file_names = sorted(str(f) for f in gpx_dir.iterdir())
+
+    shards = []
+    for index in range(1, 4):
+        loader = TrackLoader(workers=None)
+        loader.set_cache_dir(str(tmp_path / "cache"))
+        loader.set_shard(f"{index}/3")
+        # nothing is cached yet, so all GPX files of the shard are missing
+        shards.append(set(loader.verify_cache(str(gpx_dir))))
+
+    assert sorted(set.union(*shards)) == all_file_names
+    assert sum(len(shard) for shard in shards) == len(all_file_names)
+
+
+def test_verify_cache_detects_incomplete_cache_files(tmp_path: Path) -> None:
+    gpx_dir = tmp_path / "gpx"
+    gpx_dir.mkdir()
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    for i in range(3):
+        (gpx_dir / f"track{i}.gpx").write_text(f"<gpx>{i}</gpx>")
+    file_names = sorted(str(f) for f in gpx_dir.iterdir())
+    loader = TrackLoader(workers=None)
+    loader.set_cache_dir(str(cache_dir))
+    # pylint: disable=protected-access
+    with open(loader._get_cache_file_name(file_names[0]), "w", encoding="utf8") as f:
+        f.write('{"start": "2020-01-01 10:00:00", "segments": []}\n')
+    with open(loader._get_cache_file_name(file_names[1]), "w", encoding="utf8") as f:
+        f.write('{"start": "2020-01-01 10:00:00", "segm')
+    assert loader.verify_cache(str(gpx_dir)) == file_names[1:]
+
+
+def test_set_backend_invalid() -> None:
+    loader = TrackLoader(workers=None)
+    with pytest.raises(ParameterError):
+        loader.set_backend("fibers")
+
+
+@pytest.mark.parametrize("region", ["", "1,2", "a,b,c", "91,0,1", "0,181,1", "0,0,0", "0,0,-1"])
+def test_set_region_invalid(region: str) -> None:
+    loader = TrackLoader(workers=None)
+    with pytest.raises(ParameterError):
+        loader.set_region(region)
+
+
+def test_region_skips_indexed_gpx_files(tmp_path: Path) -> None:
+    gpx_dir = tmp_path / "gpx"
+    gpx_dir.mkdir()
+    for i in range(3):
+        (gpx_dir / f"track{i}.gpx").write_text(f"<gpx>{i}</gpx>")
+    file_names = sorted(str(f) for f in gpx_dir.iterdir())
+
+    loader = TrackLoader(workers=None)
+    loader.set_cache_dir(str(tmp_path / "cache"))
+    loader.set_region("48.0,7.8,5")
+    index = SpatialIndex(str(tmp_path / "cache"))
+    # pylint: disable=protected-access
+    index.add(loader._get_checksum(file_names[0]), utils.region_rect(s2sphere.LatLng.from_degrees(48.01, 7.81), 1))
+    index.add(loader._get_checksum(file_names[1]), utils.region_rect(s2sphere.LatLng.from_degrees(40.7, -74.0), 1))
+    assert loader._list_region_gpx_files(file_names, index) == [file_names[0], file_names[2]]
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_pipelined_loading_matches_sequential_loading(tmp_path: Path, cached: bool) -> None:
+    file_names = write_gpx_files(tmp_path / "gpx", 12)
+    cache_dir = str(tmp_path / "cache")
+    if cached:
+        loader = TrackLoader(workers=1)
+        loader.set_cache_dir(cache_dir)
+        load_tracks_from_files(loader, file_names)
+        assert len(os.listdir(cache_dir)) == 12
+
+    def load(workers: int) -> List[Tuple[Any, ...]]:
+        loader = TrackLoader(workers=workers)
+        if cached:
+            loader.set_cache_dir(cache_dir)
+        return [track_data(t) for t in load_tracks_from_files(loader, file_names)]
+
+    sequential, pipelined = load(1), load(3)
+    # the tracks keep the order of the GPX files; the broken file is skipped
+    assert [data[0][0] for data in pipelined] == [os.path.basename(f) for f in file_names if "track" in f]
+    assert pipelined == sequential
+
+
+def test_pipelined_loading_reparses_corrupt_cache_files(tmp_path: Path) -> None:
+    file_names = write_gpx_files(tmp_path / "gpx", 4)[1:]
+    loader = TrackLoader(workers=2)
+    loader.set_cache_dir(str(tmp_path / "cache"))
+    expected = [track_data(t) for t in load_tracks_from_files(loader, file_names)]
+    cache_file_name = loader._get_cache_file_name(file_names[1])  # pylint: disable=protected-access
+    with open(cache_file_name, "w", encoding="utf8") as f:
+        f.write('{"start": "2020-01-01 10:00:00", "segm')
+
+    loader = TrackLoader(workers=2)
+    loader.set_cache_dir(str(tmp_path / "cache"))
+    assert [track_data(t) for t in load_tracks_from_files(loader, file_names)] == expected
+    # the reparsed track is stored to the cache again
+    assert not loader.verify_cache(str(tmp_path / "gpx"))[1:]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_streaming_iter_tracks_matches_load_tracks(tmp_path: Path, workers: int) -> None:
+    write_gpx_files(tmp_path / "gpx", 8)
+    expected = [track_data(t) for t in TrackLoader(workers=workers).load_tracks(str(tmp_path / "gpx"))]
+    assert len(expected) == 5
+
+    # the first run parses the GPX files, the second one loads the cache
+    for _ in range(2):
+        loader = TrackLoader(workers=workers)
+        loader.set_cache_dir(str(tmp_path / "cache"))
+        loader.set_streaming(True)
+        tracks = list(loader.iter_tracks(str(tmp_path / "gpx")))
+        assert all(t.polylines_released for t in tracks)
+        assert [track_data(t) for t in tracks] == expected
+
+
+def test_thread_backend_matches_process_backend(tmp_path: Path) -> None:
+    file_names = write_gpx_files(tmp_path / "gpx", 8)
+    results = {}
+    for backend in ("thread", "process"):
+        loader = TrackLoader(workers=3)
+        loader.set_backend(backend)
+        results[backend] = [track_data(t) for t in load_tracks_from_files(loader, file_names)]
+    assert len(results["thread"]) == 8
+    assert results["thread"] == results["process"]
@@ -0,0 +1,105 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import concurrent.futures
+import datetime
+import functools
+import locale
+import multiprocessing
+import os
+import pickle
+import sys
+import typing
+from xml.etree import ElementTree
+
+import pytest
+
+from gpxtrackposter import grid_drawer, tracks_drawer
+from gpxtrackposter.calendar_drawer import CalendarDrawer
+from gpxtrackposter.circular_drawer import CircularDrawer
+from gpxtrackposter.github_drawer import GithubDrawer
+from gpxtrackposter.grid_drawer import GridDrawer
+from gpxtrackposter.poster import Poster
+from gpxtrackposter.tracks_drawer import TracksDrawer
+from gpxtrackposter.xy import XY
+from tests.test_track import make_track
+
+SVG = "{http://www.w3.org/2000/svg}"
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+
+def make_poster() -> Poster:
+    tracks = []
+    for i in range(12):
+        t = make_track(datetime.datetime(2020 + i % 3, 1 + i % 12, 1 + i, 10), [(48.0, 7.8), (48.1 + i / 100, 7.9)])
+        t.length_meters = 1000.0 * (i + 1)
+        tracks.append(t)
+    poster = Poster()
+    poster.set_title("Title")
+    poster.set_athlete("Athlete")
+    poster.colors.update({"track2": "#FF0000", "special2": "#00FF00"})
+    poster.set_tracks(sorted(tracks, key=lambda t: t.start_time()))
+    return poster
+
+
+def draw(poster: Poster, drawer_class: typing.Type[TracksDrawer], file_name: str, workers: int) -> str:
+    poster.workers = workers
+    poster.draw(drawer_class(poster), file_name)
+    with open(file_name, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("drawer_class", [CalendarDrawer, CircularDrawer, GithubDrawer, GridDrawer])
+def test_parallel_drawing_matches_serial_drawing(
+    drawer_class: typing.Type[TracksDrawer], tmp_path: typing.Any, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(grid_drawer, "PARALLEL_MIN_TRACKS", 2)
+    monkeypatch.setattr(sys.modules[drawer_class.__module__], "PARALLEL_MIN_YEARS", 2, raising=False)
+    serial = draw(make_poster(), drawer_class, os.path.join(tmp_path, "serial.svg"), 1)
+    parallel = draw(make_poster(), drawer_class, os.path.join(tmp_path, "parallel.svg"), 2)
+    assert 'id="year2022"' in serial
+    assert parallel == serial
+
+
+@pytest.mark.parametrize("drawer_class", [CircularDrawer, GridDrawer])
+def test_translated_poster_is_drawn_by_spawned_workers(
+    drawer_class: typing.Type[TracksDrawer], tmp_path: typing.Any, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # worker processes that are not forked receive a pickled copy of the drawer; translations with plural forms
+    # cannot be pickled
+    set_locale = locale.setlocale
+    monkeypatch.setattr(locale, "setlocale", lambda category, name=None: name or set_locale(category))
+    poster = make_poster()
+    poster.set_language("de_DE", os.path.join(os.path.dirname(__file__), "..", "locale"))
+    assert poster.translate("January") != "January"
+    serial = draw(poster, drawer_class, os.path.join(tmp_path, "serial.svg"), 1)
+    monkeypatch.setattr(grid_drawer, "PARALLEL_MIN_TRACKS", 2)
+    monkeypatch.setattr(sys.modules[drawer_class.__module__], "PARALLEL_MIN_YEARS", 2, raising=False)
+    monkeypatch.setattr(
+        tracks_drawer.concurrent.futures,
+        "ProcessPoolExecutor",
+        functools.partial(concurrent.futures.ProcessPoolExecutor, mp_context=multiprocessing.get_context("spawn")),
+    )
+    parallel = draw(poster, drawer_class, os.path.join(tmp_path, "parallel.svg"), 2)
+    assert parallel == serial
+
+
+def test_fragment_context_has_no_tracks() -> None:
+    poster = make_poster()
+    context = pickle.loads(pickle.dumps(CircularDrawer(poster).fragment_context()))
+    assert not context.poster.tracks
+    key = (2021, XY(100, 100), XY(10, 10))
+    assert context.render_fragment(key) == CircularDrawer(poster).render_fragment(key)
+    assert len(GridDrawer(poster).fragment_context().poster.tracks) == len(poster.tracks)
+
+
+@pytest.mark.parametrize("drawer_class", [CalendarDrawer, GithubDrawer])
+def test_day_cells_reference_definitions(drawer_class: typing.Type[TracksDrawer], tmp_path: typing.Any) -> None:
+    svg = ElementTree.fromstring(draw(make_poster(), drawer_class, os.path.join(tmp_path, "poster.svg"), 1))
+    ids = {element.get("id") for element in svg.iter()}
+    uses = [element.get(XLINK_HREF, "") for element in svg.iter(f"{SVG}use")]
+    assert len(uses) >= 366 + 365 + 365
+    assert all(href[1:] in ids for href in uses)
+    assert svg.find(f"{SVG}defs/{SVG}style") is not None
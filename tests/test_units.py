@@ -0,0 +1,15 @@
+# Copyright 2023 Florian Pigorsch & Contributors. All rights reserved.
+#
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+import concurrent.futures
+
+from gpxtrackposter.units import Units
+
+
+def test_units_shared_between_threads() -> None:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        lengths = list(executor.map(lambda i: i * Units().km, range(100)))
+    # quantities from different unit registries cannot be added
+    assert sum(lengths, 0 * Units().km) == 4950 * Units().km
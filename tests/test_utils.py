@@ -3,7 +3,25 @@
 # Use of this source code is governed by a MIT-style
 # license that can be found in the LICENSE file.
 
-from gpxtrackposter.utils import interpolate_color
+import json
+import os
+import stat
+import typing
+
+import numpy as np
+import s2sphere  # type: ignore
+
+from gpxtrackposter.utils import (
+    interpolate_color,
+    lat2y,
+    latlng2xy,
+    lng2x,
+    latlngs_to_array,
+    mercator_xy,
+    project_arrays,
+    write_json_atomically,
+)
+from gpxtrackposter.xy import XY
 
 
 def test_interpolate_color() -> None:
@@ -12,3 +30,55 @@ def test_interpolate_color() -> None:
     assert interpolate_color("#000000", "#ffffff", 0.5) == "#7f7f7f"
     assert interpolate_color("#000000", "#ffffff", -100) == "#000000"
     assert interpolate_color("#000000", "#ffffff", 12345) == "#ffffff"
+
+
+def test_mercator_xy() -> None:
+    latlngs = [s2sphere.LatLng.from_degrees(lat, lng) for lat, lng in [(48.0, 7.8), (-33.9, 151.2), (0.0, -180.0)]]
+    xy = mercator_xy(latlngs_to_array(latlngs))
+    for (x, y), latlng in zip(xy, latlngs):
+        expected = latlng2xy(latlng)
+        assert np.isclose(x, expected.x)
+        assert np.isclose(y, expected.y)
+
+
+def test_project_arrays_clips_and_splits() -> None:
+    bbox = s2sphere.LatLngRect.from_point_pair(
+        s2sphere.LatLng.from_degrees(48.0, 7.0), s2sphere.LatLng.from_degrees(49.0, 8.0)
+    )
+    # points on the border of the box are kept
+    line = [(48.0, 7.5), (48.5, 7.5), (50.0, 7.6), (49.0, 7.0), (48.8, 8.0), (48.9, 9.0)]
+    latlngs = [s2sphere.LatLng.from_degrees(lat, lng) for lat, lng in line]
+    lines = project_arrays(bbox, XY(100, 100), XY(10, 10), [latlngs_to_array(latlngs)])
+
+    # the box is higher than wide in Mercator coordinates: it fills the height and is centered horizontally
+    scale = 100 / (lat2y(48.0) - lat2y(49.0))
+    left = 10 + 50 - 0.5 * scale * (lng2x(8.0) - lng2x(7.0))
+
+    def expected(lat: float, lng: float) -> typing.Tuple[float, float]:
+        return left + scale * (lng2x(lng) - lng2x(7.0)), 10 + scale * (lat2y(lat) - lat2y(49.0))
+
+    assert len(lines) == 2
+    assert np.allclose(lines[0], [expected(48.0, 7.5), expected(48.5, 7.5)])
+    assert np.allclose(lines[1], [expected(49.0, 7.0), expected(48.8, 8.0)])
+    assert np.allclose(lines[0][0], [60.0, 110.0])
+    assert np.allclose(lines[1][0], [left, 10.0])
+    assert np.allclose(lines[1][1][0], 120 - left)
+
+
+def test_project_arrays_empty() -> None:
+    bbox = s2sphere.LatLngRect.from_point_pair(
+        s2sphere.LatLng.from_degrees(48.0, 7.0), s2sphere.LatLng.from_degrees(49.0, 8.0)
+    )
+    assert not project_arrays(bbox, XY(100, 100), XY(0, 0), [np.empty((0, 2))])
+    assert not project_arrays(bbox, XY(100, 100), XY(0, 0), [np.array([[10.0, 10.0]])])
+
+
+def test_write_json_atomically_uses_umask_permissions(tmp_path: typing.Any) -> None:
+    umask = os.umask(0o022)
+    os.umask(umask)
+    file_name = os.path.join(tmp_path, "data.json")
+    write_json_atomically(file_name, {"a": 1})
+    with open(file_name, encoding="utf8") as f:
+        assert json.load(f) == {"a": 1}
+    assert stat.S_IMODE(os.stat(file_name).st_mode) == 0o666 & ~umask
+    assert os.listdir(tmp_path) == ["data.json"]